@@ -0,0 +1,96 @@
+import threading
+import time
+from contextvars import ContextVar
+
+# time.perf_counter() by which the current request should be done parsing; None outside requests
+parse_deadline = ContextVar("parse_deadline", default=None)
+# Set for requests admitted while the worker is overloaded: they skip NER altogether
+overloaded = ContextVar("overloaded", default=False)
+
+
+class LatencyEstimate:
+    """Exponentially weighted moving average of a stage's latency in seconds.
+
+    Skipping the stage decays the estimate, so one slow call can't keep it
+    skipped forever: the next real measurement corrects it.
+    """
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.value = seconds if not self.value else self.value + self.alpha * (seconds - self.value)
+
+    def decay(self):
+        with self._lock:
+            self.value *= 1 - self.alpha
+
+
+def queue_wait(header, now=None):
+    """Seconds a request waited in front of the app, from an X-Request-Start header, or 0.
+
+    Proxies send 't=<timestamp>' (or a bare timestamp) in seconds, milliseconds
+    or microseconds since the epoch.
+    """
+    if not header:
+        return 0.0
+    try:
+        started = float(header.strip().removeprefix("t="))
+    except ValueError:
+        return 0.0
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max((now if now is not None else time.time()) - started, 0.0)
+
+
+def degradation_reason(estimate):
+    """Return why the current request should use regex-only parsing ("overload" or "deadline"), or None"""
+    if overloaded.get():
+        return "overload"
+    deadline = parse_deadline.get()
+    if deadline is not None and time.perf_counter() + estimate.value > deadline:
+        return "deadline"
+    return None
+
+
+class AdmissionController:
+    """Per-worker admission control for the parsing endpoints.
+
+    Requests are shed (answered with a retry response) when max_inflight of
+    them are already running or they waited reject_wait seconds in the
+    proxy's queue; above degrade_inflight running requests or degrade_wait
+    seconds of queueing they are admitted but skip NER.
+    """
+
+    def __init__(self, max_inflight=8, degrade_inflight=2, reject_wait=2.0, degrade_wait=0.2):
+        self.max_inflight = max_inflight
+        self.degrade_inflight = degrade_inflight
+        self.reject_wait = reject_wait
+        self.degrade_wait = degrade_wait
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def try_enter(self, wait=0.0):
+        """Return (admitted, reason): reason is why a request is shed, or "overload" if it is degraded"""
+        with self._lock:
+            if wait >= self.reject_wait:
+                return False, "queue_wait"
+            if self.inflight >= self.max_inflight:
+                return False, "inflight"
+            self.inflight += 1
+            if self.inflight > self.degrade_inflight or wait >= self.degrade_wait:
+                return True, "overload"
+            return True, None
+
+    def leave(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"inflight": self.inflight, "max_inflight": self.max_inflight}
@@ -0,0 +1,189 @@
+import datetime
+
+import numpy as np
+
+from availability import WORKDAY_START, WORKDAY_END, WORKDAY_MINUTES
+from reservation import EPOCH_ORDINAL, MINUTES_PER_DAY, format_minutes
+
+WORKDAY_FIRST_MINUTE = WORKDAY_START.hour * 60 + WORKDAY_START.minute
+WORKDAY_LAST_MINUTE = WORKDAY_END.hour * 60 + WORKDAY_END.minute
+# Number of busiest hours of the day listed as peak hours
+PEAK_HOURS = 3
+
+
+class Intervals:
+    """Reservation intervals as parallel NumPy arrays, sorted by resource and then start.
+
+    starts and ends are int64 minutes since the epoch, resources are codes into
+    resource_names ('' for reservations without a resource) and ids keeps the
+    stored ids for reporting. Zero-length intervals are dropped.
+    """
+
+    __slots__ = ("ids", "starts", "ends", "resources", "resource_names")
+
+    def __init__(self, ids, starts, ends, resources, resource_names):
+        self.ids = ids
+        self.starts = starts
+        self.ends = ends
+        self.resources = resources
+        self.resource_names = resource_names
+
+    @classmethod
+    def from_spans(cls, spans, resource=None):
+        """Load (id, start, end, resource) tuples with ISO start/end strings; resource selects one resource"""
+        # One column at a time: zip(*spans) would build four huge tuples first
+        ids = np.array([span[0] for span in spans], dtype=object)
+        # NumPy parses the ISO strings in C, much faster than a datetime per row
+        starts = np.array([span[1] for span in spans], dtype="datetime64[s]").astype("datetime64[m]").astype(np.int64)
+        ends = np.array([span[2] for span in spans], dtype="datetime64[s]").astype("datetime64[m]").astype(np.int64)
+        names = {}
+        codes = np.fromiter((names.setdefault(span[3] or "", len(names)) for span in spans),
+                            dtype=np.int64, count=len(spans))
+
+        keep = ends > starts
+        if resource is not None:
+            keep &= codes == names.get(resource, -1)
+        order = np.lexsort((starts[keep], codes[keep]))
+        return cls(ids[keep][order], starts[keep][order], ends[keep][order], codes[keep][order], list(names))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def clipped(self, window_start, window_end):
+        """Return (starts, ends, resources) clipped to [window_start, window_end), dropping what falls outside"""
+        starts = np.maximum(self.starts, window_start)
+        ends = np.minimum(self.ends, window_end)
+        keep = ends > starts
+        return starts[keep], ends[keep], self.resources[keep]
+
+
+def merge_overlaps(starts, ends, resources):
+    """Union of the intervals of each resource; input must be sorted by resource and start"""
+    if len(starts) == 0:
+        return starts, ends, resources
+    # Furthest end so far within each resource: shifting every resource above the
+    # previous one keeps the running maximum from leaking across resources
+    shift = resources.astype(np.int64) * (int(ends.max()) + 1)
+    reach = np.maximum.accumulate(ends + shift) - shift
+    # A new run starts where the resource changes or the start lies past every earlier end
+    new_run = np.ones(len(starts), dtype=bool)
+    new_run[1:] = (resources[1:] != resources[:-1]) | (starts[1:] >= reach[:-1])
+    run_starts = np.flatnonzero(new_run)
+    run_ends = np.append(run_starts[1:], len(starts)) - 1
+    return starts[run_starts], reach[run_ends], resources[run_starts]
+
+
+def split_by_day(starts, ends):
+    """Cut intervals at midnight; returns (day number, start minute of day, end minute of day) arrays"""
+    first_day = starts // MINUTES_PER_DAY
+    counts = (ends - 1) // MINUTES_PER_DAY - first_day + 1
+    owner = np.repeat(np.arange(len(starts)), counts)
+    offset = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    day = first_day[owner] + offset
+    midnight = day * MINUTES_PER_DAY
+    return day, np.maximum(starts[owner], midnight) - midnight, np.minimum(ends[owner], midnight + MINUTES_PER_DAY) - midnight
+
+
+def daily_utilization(intervals, first_day, last_day):
+    """Booked working-hour minutes and utilization of each day in [first_day, last_day).
+
+    Overlapping reservations of a resource count once; utilization divides by the
+    working minutes of every resource present.
+    """
+    day_count = (last_day - first_day).days
+    first = first_day.toordinal() - EPOCH_ORDINAL
+    starts, ends, resources = intervals.clipped(first * MINUTES_PER_DAY, (first + day_count) * MINUTES_PER_DAY)
+    starts, ends, _ = merge_overlaps(starts, ends, resources)
+    day, day_starts, day_ends = split_by_day(starts, ends)
+    working = np.clip(np.minimum(day_ends, WORKDAY_LAST_MINUTE) - np.maximum(day_starts, WORKDAY_FIRST_MINUTE), 0, None)
+    booked = np.bincount(day - first, weights=working, minlength=day_count).astype(np.int64)
+    capacity = WORKDAY_MINUTES * max(len(np.unique(intervals.resources)), 1)
+    dates = np.arange(first, first + day_count).astype("datetime64[D]").astype(str)
+    return [
+        {"date": date, "booked_minutes": minutes, "utilization": utilization}
+        for date, minutes, utilization in zip(dates.tolist(), booked.tolist(), np.round(booked / capacity, 4).tolist())
+    ]
+
+
+def hourly_load(intervals, window_start, window_end):
+    """Booked minutes and reservation starts per hour of the day, summed over every day of the window"""
+    starts, ends, _ = intervals.clipped(window_start, window_end)
+    _, day_starts, day_ends = split_by_day(starts, ends)
+    # Difference array over the minutes of a day: +1 where a piece starts, -1 where it ends
+    coverage = np.cumsum(np.bincount(day_starts, minlength=MINUTES_PER_DAY + 1)
+                         - np.bincount(day_ends, minlength=MINUTES_PER_DAY + 1))[:MINUTES_PER_DAY]
+    booked = coverage.reshape(24, 60).sum(axis=1)
+    started = np.bincount((starts % MINUTES_PER_DAY) // 60, minlength=24)
+    return [
+        {"hour": hour, "booked_minutes": int(booked[hour]), "starts": int(started[hour])}
+        for hour in range(24)
+    ]
+
+
+def conflict_pairs(intervals, limit=100):
+    """Find overlapping pairs of reservations of the same resource.
+
+    Returns (total number of pairs, list of up to limit (first, second) index
+    pairs into intervals). For each interval, binary search on the sorted
+    (resource, start) keys finds how many later intervals start before it ends.
+    """
+    count = len(intervals)
+    if count < 2:
+        return 0, []
+    base = int(intervals.starts.min())
+    span = int(intervals.ends.max()) - base + 1
+    offsets = intervals.resources.astype(np.int64) * span - base
+    keys = offsets + intervals.starts
+    later = np.searchsorted(keys, offsets + intervals.ends, side="left") - np.arange(count) - 1
+    later = np.maximum(later, 0)
+    total = int(later.sum())
+    if not total or limit <= 0:
+        return total, []
+    cumulative = np.cumsum(later)
+    rows = int(np.searchsorted(cumulative, min(limit, total))) + 1
+    first = np.repeat(np.arange(rows), later[:rows])
+    second = first + 1 + np.arange(len(first)) - np.repeat(cumulative[:rows] - later[:rows], later[:rows])
+    return total, list(zip(first[:limit].tolist(), second[:limit].tolist()))
+
+
+def calendar_report(spans, first_day=None, last_day=None, resource=None, pair_limit=100, max_days=None):
+    """Utilization per day, load per hour, peak hours and overlapping pairs for a calendar's spans.
+
+    Without first_day/last_day the report covers the days the reservations span;
+    returns None if that is more than max_days.
+    """
+    intervals = Intervals.from_spans(spans, resource)
+    if first_day is None or last_day is None:
+        if not len(intervals):
+            first_day = last_day = datetime.date.today()
+        else:
+            first_day = datetime.date.fromordinal(EPOCH_ORDINAL + int(intervals.starts.min()) // MINUTES_PER_DAY)
+            last_day = datetime.date.fromordinal(EPOCH_ORDINAL + (int(intervals.ends.max()) - 1) // MINUTES_PER_DAY + 1)
+    if max_days is not None and (last_day - first_day).days > max_days:
+        return None
+    window_start = (first_day.toordinal() - EPOCH_ORDINAL) * MINUTES_PER_DAY
+    window_end = (last_day.toordinal() - EPOCH_ORDINAL) * MINUTES_PER_DAY
+
+    hours = hourly_load(intervals, window_start, window_end)
+    peak_hours = sorted((hour for hour in hours if hour["booked_minutes"]),
+                        key=lambda hour: -hour["booked_minutes"])[:PEAK_HOURS]
+    total, pairs = conflict_pairs(intervals, pair_limit)
+    return {
+        "reservations": len(intervals),
+        "days": daily_utilization(intervals, first_day, last_day),
+        "hours": hours,
+        "peak_hours": [hour["hour"] for hour in peak_hours],
+        "conflicts": {
+            "total": total,
+            "pairs": [
+                {
+                    "first": intervals.ids[first],
+                    "second": intervals.ids[second],
+                    "resource": intervals.resource_names[intervals.resources[first]] or None,
+                    "start": format_minutes(int(intervals.starts[second])),
+                    "end": format_minutes(int(min(intervals.ends[first], intervals.ends[second]))),
+                }
+                for first, second in pairs
+            ],
+        },
+    }
@@ -1,29 +1,111 @@
-from flask import Flask, render_template, request, jsonify, session
-import spacy
+from flask import Flask, Response, g, render_template, request, jsonify, session
+from flask.sessions import SecureCookieSessionInterface
 import json
 import datetime
 from dateutil import parser
 import re
 from datetime import datetime as dt
+import functools
 import os
+import time
+import hashlib
+import io
+import itertools
+import threading
+import uuid
+from admission import AdmissionController, LatencyEstimate, degradation_reason, overloaded, parse_deadline, queue_wait
+from analytics import calendar_report
+from calendar_io import read_csv, read_ics, write_csv, write_ics
+from conversations import create_conversation_store
+from lexicon import WEEKDAYS, DAY_WORD_RE, day_of, day_word, relative_days, scan, time_of, to_24_hour
+from recurrence import RecurringReservation
+from reservation import Reservation, to_datetime, to_minutes
+from storage import ANY_RESOURCE, create_reservation_store
+from parse_cache import ParseCache
+from metrics import (registry, stage, record_stage, request_timings, REQUEST_SECONDS, PARSE_TIER, FALLBACKS,
+                     PARSE_FAILURES, BOOKING_OUTCOMES, ERRORS, PARSE_DEGRADED, NER_DEADLINE_EXCEEDED, REQUESTS_SHED)
+from availability import WORKDAY_START, WORKDAY_END, OccupancyCache, day_occupancy, free_slots, nearest_free_slots
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY')
 
-# Load spaCy model
-try:
-    nlp = spacy.load("en_core_web_md")
-except OSError:
-    # If model isn't available, try to download it
-    try:
-        import subprocess
-        import sys
-        subprocess.check_call([sys.executable, "-m", "spacy", "download", "en_core_web_md"])
-        nlp = spacy.load("en_core_web_md")
-    except:
-        # Fallback: create a simple NLP function without spaCy
-        print("Warning: spaCy model not available. Using fallback NLP.")
-        nlp = None
+# Reservations live in the store; the session only carries the calendar id
+reservation_store = create_reservation_store()
+
+# spaCy model (sm/md/lg shorthand or a full package name); render.yaml installs the small model
+SPACY_MODEL = os.getenv('SPACY_MODEL', 'en_core_web_md')
+# parse_reservation_text only reads doc.ents, so everything except tok2vec + ner is left out
+SPACY_EXCLUDE = ["parser", "tagger", "attribute_ruler", "lemmatizer", "senter"]
+# nlp.pipe settings for batch parsing
+NLP_BATCH_SIZE = int(os.getenv('NLP_BATCH_SIZE', 64))
+NLP_N_PROCESS = int(os.getenv('NLP_N_PROCESS', 1))
+MAX_BATCH_MESSAGES = int(os.getenv('MAX_BATCH_MESSAGES', 1000))
+# Rows read from one uploaded .ics/.csv file
+MAX_IMPORT_ROWS = int(os.getenv('MAX_IMPORT_ROWS', 100000))
+
+# Availability search limits and the number of free slots offered after a conflict
+MAX_AVAILABILITY_DAYS = int(os.getenv('MAX_AVAILABILITY_DAYS', 62))
+SUGGESTION_COUNT = int(os.getenv('SUGGESTION_COUNT', 3))
+SUGGESTION_SEARCH_DAYS = int(os.getenv('SUGGESTION_SEARCH_DAYS', 7))
+occupancy_cache = OccupancyCache()
+# Longest window /stats reports on, and the overlapping pairs it lists by default
+MAX_STATS_DAYS = int(os.getenv('MAX_STATS_DAYS', 3660))
+STATS_PAIR_LIMIT = int(os.getenv('STATS_PAIR_LIMIT', 100))
+
+# Cache of parse results for repeated utterances (PARSE_CACHE_SIZE=0 disables it)
+parse_cache = ParseCache(
+    maxsize=int(os.getenv('PARSE_CACHE_SIZE', 1024)),
+    ttl=float(os.getenv('PARSE_CACHE_TTL', 3600)),
+)
+registry.gauge("scheduler_parse_cache", "Parse cache counters and size", parse_cache.stats, ["stat"])
+
+# Dialog state between /process_reservation turns, keyed by conversation id
+# (CONVERSATION_STORE=database, the default, shared by all workers, or memory for one worker)
+conversations = create_conversation_store(reservation_store)
+registry.gauge("scheduler_conversations", "Conversation store counters and size", conversations.stats, ["stat"])
+
+# Overload protection for the parsing endpoints: a parse deadline per request (NER is skipped
+# when it isn't expected to finish in time) and per-worker admission control
+PARSE_DEADLINE_MS = float(os.getenv('PARSE_DEADLINE_MS', 300))
+RETRY_AFTER_SECONDS = int(os.getenv('RETRY_AFTER_SECONDS', 1))
+admission = AdmissionController(
+    max_inflight=int(os.getenv('MAX_INFLIGHT_PARSES', 8)),
+    degrade_inflight=int(os.getenv('DEGRADE_INFLIGHT_PARSES', 2)),
+    reject_wait=float(os.getenv('QUEUE_REJECT_MS', 2000)) / 1000,
+    degrade_wait=float(os.getenv('QUEUE_DEGRADE_MS', 200)) / 1000,
+)
+ner_latency = LatencyEstimate()
+registry.gauge("scheduler_admission", "Parsing requests in flight in this worker", admission.stats, ["stat"])
+
+nlp = None
+nlp_loaded = False
+nlp_lock = threading.Lock()
+
+def get_nlp():
+    """Load the trimmed spaCy pipeline on first use; returns None if the model isn't installed"""
+    global nlp, nlp_loaded
+    if nlp_loaded:
+        return nlp
+    with nlp_lock:
+        if not nlp_loaded:
+            model_name = SPACY_MODEL
+            if model_name in ("sm", "md", "lg"):
+                model_name = f"en_core_web_{model_name}"
+            try:
+                import spacy
+                nlp = spacy.load(model_name, exclude=SPACY_EXCLUDE)
+            except (ImportError, OSError):
+                print(f"Warning: spaCy model {model_name} not available. Using fallback NLP.")
+                nlp = None
+            nlp_loaded = True
+    return nlp
+
+def warm_up():
+    """Load the spaCy model and run one document through it (call before forking workers)"""
+    model = get_nlp()
+    if model is not None:
+        model("Book an appointment for John tomorrow at 3 pm")
+    return model
 
 # List of words that should never be considered as names
 excluded_names = ["the", "a", "an", "this", "that", "these", "those", 
@@ -32,33 +114,97 @@ excluded_names = ["the", "a", "an", "this", "that", "these", "those",
                  "morning", "afternoon", "evening", "night", "pm", "am",
                  "january", "february", "march", "april", "may", "june",
                  "july", "august", "september", "october", "november", "december"]
+EXCLUDED_NAMES = frozenset(excluded_names)
+# Words a fast-path name ends before: day and time words, prepositions, pronouns, numbers
+NAME_STOP_WORDS = EXCLUDED_NAMES | {
+    "appointment", "reservation", "meeting", "table", "me", "us", "i", "we", "my", "our", "next",
+    "at", "on", "in", "for", "by", "with", "from", "to", "of", "under", "about", "around", "after",
+    "before", "until", "and", "or", "please", "one", "two", "three", "four", "five", "six", "seven",
+    "eight", "nine", "ten", "eleven", "twelve",
+}
+
+# Precompiled patterns shared by the fast path and the regex fallbacks; day and
+# time expressions in running text are found by lexicon.scan
+TIME_EXPRESSION_RE = re.compile(
+    r'^(?:\d{1,2}\s*(?:am|pm)'
+    r'|\d{1,2}:\d{2}\s*(?:am|pm)?'
+    r'|\d{1,2}\s*(?:o\'?clock)?\s*(?:in the\s+)?(?:afternoon|evening|morning|night))$'
+)
+WEEKDAY_RE = re.compile('|'.join(WEEKDAYS))
+PERIOD_WORD_RE = re.compile(r'afternoon|morning|evening|night')
+FALLBACK_NAME_PATTERNS = [
+    re.compile(r"under\s+the\s+name\s+of\s+([a-zA-Z\s]+)", re.IGNORECASE),
+    re.compile(r"under\s+([a-zA-Z\s]+)", re.IGNORECASE),
+    re.compile(r"for\s+([a-zA-Z\s]+)(?:\s+on|\s+at|$)", re.IGNORECASE),
+    re.compile(r"name\s+is\s+([a-zA-Z\s]+)", re.IGNORECASE),
+    re.compile(r"reservation\s+for\s+([a-zA-Z\s]+)", re.IGNORECASE),
+]
+FALLBACK_TIME_PATTERNS = [
+    re.compile(r'(\d{1,2})\s*(?:o\'?clock)?\s*(?:in the\s+)?(afternoon|evening|morning|night)', re.IGNORECASE),
+    re.compile(r'(\d{1,2})\s*(?:o\'?clock)?\s*(am|pm)', re.IGNORECASE),
+    re.compile(r'(\d{1,2})(?::(\d{2}))?\s*(am|pm)?', re.IGNORECASE),  # This pattern now captures minutes
+    re.compile(r'(\d{1,2})(?::(\d{2}))?\s*(?:in the\s+)?(afternoon|evening|morning|night)', re.IGNORECASE),
+]
+
+# Fast path: only shapes we can resolve without NER. Names must be capitalized and
+# follow a booking keyword; times need am/pm, a period of day or an HH:MM clock.
+FAST_NAME_RE = re.compile(
+    r"(?i:\b(?:under\s+the\s+name\s+of|under\s+the\s+name|under|for|name\s+is|book|with)\s+)"
+    r"([A-Z][a-zA-Z'\-]*\.?(?:\s+[A-Z][a-zA-Z'\-]*\.?)*)"
+)
+# Resources (staff members, rooms) a booking is for: "with Dr. Smith", "in room 2"
+RESOURCE_PATTERNS = [
+    re.compile(r"(?i:\bwith\s+(dr|doctor|prof|professor|nurse)\.?\s+)([A-Z][a-zA-Z'\-]*)"),
+    re.compile(r"(?i:\b(?:in|at)\s+(room|office|studio|suite|chair)\s*#?\s*)(\d+[A-Za-z]?|[A-Z][a-zA-Z]*)\b"),
+]
+RESOURCE_TITLES = {"dr": "Dr.", "doctor": "Dr.", "prof": "Prof.", "professor": "Prof."}
+# Recurring bookings: "every Tuesday", "every other week", "daily", optionally "for 6 weeks".
+# daily/weekly/monthly only count as adverbs: at the end of a clause or before a day,
+# time or preposition ("John weekly on Mondays"), not before a noun ("the weekly review")
+RECURRENCE_RE = re.compile(
+    r'\b(?:every|each)\s+(other\s+)?(day|weekday|week|month|' + '|'.join(WEEKDAYS) + r')s?\b'
+    r'|\b(daily|weekly|monthly)\b(?=\s*(?:$|[,.;:!?]|\d'
+    r'|(?:on|at|from|starting|until|till|for|in|by|and|with|today|tomorrow|next|this|'
+    + '|'.join(WEEKDAYS) + r')s?\b))',
+    re.IGNORECASE
+)
+RECURRENCE_COUNT_RE = re.compile(r'\bfor\s+(\d{1,3})\s+(?:days|weeks|months|times|sessions|occurrences)\b', re.IGNORECASE)
+RECURRENCE_FREQUENCIES = {
+    "day": "FREQ=DAILY", "daily": "FREQ=DAILY",
+    "weekday": "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR",
+    "week": "FREQ=WEEKLY", "weekly": "FREQ=WEEKLY",
+    "month": "FREQ=MONTHLY", "monthly": "FREQ=MONTHLY",
+}
+CLOCK_TIME_RE = re.compile(r'^([01]?\d|2[0-3]):([0-5]\d)$')
+# Follow-up answers that are only a time ("3pm", "at 15:30") or only a day ("tomorrow", "on 12.10.2030")
+ANSWER_PREFIX_RE = re.compile(r'^(?:at|on|for|maybe|how about|let\'s say)\s+', re.IGNORECASE)
+DATE_ANSWER_RE = re.compile(
+    r'^(?:today|tomorrow|(?:next\s+)?(?:' + '|'.join(WEEKDAYS) + r')|\d{1,2}\.\d{1,2}\.\d{4})$',
+    re.IGNORECASE
+)
 
 def is_time_expression(text):
     """Check if the text looks like a time expression"""
     if not text:
         return False
-    time_patterns = [
-        r'^\d{1,2}\s*(?:am|pm)$',
-        r'^\d{1,2}:\d{2}\s*(?:am|pm)?$',
-        r'^\d{1,2}\s*(?:o\'?clock)?\s*(?:in the\s+)?(afternoon|evening|morning|night)$',
-    ]
-    for pattern in time_patterns:
-        if re.search(pattern, str(text).lower()):
-            return True
-    return False
+    return TIME_EXPRESSION_RE.search(str(text).lower()) is not None
+
+def time_of_day(value):
+    """Read the time of day from an HH:MM or ISO datetime value without fuzzy parsing"""
+    clock = time_from_state(value)
+    if clock is not None:
+        return datetime.time(*clock)
+    return to_datetime(value).time()
 
 def is_within_working_hours(time_str):
     """Check if the given time is within working hours (09:00-17:00)"""
     try:
         if isinstance(time_str, str):
-            time_obj = parser.parse(time_str).time()
+            time_obj = time_of_day(time_str)
         else:
             time_obj = time_str
             
-        start_time = datetime.time(9, 0)
-        end_time = datetime.time(17, 0)
-        
-        return start_time <= time_obj <= end_time
+        return WORKDAY_START <= time_obj <= WORKDAY_END
     except:
         return False
 
@@ -78,66 +224,337 @@ def safe_get(dictionary, key, default=None):
         return default
     return dictionary.get(key, default)
 
-def parse_reservation_text(text, current_reservation=None):
-    """Process reservation text using the provided logic"""
-    # Ensure current_reservation has all required keys
+def record_stage_since(name, started):
+    """Record the time since started as a stage and return the new checkpoint"""
+    now = time.perf_counter()
+    record_stage(name, now - started)
+    return now
+
+def merge_with_default(current_reservation):
+    """Ensure current_reservation has all required keys"""
     if current_reservation is None:
-        current_reservation = get_default_reservation()
+        return get_default_reservation()
+    # Merge with default to ensure all keys exist
+    default = get_default_reservation()
+    for key in default:
+        if key not in current_reservation:
+            current_reservation[key] = default[key]
+    return current_reservation
+
+def is_name_stop_word(word):
+    """Check if a capitalized word next to a name is a stop word ("Appointment", "Tomorrow")"""
+    return word.lower().removesuffix(".") in NAME_STOP_WORDS
+
+def fast_parse_name(text):
+    """Return (name, cut) for the capitalized words that follow a booking keyword.
+
+    The name ends at the first stop word (a day, a preposition: "John On
+    Monday") or after a word with a trailing period ("John. Tomorrow");
+    cut is True if words were left over, so the caller can defer to NER.
+    Returns (None, False) if no name follows a keyword.
+    """
+    for match in FAST_NAME_RE.finditer(text):
+        words = match.group(1).split()
+        name = []
+        for word in words:
+            if is_name_stop_word(word):
+                break
+            name.append(word.removesuffix("."))
+            if word.endswith("."):
+                break
+        if not name:
+            # "Book Tomorrow At 3pm": a keyword followed by stop words only; try the next keyword
+            continue
+        if len(name) < len(words):
+            return " ".join(name), True
+        if len(" ".join(name)) > 1:
+            return " ".join(name), False
+    return None, False
+
+def extract_resource(text):
+    """Return (resource id, text without the resource phrase), or (None, text) if none is mentioned"""
+    for pattern in RESOURCE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            kind = match.group(1).lower()
+            resource = f"{RESOURCE_TITLES.get(kind, kind.capitalize())} {match.group(2)}"
+            return resource, text[:match.start()] + " " + text[match.end():]
+    return None, text
+
+def extract_recurrence(text):
+    """Return (RRULE, text with the recurrence phrase removed), or (None, text) for a one-off booking.
+
+    "every Tuesday" leaves "Tuesday" behind, so the first occurrence is resolved
+    like any other weekday.
+    """
+    match = RECURRENCE_RE.search(text)
+    if not match:
+        return None, text
+    every_other, unit, adverb = match.groups()
+    unit = (unit or adverb).lower()
+    if unit in WEEKDAYS:
+        rule, remainder = "FREQ=WEEKLY", unit
     else:
-        # Merge with default to ensure all keys exist
-        default = get_default_reservation()
-        for key in default:
-            if key not in current_reservation:
-                current_reservation[key] = default[key]
+        rule, remainder = RECURRENCE_FREQUENCIES[unit], ""
+    if every_other:
+        rule += ";INTERVAL=2"
+    text = text[:match.start()] + f" {remainder} " + text[match.end():]
+
+    count_match = RECURRENCE_COUNT_RE.search(text)
+    if count_match and int(count_match.group(1)) > 0:
+        rule += f";COUNT={int(count_match.group(1))}"
+        text = text[:count_match.start()] + " " + text[count_match.end():]
+    return rule, text
+
+def fast_parse_date(text, today):
+    """Return the date for an unambiguous day expression in text, or None"""
+    return day_of(scan(text), today)
+
+def fast_parse_time(text):
+    """Return (hour, minute) for an unambiguous time expression in text, or None"""
+    return time_of(scan(text))
+
+def date_from_state(value):
+    """Read a date already resolved on an earlier turn (DD.MM.YYYY or ISO), or None"""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, "%d.%m.%Y").date()
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).date()
+    except (TypeError, ValueError):
+        return None
+
+def time_from_state(value):
+    """Read an HH:MM time already resolved on an earlier turn, or None"""
+    match = CLOCK_TIME_RE.match(value) if isinstance(value, str) else None
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+def fast_parse(text, current_reservation, found=None):
+    """Regex-only tier: return a completed reservation, or None if NER is needed.
+
+    found is the lexicon.scan of text, if the caller already has it.
+    """
+    title, cut = fast_parse_name(text)
+    if cut:
+        # Capitalized words ran on past the name; let NER decide where it ends
+        return None
+    if title is not None:
+        title = title + " Appointment"
+    else:
+        title = current_reservation.get("title")
+
+    found = scan(text) if found is None else found
+    start_date = day_of(found, datetime.date.today()) or date_from_state(current_reservation.get("start"))
+    start_time = time_of(found) or time_from_state(current_reservation.get("end"))
+
+    if not title or not start_date or not start_time:
+        return None
+
+    current_reservation["title"] = title
+    return complete_reservation(current_reservation, start_date, start_time)
+
+def complete_reservation(current_reservation, start_date, start_time):
+    """Set the one-hour start/end of a reservation from a resolved date and (hour, minute)"""
+    start_datetime = datetime.datetime.combine(start_date, datetime.time(*start_time))
+    end_datetime = start_datetime + datetime.timedelta(hours=1)
+    current_reservation["start"] = start_datetime.strftime("%Y-%m-%dT%H:%M:%S")
+    current_reservation["end"] = end_datetime.strftime("%Y-%m-%dT%H:%M:%S")
+    return current_reservation
+
+def parse_reservation(text, current_reservation=None):
+    """Parse text and report the tier that produced the result ("fast", "ner" or "regex")"""
+    current_reservation = merge_with_default(current_reservation)
     
     if not text or not isinstance(text, str):
-        return current_reservation
-    
-    doc = nlp(text)
-    
+        return current_reservation, "fast"
+
+    stage_started = time.perf_counter()
+    cache_key = parse_cache.make_key(text, current_reservation)
+    cached = parse_cache.get(cache_key)
+    stage_started = record_stage_since("parse_cache", stage_started)
+    if cached is not None:
+        return cached
+
+    resource, text = extract_resource(text)
+    if resource:
+        current_reservation["resource"] = resource
+    rule, text = extract_recurrence(text)
+    if rule:
+        current_reservation["rrule"] = rule
+
+    # One lexicon pass serves the fast path and, if it can't resolve the message, the fallbacks
+    found = scan(text)
+    resolved = fast_parse(text, current_reservation, found) is not None
+    stage_started = record_stage_since("fast_path", stage_started)
+    degraded = None
+    if resolved:
+        tier = "fast"
+    else:
+        model = get_nlp()
+        degraded = degradation_reason(ner_latency) if model is not None else None
+        if model is None or degraded:
+            if degraded:
+                PARSE_DEGRADED.inc(reason=degraded)
+                ner_latency.decay()
+            apply_reservation_entities(text, (), current_reservation, found)
+            tier = "regex"
+        else:
+            entities = model(text).ents
+            ner_finished = time.perf_counter()
+            ner_latency.observe(ner_finished - stage_started)
+            record_stage("ner", ner_finished - stage_started)
+            deadline = parse_deadline.get()
+            if deadline is not None and ner_finished > deadline:
+                NER_DEADLINE_EXCEEDED.inc()
+            apply_reservation_entities(text, entities, current_reservation, found)
+            tier = "ner"
+
+    PARSE_TIER.labels(tier).inc()
+    if not degraded:
+        # A degraded result would be served from the cache long after the overload is over
+        parse_cache.put(cache_key, current_reservation, tier)
+    return current_reservation, tier
+
+def parse_answer(text, conversation):
+    """Resolve a follow-up that only answers the field the previous turn asked for.
+
+    "3pm" after "Please enter the time" runs just the time extractor against
+    the title and date kept in the conversation. Returns the completed
+    reservation, or None if the message needs the full parser.
+    """
+    reservation = conversation.reservation
+    if not reservation.get("title") or not isinstance(text, str):
+        return None
+    answer = ANSWER_PREFIX_RE.sub("", text.strip().rstrip(".!"))
+    start_date, start_time = conversation.date, conversation.time
+    if conversation.missing_field == "end" and start_date and is_time_expression(answer):
+        start_time = fast_parse_time(answer)
+    elif conversation.missing_field == "start" and start_time and DATE_ANSWER_RE.match(answer):
+        start_date = fast_parse_date(answer, datetime.date.today())
+    else:
+        return None
+    if not start_date or not start_time:
+        return None
+    return complete_reservation(reservation, start_date, start_time)
+
+def parse_turn(text, conversation):
+    """Parse a message in the context of a conversation; returns (reservation, tier)"""
+    stage_started = time.perf_counter()
+    reservation = parse_answer(text, conversation)
+    record_stage_since("answer", stage_started)
+    if reservation is not None:
+        PARSE_TIER.labels("answer").inc()
+        return reservation, "answer"
+    return parse_reservation(text, conversation.reservation)
+
+def parse_reservation_text(text, current_reservation=None):
+    """Process reservation text using the provided logic"""
+    reservation, _ = parse_reservation(text, current_reservation)
+    return reservation
+
+def parse_reservation_texts(texts, batch_size=None, n_process=None, with_tier=False):
+    """Parse many messages, streaming the ones the fast path can't resolve through nlp.pipe.
+
+    Yields one reservation dict per input, in order, or None for an input
+    that could not be parsed; a failing item does not stop the batch. With
+    with_tier=True, yields (reservation, tier) pairs instead.
+    """
+    batch_size = batch_size or NLP_BATCH_SIZE
+    n_process = n_process or NLP_N_PROCESS
+
+    def fast_tier(items):
+        for text in items:
+            if not text or not isinstance(text, str):
+                yield text, None, None
+                continue
+            state = get_default_reservation()
+            try:
+                resource, text = extract_resource(text)
+                if resource:
+                    state["resource"] = resource
+                rule, text = extract_recurrence(text)
+                if rule:
+                    state["rrule"] = rule
+                yield text, state, fast_parse(text, dict(state))
+            except Exception as e:
+                print(f"Error in fast parse: {e}")
+                yield text, state, None
+
+    items, pipe_input = itertools.tee(fast_tier(texts))
+
+    model = get_nlp()
+    docs = None
+    # The per-message parse deadline doesn't apply to bulk parsing; only overload degrades it
+    degraded = "overload" if model is not None and overloaded.get() else None
+    if degraded:
+        model = None
+    if model is not None:
+        docs = model.pipe(
+            (text for text, state, fast_result in pipe_input
+             if fast_result is None and text and isinstance(text, str)),
+            batch_size=batch_size,
+            n_process=n_process,
+        )
+
+    for text, state, fast_result in items:
+        if fast_result is not None:
+            result, tier = fast_result, "fast"
+        elif not text or not isinstance(text, str):
+            result, tier = (get_default_reservation() if text == "" else None), "fast"
+        else:
+            entities = ()
+            tier = "regex"
+            if degraded:
+                PARSE_DEGRADED.inc(reason=degraded)
+            if docs is not None:
+                try:
+                    entities = next(docs).ents
+                    tier = "ner"
+                except Exception as e:
+                    # The pipe can't be resumed; finish the batch with regex-only parsing
+                    print(f"Error in batch NER: {e}")
+                    docs = None
+            try:
+                result = apply_reservation_entities(text, entities, state)
+            except Exception as e:
+                print(f"Error parsing batch item: {e}")
+                result = None
+        PARSE_TIER.labels(tier).inc()
+        yield (result, tier) if with_tier else result
+
+def apply_reservation_entities(text, entities, current_reservation, found=None):
+    """Fill current_reservation from NER entities and the regex fallbacks (found: lexicon.scan of text)"""
+    stage_started = time.perf_counter()
     # Extract entities with better filtering
-    for ent in doc.ents:
+    for ent in entities:
         if ent.label_ == "PERSON":
-            if (ent.text.lower() not in excluded_names and 
+            ent_lower = ent.text.lower()
+            if (ent_lower not in EXCLUDED_NAMES and 
                 len(ent.text) > 1 and
                 not ent.text.isdigit() and
-                not any(date_word in ent.text.lower() for date_word in ["today", "tomorrow", "yesterday"]) and
-                not any(day in ent.text.lower() for day in ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]) and
+                not DAY_WORD_RE.search(ent_lower) and
                 not is_time_expression(ent.text)):
                 current_reservation["title"] = ent.text + " Appointment"
         elif ent.label_ == "DATE":
             try:
                 date_text = ent.text.lower()
-                today = datetime.datetime.now()
                 
-                if date_text == "today":
-                    current_reservation["start"] = today.strftime("%d.%m.%Y")
-                elif date_text == "tomorrow":
-                    tomorrow = today + datetime.timedelta(days=1)
-                    current_reservation["start"] = tomorrow.strftime("%d.%m.%Y")
-                elif date_text == "yesterday":
-                    yesterday = today - datetime.timedelta(days=1)
-                    current_reservation["start"] = yesterday.strftime("%d.%m.%Y")
+                if date_text in ("today", "tomorrow", "yesterday"):
+                    current_reservation["start"] = relative_days().formatted[date_text]
                 else:
                     date_text = date_text.replace("next ", "").replace("this ", "")
                     parsed_date = parser.parse(date_text, fuzzy=True)
                     current_reservation["start"] = parsed_date.strftime("%d.%m.%Y")
             except:
                 try:
-                    today = datetime.datetime.now()
-                    weekday_map = {
-                        'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
-                        'friday': 4, 'saturday': 5, 'sunday': 6
-                    }
-                    
-                    for day_name, day_num in weekday_map.items():
-                        if day_name in ent.text.lower():
-                            days_ahead = (day_num - today.weekday() + 7) % 7
-                            if days_ahead == 0:
-                                days_ahead = 7
-                            next_day = today + datetime.timedelta(days=days_ahead)
-                            current_reservation["start"] = next_day.strftime("%d.%m.%Y")
-                            break
+                    weekday_match = WEEKDAY_RE.search(ent.text.lower())
+                    if weekday_match:
+                        current_reservation["start"] = relative_days().formatted["next " + weekday_match.group(0)]
                     else:
                         current_reservation["start"] = ent.text
                 except:
@@ -152,104 +569,66 @@ def parse_reservation_text(text, current_reservation=None):
             except:
                 current_reservation["end"] = time_text
 
+    stage_started = record_stage_since("entity_extraction", stage_started)
+
     # Fallback: if entities weren't properly detected, use pattern matching
     if not current_reservation.get("title"):
-        name_patterns = [
-            r"under\s+the\s+name\s+of\s+([a-zA-Z\s]+)",
-            r"under\s+([a-zA-Z\s]+)",
-            r"for\s+([a-zA-Z\s]+)(?:\s+on|\s+at|$)",
-            r"name\s+is\s+([a-zA-Z\s]+)",
-            r"reservation\s+for\s+([a-zA-Z\s]+)"
-        ]
-        for pattern in name_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in FALLBACK_NAME_PATTERNS:
+            match = pattern.search(text)
             if match:
                 name_candidate = match.group(1).strip()
-                if (name_candidate.lower() not in excluded_names and 
+                if (name_candidate.lower() not in EXCLUDED_NAMES and 
+                    not is_name_stop_word(name_candidate) and
                     len(name_candidate) > 1 and
                     not name_candidate.isdigit() and
                     not is_time_expression(name_candidate)):
                     current_reservation["title"] = name_candidate + " Appointment"
+                    FALLBACKS.inc(field="title")
                     break
 
     # Improved time parsing that handles minutes and various time formats
-    if not current_reservation.get("end") or any(word in str(current_reservation.get("end", "")).lower() for word in ["afternoon", "morning", "evening", "night"]):
-        time_patterns = [
-            r'(\d{1,2})\s*(?:o\'?clock)?\s*(?:in the\s+)?(afternoon|evening|morning|night)',
-            r'(\d{1,2})\s*(?:o\'?clock)?\s*(am|pm)',
-            r'(\d{1,2})(?::(\d{2}))?\s*(am|pm)?',  # This pattern now captures minutes
-            r'(\d{1,2})(?::(\d{2}))?\s*(?:in the\s+)?(afternoon|evening|morning|night)'
-        ]
-        
-        for pattern in time_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+    if not current_reservation.get("end") or PERIOD_WORD_RE.search(str(current_reservation.get("end", "")).lower()):
+        for pattern in FALLBACK_TIME_PATTERNS:
+            match = pattern.search(text)
             if match:
                 hour = int(match.group(1))
                 minutes = 0  # Default to 0 minutes
-                
-                # Check if minutes are captured (group 2)
-                if match.lastindex >= 2 and match.group(2) and match.group(2).isdigit():
-                    minutes = int(match.group(2))
-                
                 period = None
-                # Determine which group contains the period indicator
-                if match.lastindex >= 3 and match.group(match.lastindex):
-                    period = match.group(match.lastindex).lower()
+                
+                # Minutes are the digit group after the hour, the period is the last word group
+                for group in match.groups()[1:]:
+                    if not group:
+                        continue
+                    if group.isdigit():
+                        minutes = int(group)
+                    else:
+                        period = group.lower()
                 
                 # Handle 12-hour format conversion
-                if period in ['pm', 'afternoon', 'evening', 'night']:
-                    if hour < 12:
-                        hour += 12
-                elif period in ['am', 'morning'] and hour == 12:
-                    hour = 0
+                hour = to_24_hour(hour, period)
                     
                 # Format time with minutes
                 current_reservation["end"] = f"{hour:02d}:{minutes:02d}"
+                FALLBACKS.inc(field="end")
                 break
 
     if not current_reservation.get("start"):
-        today = datetime.datetime.now()
-        
-        if re.search(r'\btoday\b', text, re.IGNORECASE):
-            current_reservation["start"] = today.strftime("%d.%m.%Y")
-        elif re.search(r'\btomorrow\b', text, re.IGNORECASE):
-            tomorrow = today + datetime.timedelta(days=1)
-            current_reservation["start"] = tomorrow.strftime("%d.%m.%Y")
-        elif re.search(r'\byesterday\b', text, re.IGNORECASE):
-            yesterday = today - datetime.timedelta(days=1)
-            current_reservation["start"] = yesterday.strftime("%d.%m.%Y")
-        else:
-            weekday_map = {
-                'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
-                'friday': 4, 'saturday': 5, 'sunday': 6
-            }
-            
-            next_day_match = re.search(r'next\s+(\w+)', text, re.IGNORECASE)
-            if next_day_match:
-                day_name = next_day_match.group(1).lower()
-                if day_name in weekday_map:
-                    day_num = weekday_map[day_name]
-                    days_ahead = (day_num - today.weekday() + 7) % 7
-                    if days_ahead == 0:
-                        days_ahead = 7
-                    next_day = today + datetime.timedelta(days=days_ahead)
-                    current_reservation["start"] = next_day.strftime("%d.%m.%Y")
-            else:
-                for day_name, day_num in weekday_map.items():
-                    if re.search(r'\b' + day_name + r'\b', text, re.IGNORECASE):
-                        days_ahead = (day_num - today.weekday() + 7) % 7
-                        if days_ahead == 0:
-                            current_reservation["start"] = today.strftime("%d.%m.%Y")
-                        else:
-                            next_day = today + datetime.timedelta(days=days_ahead)
-                            current_reservation["start"] = next_day.strftime("%d.%m.%Y")
-                        break
+        # Same precedence as the fast path, but DD.MM.YYYY dates are left to NER
+        word = day_word(scan(text) if found is None else found, numeric=False)
+        if word is not None:
+            current_reservation["start"] = relative_days().formatted[word]
+        if current_reservation.get("start"):
+            FALLBACKS.inc(field="start")
+
+    stage_started = record_stage_since("regex_fallback", stage_started)
 
     # Convert to ISO format if we have both date and time - FIXED MINUTES HANDLING
     if current_reservation.get("start") and current_reservation.get("end"):
         try:
-            # Parse the date (handles DD.MM.YYYY format)
-            start_date = parser.parse(current_reservation["start"], dayfirst=True)
+            # Read the date (DD.MM.YYYY, as set above, or ISO)
+            start_date = date_from_state(current_reservation["start"])
+            if start_date is None:
+                raise ValueError(f"Unrecognized date: {current_reservation['start']}")
             
             # Parse the time (handles HH:MM format with minutes)
             time_str = current_reservation["end"]
@@ -265,7 +644,7 @@ def parse_reservation_text(text, current_reservation=None):
             
             # Create datetime objects with proper minutes
             start_datetime = datetime.datetime.combine(
-                start_date.date(), 
+                start_date, 
                 datetime.time(hours, minutes)
             )
             
@@ -278,6 +657,7 @@ def parse_reservation_text(text, current_reservation=None):
             
         except Exception as e:
             print(f"Error converting date/time: {e}")
+            PARSE_FAILURES.inc(stage="datetime_conversion")
             # Fallback: try to parse as complete datetime string
             try:
                 start_datetime = parser.parse(current_reservation["start"] + " " + current_reservation["end"])
@@ -286,46 +666,166 @@ def parse_reservation_text(text, current_reservation=None):
                 current_reservation["end"] = end_datetime.strftime("%Y-%m-%dT%H:%M:%S")
             except:
                 print(f"Fallback parsing also failed: {e}")
+                PARSE_FAILURES.inc(stage="datetime_fallback")
 
+    record_stage_since("datetime_conversion", stage_started)
     return current_reservation
 
 def check_overlap(new_event, existing_events):
     """Check if new event overlaps with any existing events"""
+    with stage("check_overlap"):
+        return check_overlap_linear(new_event, existing_events)
+
+def check_overlap_linear(new_event, existing_events):
+    """Compare new_event against every existing event"""
     try:
-        new_start = parser.parse(new_event["start"])
-        new_end = parser.parse(new_event["end"])
+        new_start = to_minutes(new_event["start"])
+        new_end = to_minutes(new_event["end"])
         
         for event in existing_events:
-            existing_start = parser.parse(event["start"])
-            existing_end = parser.parse(event["end"])
-            
-            if (new_start < existing_end and new_end > existing_start):
+            if new_start < to_minutes(event["end"]) and new_end > to_minutes(event["start"]):
                 return True
         return False
     except:
         return False
 
+def get_calendar_id():
+    """Return the calendar id for this session, creating one on first use"""
+    calendar_id = session.get('calendar_id')
+    if not calendar_id:
+        calendar_id = uuid.uuid4().hex
+        session['calendar_id'] = calendar_id
+    return calendar_id
+
+def finish_turn(conversation, response):
+    """Keep the dialog state for the next turn (or drop it once booked) and send the response"""
+    try:
+        if response.get("reservation_complete"):
+            conversations.discard(conversation.id)
+            response["conversation_id"] = None
+        else:
+            reservation = response["reservation"]
+            conversation.reservation = reservation
+            conversation.missing_field = response.get("missing_field")
+            # Remember the resolved day and time so a short answer can reuse them
+            conversation.date = date_from_state(reservation.get("start"))
+            conversation.time = time_from_state(reservation.get("end"))
+            conversations.save(conversation)
+            response["conversation_id"] = conversation.id
+    except Exception as e:
+        print(f"Error saving conversation: {e}")
+        ERRORS.inc(where="conversation_store")
+        response["conversation_id"] = None
+    return jsonify(response)
+
+def parse_day(value):
+    """Read the date part of a YYYY-MM-DD or ISO datetime query parameter"""
+    return dt.fromisoformat(value[:10]).date()
+
+def suggest_free_slots(calendar_id, requested_start, resource=None):
+    """Find the free slots of a resource nearest to a requested start that conflicts with a booking"""
+    try:
+        around = dt.fromisoformat(requested_start)
+        occupancy = occupancy_cache.occupancy(
+            reservation_store, calendar_id,
+            around.date(), around.date() + datetime.timedelta(days=SUGGESTION_SEARCH_DAYS),
+            resource
+        )
+        return nearest_free_slots(occupancy, around, count=SUGGESTION_COUNT, not_before=dt.now())
+    except Exception as e:
+        print(f"Error suggesting free slots: {e}")
+        ERRORS.inc(where="suggest_free_slots")
+        return []
+
+class TimedSessionInterface(SecureCookieSessionInterface):
+    """Cookie sessions whose serialization is recorded as a stage"""
+
+    def save_session(self, app, session, response):
+        with stage("session_save"):
+            super().save_session(app, session, response)
+
+app.session_interface = TimedSessionInterface()
+
+def admission_controlled(view):
+    """Shed requests with a fast retry response when the worker is saturated, and give admitted
+    ones a parse deadline (regex-only parsing when overloaded)"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        admitted, reason = admission.try_enter(queue_wait(request.headers.get('X-Request-Start')))
+        if not admitted:
+            REQUESTS_SHED.inc(reason=reason)
+            response = jsonify({
+                "success": False,
+                "retry": True,
+                "retry_after": RETRY_AFTER_SECONDS,
+                "messages": ["The assistant is busy right now. Please try again in a moment."],
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+            return response
+        deadline_token = parse_deadline.set(g.get('request_started', time.perf_counter()) + PARSE_DEADLINE_MS / 1000)
+        overloaded_token = overloaded.set(reason == "overload")
+        try:
+            return view(*args, **kwargs)
+        finally:
+            overloaded.reset(overloaded_token)
+            parse_deadline.reset(deadline_token)
+            admission.leave()
+    return wrapper
+
+def wants_debug_timings():
+    """Per-request timing breakdown, requested with ?debug_timings=1 or an X-Debug-Timings header"""
+    return request.args.get('debug_timings') == '1' or request.headers.get('X-Debug-Timings') == '1'
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.timings_token = request_timings.set({} if wants_debug_timings() else None)
+
+@app.after_request
+def record_request_time(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    REQUEST_SECONDS.labels(request.endpoint or "unknown").observe(elapsed)
+
+    timings = request_timings.get()
+    request_timings.reset(g.timings_token)
+    if timings is not None and response.is_json:
+        data = response.get_json()
+        if isinstance(data, dict):
+            data["timings_ms"] = dict(timings, total=elapsed * 1000)
+            response.set_data(json.dumps(data))
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def index():
-    # Initialize session reservations if not exists
-    if 'reservations' not in session:
-        session['reservations'] = []
+    # Initialize the session calendar if not exists
+    get_calendar_id()
     return render_template('index.html')
 
 @app.route('/process_reservation', methods=['POST'])
+@admission_controlled
 def process_reservation():
     try:
         user_message = request.json.get('message', '')
-        current_reservation = request.json.get('current_reservation', {})
+        # Dialog state stays on the server; clients only send back the conversation id
+        conversation = conversations.resume(request.json.get('conversation_id'), get_calendar_id())
         
         # Parse the reservation
-        reservation = parse_reservation_text(user_message, current_reservation)
+        reservation, parse_tier = parse_turn(user_message, conversation)
         
         response = {
             "reservation": reservation,
             "messages": [],
             "needs_info": False,
-            "success": True
+            "success": True,
+            "parse_tier": parse_tier
         }
         
         # Check for missing information and prompt user
@@ -337,23 +837,25 @@ def process_reservation():
         if end_time:
             try:
                 # Extract time from the datetime string for working hours check
-                time_obj = parser.parse(end_time).time()
+                time_obj = time_of_day(end_time)
                 if not is_within_working_hours(time_obj):
+                    BOOKING_OUTCOMES.inc(outcome="outside_hours")
                     response["messages"].append("The time you entered is outside working hours (09:00-17:00). Please enter a different time:")
                     response["needs_info"] = True
                     response["missing_field"] = "end"
                     reservation["end"] = None  # Reset time to force re-entry
-                    return jsonify(response)  # Return early to prioritize time validation
+                    return finish_turn(conversation, response)  # Return early to prioritize time validation
             except Exception as e:
                 print(f"Time parsing error: {e}")
+                BOOKING_OUTCOMES.inc(outcome="invalid_time")
                 response["messages"].append("Invalid time format. Please enter a valid time:")
                 response["needs_info"] = True
                 response["missing_field"] = "end"
                 reservation["end"] = None
-                return jsonify(response)  # Return early for invalid time format
+                return finish_turn(conversation, response)  # Return early for invalid time format
         
         # THEN: Check for other missing information
-        if not title or title.lower() in excluded_names or is_time_expression(title):
+        if not title or title.lower() in EXCLUDED_NAMES or is_time_expression(title):
             response["messages"].append("Please enter the name for the appointment:")
             response["needs_info"] = True
             response["missing_field"] = "title"
@@ -369,28 +871,54 @@ def process_reservation():
             response["missing_field"] = "end"
         
         else:
-            # If all information is complete and valid, check for overlaps
-            existing_reservations = session.get('reservations', [])
-            if check_overlap(reservation, existing_reservations):
-                response["messages"].append("That time is already booked. Please choose a different time.")
+            # If all information is complete and valid, book it unless it overlaps:
+            # the store checks and inserts atomically, so concurrent requests can't double-book
+            recurring = bool(reservation.get("rrule"))
+            calendar_id = conversation.owner
+            if recurring:
+                # Stored once; conflicts are checked against its lazily expanded occurrences
+                booking = RecurringReservation.from_event(reservation)
+                with stage("booking"):
+                    stored = reservation_store.book_series(calendar_id, booking)
+            else:
+                booking = Reservation.from_event(reservation)
+                with stage("booking"):
+                    stored = reservation_store.book_reservation(calendar_id, booking)
+            if stored is None:
+                BOOKING_OUTCOMES.inc(outcome="conflict")
+                if recurring:
+                    response["messages"].append("Some of these appointments overlap existing bookings. Please choose a different time.")
+                elif booking.resource:
+                    response["messages"].append(f"{booking.resource} is already booked at that time. Please choose a different time.")
+                else:
+                    response["messages"].append("That time is already booked. Please choose a different time.")
+                suggestions = [] if recurring else suggest_free_slots(calendar_id, reservation["start"], booking.resource)
+                if suggestions:
+                    response["suggested_slots"] = suggestions
+                    response["messages"].append("The nearest free times are: " + ", ".join(
+                        dt.fromisoformat(slot["start"]).strftime("%d.%m.%Y at %H:%M") for slot in suggestions
+                    ) + ".")
                 response["needs_info"] = True
                 response["missing_field"] = "end"
                 reservation["end"] = None
             else:
-                # Add to session and confirm
-                existing_reservations.append(reservation)
-                session['reservations'] = existing_reservations
-                session.modified = True
+                BOOKING_OUTCOMES.inc(outcome="booked")
                 
                 # Format confirmation message
                 try:
-                    start_dt = parser.parse(reservation["start"])
-                    end_dt = parser.parse(reservation["end"])
+                    start_dt = booking.start_datetime
                     
-                    response["messages"].append(
-                        f"Appointment booked for {reservation['title']} on " +
-                        f"{start_dt.strftime('%d.%m.%Y')} at {start_dt.strftime('%H:%M')}."
-                    )
+                    with_resource = f" with {booking.resource}" if booking.resource else ""
+                    if recurring:
+                        response["messages"].append(
+                            f"Recurring appointment booked for {reservation['title']}{with_resource}, " +
+                            f"{booking.describe()}, starting {start_dt.strftime('%d.%m.%Y')} at {start_dt.strftime('%H:%M')}."
+                        )
+                    else:
+                        response["messages"].append(
+                            f"Appointment booked for {reservation['title']}{with_resource} on " +
+                            f"{start_dt.strftime('%d.%m.%Y')} at {start_dt.strftime('%H:%M')}."
+                        )
                     response["reservation_complete"] = True
                 except Exception as e:
                     response["messages"].append(
@@ -402,10 +930,11 @@ def process_reservation():
         if not response["messages"] and not response.get("reservation_complete"):
             response["messages"].append("I'm processing your reservation. Please provide more details if needed.")
         
-        return jsonify(response)
+        return finish_turn(conversation, response)
     
     except Exception as e:
         print(f"Error in process_reservation: {e}")
+        ERRORS.inc(where="process_reservation")
         return jsonify({
             "success": False,
             "messages": ["Sorry, there was an error processing your request. Please try again."],
@@ -413,12 +942,300 @@ def process_reservation():
             "needs_info": False
         })
 
+@app.route('/process_reservations_batch', methods=['POST'])
+@admission_controlled
+def process_reservations_batch():
+    try:
+        messages = request.json.get('messages', [])
+        if not isinstance(messages, list) or len(messages) > MAX_BATCH_MESSAGES:
+            return jsonify({
+                "success": False,
+                "messages": [f"Please send a list of at most {MAX_BATCH_MESSAGES} messages."],
+                "results": []
+            })
+
+        batch_size = request.json.get('batch_size')
+        batch_size = int(batch_size) if batch_size else None
+
+        results = []
+        for reservation, parse_tier in parse_reservation_texts(messages, batch_size=batch_size, with_tier=True):
+            if reservation is None:
+                results.append({"success": False, "reservation": {}, "complete": False, "parse_tier": parse_tier})
+                continue
+            complete = all(safe_get(reservation, key) for key in ("title", "start", "end"))
+            results.append({"success": True, "reservation": reservation, "complete": complete, "parse_tier": parse_tier})
+
+        return jsonify({"success": True, "results": results})
+
+    except Exception as e:
+        print(f"Error in process_reservations_batch: {e}")
+        ERRORS.inc(where="process_reservations_batch")
+        return jsonify({
+            "success": False,
+            "messages": ["Sorry, there was an error processing your request. Please try again."],
+            "results": []
+        })
+
+@app.route('/availability', methods=['GET'])
+def availability():
+    try:
+        if request.args.get('date'):
+            first_day = parse_day(request.args['date'])
+            last_day = first_day + datetime.timedelta(days=1)
+        else:
+            # FullCalendar-style window: start inclusive, end exclusive
+            first_day = parse_day(request.args['start'])
+            last_day = parse_day(request.args['end']) if request.args.get('end') else first_day + datetime.timedelta(days=1)
+        slot_minutes = int(request.args.get('slot_minutes', 60))
+
+        if not 0 < slot_minutes <= 8 * 60 or not 0 < (last_day - first_day).days <= MAX_AVAILABILITY_DAYS:
+            return jsonify({
+                "success": False,
+                "messages": [f"Please request between 1 and {MAX_AVAILABILITY_DAYS} days with a slot length of up to 8 hours."],
+                "slots": []
+            })
+
+        calendar_id = session.get('calendar_id')
+        resource = request.args.get('resource') or None
+        if calendar_id:
+            occupancy = occupancy_cache.occupancy(reservation_store, calendar_id, first_day, last_day, resource)
+        else:
+            occupancy = day_occupancy([], first_day, last_day)
+        return jsonify({
+            "success": True,
+            "slot_minutes": slot_minutes,
+            "slots": free_slots(occupancy, slot_minutes)
+        })
+
+    except Exception as e:
+        print(f"Error in availability: {e}")
+        ERRORS.inc(where="availability")
+        return jsonify({
+            "success": False,
+            "messages": ["Please provide a date (YYYY-MM-DD) or a start/end range."],
+            "slots": []
+        })
+
+def import_format(requested, filename, mimetype):
+    """Pick the import parser from ?format=, the file name or the content type"""
+    if requested:
+        return requested.lower()
+    if filename.lower().endswith(".ics") or "calendar" in mimetype:
+        return "ics"
+    if filename.lower().endswith(".csv") or "csv" in mimetype:
+        return "csv"
+    return None
+
+def import_problem(event):
+    """Return (status, message) for an imported event the chatbot wouldn't accept either, or None"""
+    if not event.get("title"):
+        return "invalid", "missing title"
+    start, end = to_datetime(event["start"]), to_datetime(event["end"])
+    if end <= start:
+        return "invalid", "ends before it starts"
+    if event.get("allDay"):
+        return None
+    if start.date() != end.date() or not (is_within_working_hours(start.time()) and is_within_working_hours(end.time())):
+        return "outside_hours", "outside working hours (09:00-17:00)"
+    return None
+
+@app.route('/import', methods=['POST'])
+def import_reservations():
+    try:
+        calendar_id = get_calendar_id()
+        upload = request.files.get('file')
+        if upload is not None:
+            stream, filename = upload.stream, upload.filename or ""
+        else:
+            stream, filename = request.stream, ""
+        file_format = import_format(request.args.get('format'), filename, request.mimetype or "")
+        if file_format not in ("ics", "csv"):
+            return jsonify({
+                "success": False,
+                "messages": ["Please upload an .ics or .csv file (or pass format=ics or format=csv)."],
+                "rows": []
+            })
+
+        # Rows are parsed and validated as they are read; only the compact reservations are kept
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+        rows = read_ics(text) if file_format == "ics" else read_csv(text)
+        report, singles, single_positions, series = [], [], [], []
+        with stage("import_parse"):
+            for row, event, error in itertools.islice(rows, MAX_IMPORT_ROWS):
+                problem = ("invalid", error) if error else import_problem(event)
+                if problem is None:
+                    try:
+                        if event.get("rrule"):
+                            series.append((len(report), RecurringReservation.from_event(event)))
+                        else:
+                            single_positions.append(len(report))
+                            singles.append(Reservation.from_event(event))
+                    except ValueError as e:
+                        problem = ("invalid", str(e))
+                if problem is None:
+                    report.append({"row": row, "status": None})
+                else:
+                    report.append({"row": row, "status": problem[0], "message": problem[1]})
+            truncated = next(rows, None) is not None
+
+        # All conflicts (with stored bookings and within the file) are found in one sweep per resource
+        with stage("import_booking"):
+            stored = reservation_store.book_reservations(calendar_id, singles) if singles else []
+            for position, event in zip(single_positions, stored):
+                report[position]["status"] = "imported" if event is not None else "conflict"
+                if event is not None:
+                    report[position]["id"] = event["id"]
+            for position, item in series:
+                event = reservation_store.book_series(calendar_id, item)
+                report[position]["status"] = "imported" if event is not None else "conflict"
+                if event is not None:
+                    report[position]["id"] = event["id"]
+        for entry in report:
+            if entry["status"] == "conflict":
+                entry["message"] = "overlaps an existing booking or an earlier row"
+
+        counts = {status: 0 for status in ("imported", "conflict", "outside_hours", "invalid")}
+        for entry in report:
+            counts[entry["status"]] += 1
+        BOOKING_OUTCOMES.inc(counts["imported"], outcome="imported")
+        messages = [f"Imported {counts['imported']} of {len(report)} reservations."]
+        if truncated:
+            messages.append(f"Only the first {MAX_IMPORT_ROWS} rows were read.")
+        return jsonify({"success": True, "messages": messages, "counts": counts, "rows": report})
+
+    except Exception as e:
+        print(f"Error in import_reservations: {e}")
+        ERRORS.inc(where="import_reservations")
+        return jsonify({
+            "success": False,
+            "messages": ["Sorry, the file could not be imported. Please check its format."],
+            "rows": []
+        })
+
+@app.route('/export', methods=['GET'])
+def export_reservations():
+    try:
+        calendar_id = session.get('calendar_id')
+        file_format = (request.args.get('format') or 'ics').lower()
+        if file_format not in ("ics", "csv"):
+            return jsonify({"success": False, "messages": ["Please choose format=ics or format=csv."]})
+        events = reservation_store.iter_reservations(calendar_id) if calendar_id else iter(())
+        series = reservation_store.list_series(calendar_id) if calendar_id else []
+        # The body is generated while it is sent, so large calendars are never rendered in full
+        if file_format == "csv":
+            body, mimetype = write_csv(events, series), "text/csv"
+        else:
+            body, mimetype = write_ics(events, series), "text/calendar"
+        response = Response(body, mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename=reservations.{file_format}'
+        return response
+
+    except Exception as e:
+        print(f"Error in export_reservations: {e}")
+        ERRORS.inc(where="export_reservations")
+        return jsonify({"success": False, "messages": ["Sorry, the calendar could not be exported."]})
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    try:
+        calendar_id = session.get('calendar_id')
+        first_day = parse_day(request.args['start']) if request.args.get('start') else None
+        last_day = parse_day(request.args['end']) if request.args.get('end') else None
+        if (first_day is None) != (last_day is None) or (first_day is not None and last_day <= first_day):
+            return jsonify({"success": False, "messages": ["Please provide both start and end (end exclusive), or neither."]})
+        pair_limit = min(int(request.args.get('pair_limit', STATS_PAIR_LIMIT)), 10000)
+
+        with stage("storage_read"):
+            if not calendar_id:
+                spans = []
+            elif first_day is not None:
+                spans = reservation_store.list_spans(
+                    calendar_id, f"{first_day.isoformat()}T00:00:00", f"{last_day.isoformat()}T00:00:00"
+                )
+            else:
+                spans = reservation_store.list_spans(calendar_id)
+        with stage("analytics"):
+            report = calendar_report(spans, first_day, last_day, request.args.get('resource') or None,
+                                     pair_limit, MAX_STATS_DAYS)
+        if report is None:
+            return jsonify({"success": False, "messages": [f"Please request at most {MAX_STATS_DAYS} days with start and end."]})
+        return jsonify(dict(report, success=True))
+
+    except Exception as e:
+        print(f"Error in stats: {e}")
+        ERRORS.inc(where="stats")
+        return jsonify({"success": False, "messages": ["Please provide start and end dates as YYYY-MM-DD."]})
+
+def parse_range_param(value):
+    """Normalize a FullCalendar start/end parameter to the stored local ISO format"""
+    if len(value) == 10:
+        return dt.fromisoformat(value).strftime("%Y-%m-%dT00:00:00")
+    # Drop any UTC offset; reservations are stored in local time like the calendar shows them
+    return dt.fromisoformat(value[:19]).strftime("%Y-%m-%dT%H:%M:%S")
+
+def bad_request(message):
+    """A 400 JSON response for an invalid query parameter"""
+    response = jsonify({"success": False, "messages": [message]})
+    response.status_code = 400
+    return response
+
 @app.route('/get_reservations', methods=['GET'])
 def get_reservations():
     try:
-        return jsonify(session.get('reservations', []))
+        calendar_id = session.get('calendar_id')
+        revision = reservation_store.get_revision(calendar_id) if calendar_id else 0
+        resource = request.args.get('resource') or ANY_RESOURCE
+
+        since = request.args.get('since')
+        if since is not None:
+            if not since.isdecimal():
+                return bad_request("'since' must be a calendar revision (a non-negative integer).")
+            # Incremental sync: only what was added or removed after the client's revision
+            changes = reservation_store.list_changes(calendar_id, int(since)) if calendar_id else (0, [], [])
+            if changes is None:
+                response = jsonify({
+                    "revision": revision,
+                    "reset": True,
+                    "added": reservation_store.list_reservations(calendar_id, resource),
+                    "removed": []
+                })
+            else:
+                revision, added, removed = changes
+                if resource is not ANY_RESOURCE:
+                    added = [event for event in added if event.get("resource") == resource]
+                response = jsonify({"revision": revision, "reset": False, "added": added, "removed": removed})
+            response.headers['X-Calendar-Revision'] = str(revision)
+            return response
+
+        start = request.args.get('start')
+        end = request.args.get('end')
+        if start and end:
+            try:
+                range_start, range_end = parse_range_param(start), parse_range_param(end)
+            except ValueError:
+                return bad_request("'start' and 'end' must be ISO dates or date-times.")
+        etag = hashlib.sha1(
+            f"{calendar_id}|{revision}|{start}|{end}|{request.args.get('resource', '')}".encode()
+        ).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            with stage("storage_read"):
+                if not calendar_id:
+                    events = []
+                elif start and end:
+                    events = reservation_store.find_conflicts(calendar_id, range_start, range_end, resource)
+                else:
+                    events = reservation_store.list_reservations(calendar_id, resource)
+            response = jsonify(events)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Calendar-Revision'] = str(revision)
+        return response
+
     except Exception as e:
         print(f"Error in get_reservations: {e}")
+        ERRORS.inc(where="get_reservations")
         return jsonify([])
 
 if __name__ == '__main__':
@@ -0,0 +1,119 @@
+import datetime
+import threading
+from collections import OrderedDict
+
+from reservation import to_datetime
+
+# Working hours enforced by is_within_working_hours
+WORKDAY_START = datetime.time(9, 0)
+WORKDAY_END = datetime.time(17, 0)
+WORKDAY_MINUTES = (WORKDAY_END.hour * 60 + WORKDAY_END.minute) - (WORKDAY_START.hour * 60 + WORKDAY_START.minute)
+FULL_DAY_MASK = (1 << WORKDAY_MINUTES) - 1
+
+
+def minute_of_workday(value):
+    """Minutes between the start of the working day and a datetime's time of day"""
+    return (value.hour * 60 + value.minute) - (WORKDAY_START.hour * 60 + WORKDAY_START.minute)
+
+
+def day_occupancy(events, first_day, last_day):
+    """Return {date: bitmask} of booked working-hour minutes for each day in [first_day, last_day)"""
+    occupancy = {}
+    day = first_day
+    while day < last_day:
+        occupancy[day] = 0
+        day += datetime.timedelta(days=1)
+
+    for event in events:
+        start = to_datetime(event["start"])
+        end = to_datetime(event["end"])
+        day = max(start.date(), first_day)
+        while day < last_day and day <= end.date():
+            # Clamp the event to this day's working window
+            first_minute = minute_of_workday(start) if day == start.date() else 0
+            last_minute = minute_of_workday(end) if day == end.date() else WORKDAY_MINUTES
+            first_minute = max(first_minute, 0)
+            last_minute = min(last_minute, WORKDAY_MINUTES)
+            if last_minute > first_minute:
+                occupancy[day] |= ((1 << (last_minute - first_minute)) - 1) << first_minute
+            day += datetime.timedelta(days=1)
+    return occupancy
+
+
+def iter_free_slots(occupancy, slot_minutes=60, step_minutes=None, not_before=None):
+    """Yield (start, end) datetimes of free slots, in order, from a day_occupancy map"""
+    step_minutes = step_minutes or slot_minutes
+    slot_mask = (1 << slot_minutes) - 1
+    for day in sorted(occupancy):
+        booked = occupancy[day]
+        if booked == FULL_DAY_MASK:
+            continue
+        day_start = datetime.datetime.combine(day, WORKDAY_START)
+        for offset in range(0, WORKDAY_MINUTES - slot_minutes + 1, step_minutes):
+            if booked & (slot_mask << offset):
+                continue
+            start = day_start + datetime.timedelta(minutes=offset)
+            if not_before is not None and start < not_before:
+                continue
+            yield start, start + datetime.timedelta(minutes=slot_minutes)
+
+
+def format_slots(slots):
+    """Convert (start, end) datetimes to the FullCalendar ISO shape"""
+    return [
+        {"start": start.strftime("%Y-%m-%dT%H:%M:%S"), "end": end.strftime("%Y-%m-%dT%H:%M:%S")}
+        for start, end in slots
+    ]
+
+
+def free_slots(occupancy, slot_minutes=60, step_minutes=None, not_before=None):
+    """List free slots within working hours for every day of an occupancy map"""
+    return format_slots(iter_free_slots(occupancy, slot_minutes, step_minutes, not_before))
+
+
+def nearest_free_slots(occupancy, around, count=3, slot_minutes=60, step_minutes=30, not_before=None):
+    """Return up to count free slots of an occupancy map closest to the requested start"""
+    around = to_datetime(around)
+    candidates = list(iter_free_slots(occupancy, slot_minutes, step_minutes, not_before))
+    candidates.sort(key=lambda slot: abs(slot[0] - around))
+    return format_slots(sorted(candidates[:count]))
+
+
+class OccupancyCache:
+    """Per-worker cache of per-day occupancy bitmaps for each calendar resource.
+
+    Days are loaded from the store on first use and kept until the calendar's
+    revision changes, so repeated availability queries skip the interval sweep.
+    """
+
+    def __init__(self, max_calendars=256):
+        self.max_calendars = max_calendars
+        self._calendars = OrderedDict()
+        self._lock = threading.Lock()
+
+    def occupancy(self, store, calendar_id, first_day, last_day, resource=None):
+        """Return {date: bitmask} for [first_day, last_day) of one resource of a stored calendar"""
+        revision = store.get_revision(calendar_id)
+        key = (calendar_id, resource)
+        with self._lock:
+            entry = self._calendars.get(key)
+            if entry is None or entry[0] != revision:
+                entry = (revision, {})
+                self._calendars[key] = entry
+            self._calendars.move_to_end(key)
+            while len(self._calendars) > self.max_calendars:
+                self._calendars.popitem(last=False)
+            days = entry[1]
+
+        requested = [first_day + datetime.timedelta(days=offset) for offset in range((last_day - first_day).days)]
+        missing = [day for day in requested if day not in days]
+        if missing:
+            load_from, load_to = missing[0], missing[-1] + datetime.timedelta(days=1)
+            events = store.find_conflicts(
+                calendar_id,
+                load_from.strftime("%Y-%m-%dT00:00:00"),
+                load_to.strftime("%Y-%m-%dT00:00:00"),
+                resource,
+            )
+            days.update(day_occupancy(events, load_from, load_to))
+        return {day: days[day] for day in requested}
@@ -0,0 +1,19 @@
+"""Fixed utterance corpus shared by the benchmarks: fast-path and NER-heavy messages."""
+
+REGEX_ONLY = [
+    "Book John tomorrow at 3pm",
+    "Appointment for Sarah on Monday at 2:30 pm",
+    "Book an appointment under the name Mike next friday at 10 am",
+    "Reservation for Emily Clark on 24.12.2026 at 11:15 am",
+    "Book me in for David at 3 in the afternoon tomorrow",
+]
+
+NER_HEAVY = [
+    "Can I get an appointment for my daughter sometime next week?",
+    "I'd like to see the doctor on the twelfth of November around noon",
+    "Please put Anna Schmidt down for the first Tuesday of next month",
+    "book me an appointment",
+    "my name is peter and I want to come by in the morning",
+]
+
+CORPUS = REGEX_ONLY + NER_HEAVY
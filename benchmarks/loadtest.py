@@ -0,0 +1,352 @@
+"""Concurrent load test: simulated users holding multi-turn chat conversations.
+
+Usage:
+    python benchmarks/loadtest.py [--users 20] [--dialogs 10] [--output results.json]
+    python benchmarks/loadtest.py --target gunicorn [--workers 4] [--threads 1]
+    python benchmarks/loadtest.py --target http --url http://127.0.0.1:8000
+
+Each virtual user keeps its own cookies (and so its own calendar). It loads the
+page and the calendar, then runs dialogs against /process_reservation: a complete
+booking, a missing name, date and time prompts, a retry after an outside-hours
+time and a retry after an overlapping booking. After each booking it syncs
+/get_reservations like the chat client does. Users answer whatever the server asks
+for, so each turn is reported under the prompt it answers. Shed requests (503 with
+"retry") are retried with backoff like the client.
+
+The report has throughput and p50/p95/p99 latency per endpoint and per dialog step.
+Targets: the Flask test client in this process (default), a gunicorn spawned on a
+free local port, or an already running server.
+"""
+import argparse
+import datetime
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+NAMES = ["John", "Sarah", "Mike", "Emily", "Anna", "Peter", "David", "Laura"]
+# Opening message of each dialog; {name}, {other} and {day} are filled in per dialog
+SCENARIOS = {
+    "complete": "Book {name} on {day} at 10 am",
+    "missing_name": "Book an appointment on {day} at 10 am",
+    "date_prompt": "My name is {name}",
+    "time_prompt": "Book {name} on {day}",
+    "outside_hours": "Book {name} on {day} at 8 pm",
+    "overlap": "Book {name} on {day} at 10 am",
+}
+# What a user answers to each prompt
+ANSWERS = {
+    "name_prompt": "My name is {name}",
+    "date_prompt": "{day}",
+    "time_prompt": "at 10 am",
+    "outside_hours_retry": "1 pm",
+    "overlap_retry": "11 am",
+    "other_prompt": "Book {name} on {day} at 10 am",
+}
+# A dialog that hasn't booked after this many turns is counted as abandoned
+MAX_TURNS = 8
+# Attempts per request when the server sheds load, as in static/script.js
+RETRY_ATTEMPTS = 3
+SERVER_START_TIMEOUT = 120
+
+
+def summarize(samples, wall_seconds):
+    """Count, throughput and latency percentiles (nearest rank) of a list of ms samples"""
+    samples = sorted(samples)
+
+    def percentile(fraction):
+        return samples[min(len(samples) - 1, max(math.ceil(fraction * len(samples)) - 1, 0))]
+
+    return {
+        "count": len(samples),
+        "rps": len(samples) / wall_seconds if wall_seconds else 0.0,
+        "mean_ms": statistics.mean(samples),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": samples[-1],
+    }
+
+
+class Recorder:
+    """Latency samples per endpoint and per dialog step, shared by all virtual users"""
+
+    def __init__(self):
+        self.endpoints = defaultdict(list)
+        self.steps = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.outcomes = Counter()
+        self._lock = threading.Lock()
+
+    def request(self, endpoint, status, ms, step=None):
+        with self._lock:
+            self.endpoints[endpoint].append(ms)
+            self.statuses[endpoint][status] += 1
+            if step:
+                self.steps[step].append(ms)
+
+    def outcome(self, name):
+        with self._lock:
+            self.outcomes[name] += 1
+
+    def report(self, wall_seconds):
+        return {
+            "wall_seconds": wall_seconds,
+            "requests": sum(len(samples) for samples in self.endpoints.values()),
+            "rps": sum(len(samples) for samples in self.endpoints.values()) / wall_seconds,
+            "dialogs": dict(self.outcomes),
+            "endpoints": {name: dict(summarize(samples, wall_seconds), statuses=dict(self.statuses[name]))
+                          for name, samples in sorted(self.endpoints.items())},
+            "steps": {name: summarize(samples, wall_seconds) for name, samples in sorted(self.steps.items())},
+        }
+
+
+class TestClientTransport:
+    """Requests through the Flask test client; each instance has its own cookie jar"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, payload=None):
+        response = self.client.open(path, method=method, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTransport:
+    """Requests over HTTP with a per-user cookie jar"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            request.add_header("Content-Type", "application/json")
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        try:
+            return status, json.loads(body)
+        except ValueError:
+            return status, None
+
+
+def dialog_step(response):
+    """Name the prompt a response asks the user to answer"""
+    messages = " ".join(response.get("messages", []))
+    if "outside working hours" in messages:
+        return "outside_hours_retry"
+    if "already booked" in messages or "overlap" in messages:
+        return "overlap_retry"
+    return {"title": "name_prompt", "start": "date_prompt", "end": "time_prompt"}.get(
+        response.get("missing_field"), "other_prompt")
+
+
+class VirtualUser:
+    def __init__(self, number, transport, recorder, think_seconds=0.0, seed=0):
+        self.number = number
+        self.transport = transport
+        self.recorder = recorder
+        self.think_seconds = think_seconds
+        self.random = random.Random(seed * 100003 + number)
+        self.revision = 0
+        self.days_used = 0
+
+    def call(self, endpoint, method, path, payload=None, step=None):
+        """Send a request, retrying shed ones after the advertised delay; returns (status, body)"""
+        for attempt in range(1, RETRY_ATTEMPTS + 1):
+            started = time.perf_counter()
+            status, body = self.transport.request(method, path, payload)
+            self.recorder.request(endpoint, status, (time.perf_counter() - started) * 1000, step)
+            if status != 503 or not (body or {}).get("retry") or attempt == RETRY_ATTEMPTS:
+                return status, body
+            time.sleep((body.get("retry_after") or 1) * attempt + self.random.random() * 0.5)
+
+    def think(self):
+        if self.think_seconds:
+            time.sleep(self.random.expovariate(1 / self.think_seconds))
+
+    def next_day(self):
+        """A fresh working day for each dialog, so the user's own bookings never collide by accident"""
+        self.days_used += 1
+        day = datetime.date.today() + datetime.timedelta(days=self.days_used)
+        while day.weekday() >= 5:
+            self.days_used += 1
+            day = datetime.date.today() + datetime.timedelta(days=self.days_used)
+        return day.strftime("%d.%m.%Y")
+
+    def open_calendar(self):
+        self.call("GET /", "GET", "/")
+        self.call("GET /get_reservations", "GET", "/get_reservations")
+
+    def sync(self):
+        status, body = self.call("GET /get_reservations?since", "GET", f"/get_reservations?since={self.revision}")
+        if status == 200 and body:
+            self.revision = body.get("revision", self.revision)
+
+    def converse(self, scenario, values):
+        """Run one dialog to a booking; returns True if booked"""
+        message = SCENARIOS[scenario].format(**values)
+        step, conversation_id = "opening", None
+        for _ in range(MAX_TURNS):
+            status, body = self.call("POST /process_reservation", "POST", "/process_reservation",
+                                     {"message": message, "conversation_id": conversation_id}, step)
+            if status != 200 or not body or not body.get("success"):
+                self.recorder.outcome("failed")
+                return False
+            if body.get("reservation_complete"):
+                self.sync()
+                return True
+            conversation_id = body.get("conversation_id")
+            step = dialog_step(body)
+            message = ANSWERS[step].format(**values)
+            self.think()
+        self.recorder.outcome("abandoned")
+        return False
+
+    def run(self, dialogs):
+        try:
+            self.open_calendar()
+            scenarios = list(SCENARIOS)
+            for number in range(dialogs):
+                scenario = scenarios[(self.number + number) % len(scenarios)]
+                values = {"name": self.random.choice(NAMES), "other": self.random.choice(NAMES), "day": self.next_day()}
+                if scenario == "overlap":
+                    # Take the slot first, so the dialog's request conflicts with it
+                    if not self.converse("complete", dict(values, name=values["other"])):
+                        continue
+                if self.converse(scenario, values):
+                    self.recorder.outcome(f"booked.{scenario}")
+                self.think()
+        except Exception as e:
+            print(f"Virtual user {self.number} stopped: {e}", file=sys.stderr)
+            self.recorder.outcome("failed")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_gunicorn(workers, threads, workdir):
+    """Start gunicorn on a free local port and wait until it serves; returns (process, base url)"""
+    port = free_port()
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, "load.db"))
+    env.setdefault("SECRET_KEY", "load-test")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+         "--threads", str(threads), "app:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + "/metrics", timeout=5):
+                return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not start within {SERVER_START_TIMEOUT}s")
+
+
+def run_load(make_transport, users, dialogs, think_seconds, seed):
+    recorder = Recorder()
+    virtual_users = [VirtualUser(number, make_transport(), recorder, think_seconds, seed) for number in range(users)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        for user in virtual_users:
+            executor.submit(user.run, dialogs)
+    return recorder.report(time.perf_counter() - started)
+
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['wall_seconds']:.2f}s ({report['rps']:.1f} req/s); "
+          f"dialogs: {', '.join(f'{name} {count}' for name, count in sorted(report['dialogs'].items()))}")
+    for title, section in (("endpoint", report["endpoints"]), ("dialog step", report["steps"])):
+        print(f"\n{title:<32} {'count':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for name, stats in section.items():
+            print(f"{name:<32} {stats['count']:>7} {stats['rps']:>8.1f} {stats['p50_ms']:>9.2f} "
+                  f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}")
+    for name, stats in report["endpoints"].items():
+        failures = {status: count for status, count in stats["statuses"].items() if status >= 400}
+        if failures:
+            print(f"{name}: non-2xx responses {failures}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--target", choices=["testclient", "gunicorn", "http"], default="testclient")
+    arg_parser.add_argument("--url", default="http://127.0.0.1:8000", help="server for --target http")
+    arg_parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for --target gunicorn")
+    arg_parser.add_argument("--threads", type=int, default=1, help="threads per gunicorn worker")
+    arg_parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    arg_parser.add_argument("--dialogs", type=int, default=10, help="dialogs per virtual user")
+    arg_parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between turns (0: closed loop)")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--output", help="also write the report as JSON here")
+    args = arg_parser.parse_args()
+
+    process = None
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            if args.target == "testclient":
+                import app as app_module
+                from storage import SQLiteReservationStore
+
+                app_module.reservation_store = SQLiteReservationStore(os.path.join(workdir, "load.db"))
+                app_module.app.secret_key = app_module.app.secret_key or "load-test"
+                app_module.warm_up()
+                make_transport = lambda: TestClientTransport(app_module.app)
+            else:
+                base_url = args.url
+                if args.target == "gunicorn":
+                    process, base_url = spawn_gunicorn(args.workers, args.threads, workdir)
+                make_transport = lambda: HttpTransport(base_url)
+            report = run_load(make_transport, args.users, args.dialogs, args.think_ms / 1000, args.seed)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    report["environment"] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "target": args.target,
+        "workers": args.workers if args.target == "gunicorn" else None,
+        "threads": args.threads if args.target == "gunicorn" else None,
+        "users": args.users,
+        "dialogs_per_user": args.dialogs,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
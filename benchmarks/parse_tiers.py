@@ -0,0 +1,43 @@
+"""Latency split between the fast (regex-only) and NER parser tiers.
+
+Usage: python benchmarks/parse_tiers.py [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import parse_cache, parse_reservation, warm_up
+from corpus import CORPUS
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    warm_up()
+    # Measure the parser itself, not cache hits
+    parse_cache.maxsize = 0
+    timings = defaultdict(list)
+    for _ in range(args.repeat):
+        for text in CORPUS:
+            started = time.perf_counter()
+            _, tier = parse_reservation(text)
+            timings[tier].append((time.perf_counter() - started) * 1000)
+
+    total = sum(len(samples) for samples in timings.values())
+    print(f"{'tier':<6} {'share':>6} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for tier, samples in sorted(timings.items()):
+        samples.sort()
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        print(f"{tier:<6} {len(samples) / total:>6.0%} {statistics.mean(samples):>9.3f} "
+              f"{statistics.median(samples):>8.3f} {p95:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""Benchmark suite for the parsing and booking hot paths.
+
+Usage:
+    python benchmarks/run.py [--output results.json] [--sizes 10,100,1000,10000,100000] [--repeat 3]
+    python benchmarks/run.py --compare benchmarks/baseline.json [--tolerance 0.25] [--floor-us 10]
+    python benchmarks/run.py --save-baseline
+
+Results are written as JSON ({"environment": ..., "results": {name: stats}}); with
+--compare, any case whose fastest run is slower than the baseline's by more than
+the tolerance and by more than --floor-us is reported and the exit status is 1.
+Fastest runs are compared because scheduler noise only ever adds time; the floor
+keeps a few microseconds of jitter on the smallest cases from reading as 1.5x.
+The same code also runs up to 1.5x slower in one process than in another, so
+the suite runs --repeat times in fresh processes and keeps each case's best run.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app as app_module
+from app import check_overlap, parse_cache, parse_reservation_text, warm_up
+from storage import MemoryReservationStore, ShardedSQLiteReservationStore, SQLiteReservationStore
+from corpus import CORPUS, NER_HEAVY, REGEX_ONLY
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+BASE_DAY = datetime.datetime(2030, 1, 1, 9, 0)
+
+
+def measure(func, min_time=0.2, max_repeat=2000, warmup=5):
+    """Call func warmup times untimed, then until min_time has elapsed (at least once); return latency stats in ms"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_repeat and (not samples or time.perf_counter() - started < min_time):
+        call_started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - call_started) * 1000)
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "mean_ms": statistics.mean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[max(int(len(samples) * 0.95) - 1, 0)],
+        "min_ms": samples[0],
+    }
+
+
+def make_events(count):
+    """Non-overlapping one-hour events, eight per working day"""
+    events = []
+    for number in range(count):
+        start = BASE_DAY + datetime.timedelta(days=number // 8, hours=number % 8)
+        events.append({
+            "title": f"Client {number} Appointment",
+            "start": start.strftime("%Y-%m-%dT%H:%M:%S"),
+            "end": (start + datetime.timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S"),
+            "allDay": False,
+            "description": "Reservation made via chatbot",
+        })
+    return events
+
+
+def populate(store, calendar_id, events):
+    """Load events into a store, in one transaction for SQLite"""
+    if isinstance(store, SQLiteReservationStore):
+        connection = store._connection()
+        with connection:
+            connection.executemany(store.INSERT, [
+                (calendar_id, event["title"], event["start"], event["end"], 0, event["description"], "", 0)
+                for event in events
+            ])
+            connection.execute(store.BUMP_REVISION, (calendar_id,))
+            connection.execute(store.UPDATE_MAX_DURATION, (60, calendar_id))
+    else:
+        for event in events:
+            store.add_reservation(calendar_id, event)
+
+
+def probe(count):
+    """An event in the middle of a calendar of the given size (overlaps one booking)"""
+    middle = BASE_DAY + datetime.timedelta(days=(count // 2) // 8, hours=3, minutes=30)
+    return {
+        "start": middle.strftime("%Y-%m-%dT%H:%M:%S"),
+        "end": (middle + datetime.timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def bench_parsing(results):
+    # Measure the parser itself, not cache hits
+    parse_cache.maxsize = 0
+    for name, corpus in (("regex_only", REGEX_ONLY), ("ner_heavy", NER_HEAVY), ("mixed", CORPUS)):
+        results[f"parse_reservation_text.{name}"] = measure(
+            lambda: [parse_reservation_text(text) for text in corpus]
+        )
+
+
+def bench_booking(results, sizes, workdir):
+    for size in sizes:
+        events = make_events(size)
+        new_event = probe(size)
+        # The legacy linear check is skipped beyond 10k: it takes seconds per call
+        if size <= 10000:
+            results[f"check_overlap.{size}"] = measure(lambda: check_overlap(new_event, events), max_repeat=200)
+
+        stores = {
+            "memory": MemoryReservationStore(),
+            "sqlite": SQLiteReservationStore(os.path.join(workdir, f"bench-{size}.db")),
+        }
+        for store_name, store in stores.items():
+            populate(store, "bench", events)
+            results[f"has_conflict.{store_name}.{size}"] = measure(
+                lambda: store.has_conflict("bench", new_event["start"], new_event["end"])
+            )
+            counter = iter(range(10 ** 9))
+
+            def book():
+                # Far-future, non-overlapping slots so every insert succeeds
+                start = BASE_DAY + datetime.timedelta(days=100000 + next(counter))
+                event = {"title": "Bench Appointment", "start": start.strftime("%Y-%m-%dT%H:%M:%S"),
+                         "end": (start + datetime.timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S")}
+                store.book_reservation("bench", event)
+
+            results[f"book.{store_name}.{size}"] = measure(book, max_repeat=500)
+
+
+# The store a benchmark worker process books into, opened by the pool's initializer
+worker_store = None
+
+
+def open_worker_store(store_class, path):
+    global worker_store
+    worker_store = store_class(path)
+
+
+def book_days(job):
+    """Book count consecutive days at one hour into a calendar, in a worker process"""
+    calendar_id, first_day, hour, count = job
+    for number in range(count):
+        start = BASE_DAY + datetime.timedelta(days=first_day + number, hours=hour)
+        worker_store.book_reservation(calendar_id, {
+            "title": "Bench Appointment", "start": start.strftime("%Y-%m-%dT%H:%M:%S"),
+            "end": (start + datetime.timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S")})
+
+
+def bench_concurrent_booking(results, workdir, workers=8, bookings=25):
+    """Book from several worker processes at once, each into its own calendar or all into one.
+
+    Workers are processes with their own connections, like gunicorn workers;
+    threads would measure the GIL rather than the store. Every BEGIN IMMEDIATE
+    takes its database file's write lock, so plain SQLite runs cross_calendar
+    bookings one at a time while the sharded store spreads them over several
+    files: compare bookings_per_s with one worker and with several (the growth
+    is bounded by the CPU count in the environment).
+    """
+    stores = {
+        "sqlite": (SQLiteReservationStore, os.path.join(workdir, "concurrent.db")),
+        "sharded": (ShardedSQLiteReservationStore, os.path.join(workdir, "concurrent-sharded.db")),
+    }
+    rounds = iter(range(10 ** 9))
+    for store_name, (store_class, path) in stores.items():
+        for worker_count in (1, workers):
+            with multiprocessing.Pool(worker_count, open_worker_store, (store_class, path)) as pool:
+                for shape in ("cross_calendar", "same_calendar"):
+                    def book_round():
+                        # Workers book different hours of days no other round uses
+                        first_day = next(rounds) * bookings * workers
+                        pool.map(book_days, [
+                            (f"bench-{worker}" if shape == "cross_calendar" else "bench",
+                             first_day, worker, bookings * workers // worker_count)
+                            for worker in range(worker_count)
+                        ])
+
+                    # One untimed round opens each worker's connections
+                    stats = measure(book_round, min_time=0.5, max_repeat=20, warmup=1)
+                    stats["bookings_per_s"] = bookings * workers / (stats["p50_ms"] / 1000)
+                    results[f"book_concurrent.{store_name}.{shape}.{worker_count}"] = stats
+
+
+def bench_routes(results, workdir, calendar_size=1000):
+    app_module.reservation_store = SQLiteReservationStore(os.path.join(workdir, "routes.db"))
+    app_module.app.testing = True
+    app_module.app.secret_key = "benchmark"
+    parse_cache.maxsize = 0
+
+    with app_module.app.test_client() as client:
+        client.get('/')
+        with client.session_transaction() as session:
+            calendar_id = session["calendar_id"]
+        populate(app_module.reservation_store, calendar_id, make_events(calendar_size))
+
+        results["route.process_reservation.incomplete"] = measure(
+            lambda: client.post('/process_reservation', json={"message": "Book me an appointment", "current_reservation": {}})
+        )
+        counter = iter(range(10 ** 9))
+
+        def book():
+            day = (datetime.date.today() + datetime.timedelta(days=1 + next(counter))).strftime("%d.%m.%Y")
+            client.post('/process_reservation', json={"message": f"Book John on {day} at 10 am", "current_reservation": {}})
+
+        results["route.process_reservation.booking"] = measure(book, max_repeat=500)
+        results[f"route.get_reservations.all.{calendar_size}"] = measure(lambda: client.get('/get_reservations'))
+        results["route.get_reservations.month"] = measure(
+            lambda: client.get('/get_reservations?start=2030-01-01&end=2030-02-01')
+        )
+
+
+def compare(results, baseline, tolerance, floor_us=10.0):
+    """Return the cases whose fastest run regressed by more than tolerance and by more than floor_us"""
+    regressions = []
+    for name, stats in sorted(results.items()):
+        reference = baseline.get("results", {}).get(name)
+        if not reference:
+            continue
+        ratio = stats["min_ms"] / reference["min_ms"] if reference["min_ms"] else 1.0
+        slower_us = (stats["min_ms"] - reference["min_ms"]) * 1000
+        marker = "REGRESSION" if ratio > 1 + tolerance and slower_us > floor_us else ""
+        print(f"{name:<48} {reference['min_ms']:>10.3f} -> {stats['min_ms']:>10.3f} ms  x{ratio:5.2f} {marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def run_suite(sizes):
+    """Run every benchmark once in this process and return the report"""
+    warm_up()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_parsing(results)
+        bench_booking(results, sizes, workdir)
+        bench_concurrent_booking(results, workdir)
+        bench_routes(results, workdir)
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "spacy_model": app_module.SPACY_MODEL if app_module.get_nlp() is not None else None,
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+
+def run_repeated(sizes, repeat):
+    """Run the suite in repeat fresh processes; each case keeps the stats of its fastest run"""
+    reports = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for number in range(repeat):
+            path = os.path.join(workdir, f"run-{number}.json")
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--sizes", sizes, "--repeat", "1", "--output", path],
+                           check=True)
+            with open(path) as handle:
+                reports.append(json.load(handle))
+    results = {}
+    for report in reports:
+        for name, stats in report["results"].items():
+            if name not in results or stats["min_ms"] < results[name]["min_ms"]:
+                results[name] = stats
+    return {"environment": dict(reports[-1]["environment"], repeat=repeat), "results": results}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    arg_parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    arg_parser.add_argument("--repeat", type=int, default=3, help="run the suite this many times in fresh processes, keeping each case's best run")
+    arg_parser.add_argument("--compare", metavar="BASELINE", help="compare against a baseline JSON file")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing (0.25 = 25%%)")
+    arg_parser.add_argument("--floor-us", type=float, default=10.0, help="slowdowns smaller than this many microseconds never fail")
+    arg_parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE_PATH}")
+    args = arg_parser.parse_args()
+
+    if args.repeat > 1:
+        report = run_repeated(args.sizes, args.repeat)
+    else:
+        report = run_suite([int(size) for size in args.sizes.split(",")])
+    results = report["results"]
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.save_baseline:
+        args.output = BASELINE_PATH
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    elif not args.compare:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(results, json.load(handle), args.tolerance, args.floor_us)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%} and {args.floor_us:g} us")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import csv
+import datetime
+import io
+import itertools
+import re
+
+from reservation import to_datetime
+
+# Columns written by the CSV export; imports need start and title, the rest is optional
+CSV_COLUMNS = ["id", "title", "start", "end", "allDay", "description", "resource", "rrule"]
+# Events per chunk yielded by the exporters
+EXPORT_CHUNK_EVENTS = 500
+# iCalendar content lines are folded at 75 octets
+ICS_LINE_OCTETS = 75
+ICS_PRODID = "-//Smart Scheduler AI//Reservations//EN"
+# Non-standard property carrying the reservation's resource through an export/import round trip
+ICS_RESOURCE_PROPERTY = "X-SCHEDULER-RESOURCE"
+
+ICS_CONTENT_LINE_RE = re.compile(r'^([A-Za-z0-9-]+)((?:;[A-Za-z0-9-]+=(?:"[^"]*"|[^";:]*))*):(.*)$')
+ICS_DATETIME_RE = re.compile(r'^(\d{4})(\d{2})(\d{2})(?:T(\d{2})(\d{2})(\d{2})(Z)?)?$')
+ICS_DURATION_RE = re.compile(r'^P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+ICS_ESCAPE_RE = re.compile(r'\\([\\;,nN])')
+TRUE_VALUES = ("1", "true", "yes", "y")
+
+
+def unescape_text(value):
+    """Decode an iCalendar TEXT value (\\n, \\, \\; and \\\\)"""
+    return ICS_ESCAPE_RE.sub(lambda match: "\n" if match.group(1) in "nN" else match.group(1), value)
+
+
+def escape_text(value):
+    """Encode a string as an iCalendar TEXT value"""
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def fold_line(line):
+    """Return a content line folded at 75 octets, with its CRLF"""
+    if len(line.encode()) <= ICS_LINE_OCTETS:
+        return line + "\r\n"
+    parts, current, size = [], [], 0
+    for char in line:
+        char_size = len(char.encode())
+        # Continuation lines start with a space, which counts towards their 75 octets
+        if size + char_size > ICS_LINE_OCTETS - (1 if parts else 0):
+            parts.append("".join(current))
+            current, size = [], 0
+        current.append(char)
+        size += char_size
+    parts.append("".join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def unfold_lines(lines):
+    """Join folded iCalendar lines back into content lines"""
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_ics_datetime(value):
+    """Return (naive local datetime, is_date) for a DATE or DATE-TIME value; UTC times are converted"""
+    match = ICS_DATETIME_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"unrecognized date '{value}'")
+    year, month, day, hour, minute, second, utc = match.groups()
+    if hour is None:
+        return datetime.datetime(int(year), int(month), int(day)), True
+    parsed = datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+    if utc:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc).astimezone().replace(tzinfo=None)
+    return parsed, False
+
+
+def parse_ics_duration(value):
+    match = ICS_DURATION_RE.match(value.strip().lstrip("+"))
+    if not match or not any(match.groups()):
+        raise ValueError(f"unrecognized duration '{value}'")
+    weeks, days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return datetime.timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def format_event_time(value):
+    return value.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def ics_event(properties):
+    """Build an event dict from the properties of one VEVENT"""
+    if "DTSTART" not in properties:
+        raise ValueError("missing DTSTART")
+    start, all_day = parse_ics_datetime(properties["DTSTART"])
+    if "DTEND" in properties:
+        end, _ = parse_ics_datetime(properties["DTEND"])
+    elif "DURATION" in properties:
+        end = start + parse_ics_duration(properties["DURATION"])
+    else:
+        # Like chatbot bookings, events without an end last an hour (all-day events a day)
+        end = start + (datetime.timedelta(days=1) if all_day else datetime.timedelta(hours=1))
+    event = {
+        "title": unescape_text(properties.get("SUMMARY", "")).strip() or None,
+        "start": format_event_time(start),
+        "end": format_event_time(end),
+        "allDay": all_day,
+        "description": unescape_text(properties["DESCRIPTION"]) if "DESCRIPTION" in properties else None,
+    }
+    if properties.get(ICS_RESOURCE_PROPERTY):
+        event["resource"] = unescape_text(properties[ICS_RESOURCE_PROPERTY])
+    if properties.get("RRULE"):
+        event["rrule"] = properties["RRULE"]
+    return event
+
+
+def read_ics(lines):
+    """Parse an iCalendar stream incrementally, one VEVENT at a time.
+
+    Yields (row, event, error) per VEVENT, where row is the event's position in
+    the file and exactly one of event and error is set. Components nested in
+    an event (alarms) are skipped; TZID parameters are ignored, so such times
+    are read as local wall-clock times.
+    """
+    row = 0
+    properties = None
+    nested = 0
+    for line in unfold_lines(lines):
+        match = ICS_CONTENT_LINE_RE.match(line)
+        if not match:
+            continue
+        name, _, value = match.groups()
+        name = name.upper()
+        if name == "BEGIN":
+            if value.upper() == "VEVENT":
+                row += 1
+                properties, nested = {}, 0
+            elif properties is not None:
+                nested += 1
+        elif name == "END" and properties is not None:
+            if value.upper() != "VEVENT":
+                nested -= 1
+                continue
+            try:
+                yield row, ics_event(properties), None
+            except ValueError as e:
+                yield row, None, str(e)
+            properties = None
+        elif properties is not None and not nested:
+            properties.setdefault(name, value)
+
+
+def csv_event(row):
+    """Build an event dict from a CSV row with the export's columns"""
+    if not (row.get("start") or "").strip():
+        raise ValueError("missing start")
+    start = to_datetime(row["start"].strip())
+    end = to_datetime(row["end"].strip()) if (row.get("end") or "").strip() else start + datetime.timedelta(hours=1)
+    event = {
+        "title": (row.get("title") or "").strip() or None,
+        "start": format_event_time(start),
+        "end": format_event_time(end),
+        "allDay": (row.get("allDay") or "").strip().lower() in TRUE_VALUES,
+        "description": row.get("description") or None,
+    }
+    if (row.get("resource") or "").strip():
+        event["resource"] = row["resource"].strip()
+    if (row.get("rrule") or "").strip():
+        event["rrule"] = row["rrule"].strip()
+    return event
+
+
+def read_csv(lines):
+    """Parse a CSV stream with a header row incrementally; yields (row, event, error) per data row.
+
+    A line the csv module can't read (an overlong field, say) is reported as
+    that row's error, and reading goes on with the next line.
+    """
+    reader = csv.DictReader(lines)
+    for row in itertools.count(1):
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield row, None, str(e)
+            continue
+        try:
+            yield row, csv_event(values), None
+        except (TypeError, ValueError, OverflowError) as e:
+            yield row, None, str(e)
+
+
+def export_id(event):
+    """The id an event is exported with; series are numbered apart from reservations, so theirs are prefixed"""
+    return f"series-{event.get('id')}" if event.get("rrule") else event.get("id")
+
+
+def ics_lines(event, stamp):
+    """Return the folded VEVENT for an event dict (a series if it has an 'rrule')"""
+    start, end = to_datetime(event["start"]), to_datetime(event["end"])
+    lines = ["BEGIN:VEVENT", f"UID:{export_id(event)}@smart-scheduler-ai", f"DTSTAMP:{stamp}"]
+    if event.get("allDay"):
+        lines += [f"DTSTART;VALUE=DATE:{start:%Y%m%d}", f"DTEND;VALUE=DATE:{end:%Y%m%d}"]
+    else:
+        lines += [f"DTSTART:{start:%Y%m%dT%H%M%S}", f"DTEND:{end:%Y%m%dT%H%M%S}"]
+    if event.get("rrule"):
+        lines.append(f"RRULE:{event['rrule']}")
+    lines.append(f"SUMMARY:{escape_text(event.get('title') or '')}")
+    if event.get("description"):
+        lines.append(f"DESCRIPTION:{escape_text(event['description'])}")
+    if event.get("resource"):
+        lines.append(f"{ICS_RESOURCE_PROPERTY}:{escape_text(event['resource'])}")
+    lines.append("END:VEVENT")
+    return "".join(fold_line(line) for line in lines)
+
+
+def write_ics(events, series=()):
+    """Yield an iCalendar document in chunks of EXPORT_CHUNK_EVENTS events; series are written with their RRULE"""
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield f"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:{ICS_PRODID}\r\nCALSCALE:GREGORIAN\r\n"
+    events = iter(itertools.chain(series, events))
+    while True:
+        chunk = [ics_lines(event, stamp) for event in itertools.islice(events, EXPORT_CHUNK_EVENTS)]
+        if not chunk:
+            break
+        yield "".join(chunk)
+    yield "END:VCALENDAR\r\n"
+
+
+def write_csv(events, series=()):
+    """Yield a CSV document with a header row in chunks of EXPORT_CHUNK_EVENTS events"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    events = iter(itertools.chain(series, events))
+    while True:
+        for event in itertools.islice(events, EXPORT_CHUNK_EVENTS):
+            writer.writerow([
+                export_id(event), event.get("title"), event.get("start"), event.get("end"),
+                "true" if event.get("allDay") else "false", event.get("description") or "",
+                event.get("resource") or "", event.get("rrule") or "",
+            ])
+        chunk = buffer.getvalue()
+        if not chunk:
+            break
+        yield chunk
+        buffer.seek(0)
+        buffer.truncate()
@@ -0,0 +1,173 @@
+import datetime
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from storage import MemoryReservationStore
+
+
+class Conversation:
+    """Dialog state kept on the server between /process_reservation turns.
+
+    reservation is the partially filled reservation dict; date and time hold the
+    day and (hour, minute) already resolved on earlier turns, and missing_field
+    is the field the last response asked for. owner is the calendar id of the
+    session that started the conversation.
+    """
+
+    __slots__ = ("id", "owner", "reservation", "date", "time", "missing_field")
+
+    def __init__(self, id, owner, reservation=None, date=None, time=None, missing_field=None):
+        self.id = id
+        self.owner = owner
+        self.reservation = reservation if reservation is not None else {}
+        self.date = date
+        self.time = time
+        self.missing_field = missing_field
+
+    @classmethod
+    def start(cls, owner):
+        """Begin a conversation with a fresh, short random id"""
+        return cls(secrets.token_urlsafe(9), owner)
+
+    def to_json(self):
+        return json.dumps({
+            "owner": self.owner,
+            "reservation": self.reservation,
+            "date": self.date.isoformat() if self.date else None,
+            "time": list(self.time) if self.time else None,
+            "missing_field": self.missing_field,
+        })
+
+    @classmethod
+    def from_json(cls, conversation_id, value):
+        state = json.loads(value)
+        return cls(
+            conversation_id,
+            state["owner"],
+            state["reservation"],
+            datetime.date.fromisoformat(state["date"]) if state["date"] else None,
+            tuple(state["time"]) if state["time"] else None,
+            state["missing_field"],
+        )
+
+
+class ConversationStore:
+    """Interface of the conversation state stores.
+
+    Conversations expire after ttl seconds without a turn; a conversation is
+    only returned to the session (owner) that started it.
+    """
+
+    def get(self, conversation_id, owner):
+        """Return the live conversation with this id and owner, or None"""
+        raise NotImplementedError
+
+    def save(self, conversation):
+        """Store a conversation after a turn, restarting its TTL"""
+        raise NotImplementedError
+
+    def discard(self, conversation_id):
+        """Forget a conversation once its reservation is booked"""
+        raise NotImplementedError
+
+    def stats(self):
+        """Return counters exported on /metrics"""
+        return {}
+
+    def resume(self, conversation_id, owner):
+        """Return the conversation to continue, or a new one if the id is unknown or expired"""
+        conversation = self.get(conversation_id, owner) if conversation_id else None
+        return conversation if conversation is not None else Conversation.start(owner)
+
+
+class MemoryConversationStore(ConversationStore):
+    """Bounded in-memory LRU of conversations, local to the worker process"""
+
+    def __init__(self, maxsize=10000, ttl=1800):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, conversation_id, owner):
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[conversation_id]
+                self.evictions += 1
+                entry = None
+            if entry is None or entry[1].owner != owner:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(conversation_id)
+            self.hits += 1
+            return entry[1]
+
+    def save(self, conversation):
+        with self._lock:
+            self._entries[conversation.id] = (time.monotonic() + self.ttl, conversation)
+            self._entries.move_to_end(conversation.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, conversation_id):
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+class DatabaseConversationStore(ConversationStore):
+    """Conversations kept in the reservation database, shared by all gunicorn workers"""
+
+    def __init__(self, reservation_store, ttl=1800):
+        self.reservation_store = reservation_store
+        self.ttl = ttl
+
+    def get(self, conversation_id, owner):
+        value = self.reservation_store.load_conversation(conversation_id)
+        if value is None:
+            return None
+        conversation = Conversation.from_json(conversation_id, value)
+        return conversation if conversation.owner == owner else None
+
+    def save(self, conversation):
+        self.reservation_store.save_conversation(conversation.id, conversation.to_json(), time.time() + self.ttl)
+
+    def discard(self, conversation_id):
+        self.reservation_store.delete_conversation(conversation_id)
+
+
+def create_conversation_store(reservation_store, backend=None):
+    """Create the store selected by CONVERSATION_STORE: database or memory.
+
+    The default is the database, so a follow-up turn can land on any gunicorn
+    worker; with in-memory reservations (which are per worker anyway) it is memory.
+    """
+    default = "memory" if isinstance(reservation_store, MemoryReservationStore) else "database"
+    backend = (backend or os.getenv("CONVERSATION_STORE", default)).lower()
+    ttl = float(os.getenv("CONVERSATION_TTL", 1800))
+    if backend == "memory":
+        return MemoryConversationStore(int(os.getenv("CONVERSATION_CACHE_SIZE", 10000)), ttl)
+    if backend == "database":
+        return DatabaseConversationStore(reservation_store, ttl)
+    raise ValueError(f"Unknown conversation store: {backend}")
@@ -0,0 +1,20 @@
+import gc
+import os
+
+# Load the app (and the spaCy model) once in the master so forked workers share it copy-on-write
+preload_app = True
+
+# Threaded workers, so each one runs several requests at once. Admission control counts
+# requests in flight per worker: with the default sync worker there is never more than one,
+# and MAX_INFLIGHT_PARSES / DEGRADE_INFLIGHT_PARSES could not take effect. Keep
+# GUNICORN_THREADS above MAX_INFLIGHT_PARSES so excess requests are shed rather than queued.
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 12))
+
+def on_starting(server):
+    from app import warm_up
+    warm_up()
+    # Move everything allocated so far out of the collector's reach, so GC passes in the
+    # workers don't touch (and therefore copy) the shared model pages
+    gc.freeze()
@@ -0,0 +1,138 @@
+import datetime
+import re
+
+WEEKDAYS = {
+    'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
+    'friday': 4, 'saturday': 5, 'sunday': 6
+}
+RELATIVE_DAYS = {'today': 0, 'tomorrow': 1, 'yesterday': -1}
+PERIODS_PM = ('pm', 'afternoon', 'evening', 'night')
+PERIODS_AM = ('am', 'morning')
+DATE_FORMAT = "%d.%m.%Y"
+
+# Every day and time expression the regex tiers understand, found in one pass over a
+# lowercased message. Each alternative ends in an empty group named after its kind, so
+# a match's lastgroup says what it is; starting the alternatives with literals lets the
+# regex engine skip the ones that can't match at a position. "next" only looks ahead at
+# its word, which is still scanned on its own (as a weekday, say).
+LEXICON_RE = re.compile(
+    r"next(?=\s+(?P<next_word>\w+))(?P<next>)"
+    r"|\b(?:today\b(?P<today>)|tomorrow\b(?P<tomorrow>)|yesterday\b(?P<yesterday>)"
+    r"|(?:" + "|".join(WEEKDAYS) + r")\b(?P<weekday>)"
+    r"|(?P<day>\d{1,2})\.(?P<month>\d{1,2})\.(?P<year>\d{4})\b(?P<date>)"
+    r"|(?P<ampm_hour>\d{1,2})(?::(?P<ampm_minute>\d{2}))?\s*(?P<ampm_marker>am|pm)\b(?P<ampm>)"
+    r"|(?P<period_hour>\d{1,2})(?::(?P<period_minute>\d{2}))?\s*(?:o'?clock\s*)?"
+    r"in\s+the\s+(?P<period_marker>morning|afternoon|evening|night)\b(?P<period>)"
+    r"|(?P<clock_hour>[01]?\d|2[0-3]):(?P<clock_minute>[0-5]\d)\b(?P<clock>))"
+)
+# Any day word anywhere in a string, e.g. inside an entity NER took for a name
+DAY_WORD_RE = re.compile("|".join(list(RELATIVE_DAYS) + list(WEEKDAYS)))
+
+
+def to_24_hour(hour, period):
+    """Apply an am/pm or period-of-day marker to an hour"""
+    if period in PERIODS_PM:
+        if hour < 12:
+            hour += 12
+    elif period in PERIODS_AM and hour == 12:
+        hour = 0
+    return hour
+
+
+def days_until(day_num, today, skip_today=False):
+    """Days from today until the next given weekday"""
+    days_ahead = (day_num - today.weekday() + 7) % 7
+    if days_ahead == 0 and skip_today:
+        days_ahead = 7
+    return days_ahead
+
+
+class RelativeDays:
+    """The dates relative day words refer to, as seen from one day.
+
+    Maps today, tomorrow, yesterday, each weekday (its next occurrence,
+    today included) and "next <weekday>" (today excluded) to a date, and
+    keeps the DD.MM.YYYY form of each for the reservation state.
+    """
+
+    __slots__ = ("today", "dates", "formatted")
+
+    def __init__(self, today):
+        self.today = today
+        self.dates = {word: today + datetime.timedelta(days=offset) for word, offset in RELATIVE_DAYS.items()}
+        for name, number in WEEKDAYS.items():
+            self.dates[name] = today + datetime.timedelta(days=days_until(number, today))
+            self.dates["next " + name] = today + datetime.timedelta(days=days_until(number, today, skip_today=True))
+        self.formatted = {word: date.strftime(DATE_FORMAT) for word, date in self.dates.items()}
+
+
+_relative_days = None
+
+
+def relative_days(today=None):
+    """Return the RelativeDays of today (or the given day); the table is rebuilt only when the day changes"""
+    global _relative_days
+    today = today or datetime.date.today()
+    table = _relative_days
+    if table is None or table.today != today:
+        table = _relative_days = RelativeDays(today)
+    return table
+
+
+def scan(text):
+    """Return {kind: first match} for the day and time expressions in text (matched lowercased)"""
+    found = {}
+    for match in LEXICON_RE.finditer(text.lower()):
+        found.setdefault(match.lastgroup, match)
+    return found
+
+
+def day_word(found, numeric=True):
+    """Return the RelativeDays key of the day a scanned message names, a date for DD.MM.YYYY, or None.
+
+    Relative words win over "next <weekday>", which wins over a bare weekday;
+    "next" followed by anything but a weekday (next week) names no day.
+    """
+    for word in RELATIVE_DAYS:
+        if word in found:
+            return word
+    if "next" in found:
+        word = found["next"].group("next_word")
+        return "next " + word if word in WEEKDAYS else None
+    if "weekday" in found:
+        return found["weekday"].group()
+    if numeric and "date" in found:
+        match = found["date"]
+        try:
+            return datetime.date(int(match.group("year")), int(match.group("month")), int(match.group("day")))
+        except ValueError:
+            return None
+    return None
+
+
+def day_of(found, today):
+    """Return the date a scanned message names (see day_word), or None"""
+    word = day_word(found)
+    if isinstance(word, str):
+        return relative_days(today).dates[word]
+    return word
+
+
+def time_of(found):
+    """Return (hour, minute) for the time a scanned message names, or None.
+
+    am/pm times win over periods of the day ("3 in the afternoon"), which win
+    over 24-hour clock times.
+    """
+    for kind in ("ampm", "period", "clock"):
+        if kind in found:
+            match = found[kind]
+            hour = int(match.group(kind + "_hour"))
+            minutes = int(match.group(kind + "_minute") or 0)
+            period = match.group(kind + "_marker") if kind != "clock" else None
+            if period and not 1 <= hour <= 12:
+                return None
+            if minutes > 59:
+                return None
+            return to_24_hour(hour, period), minutes
+    return None
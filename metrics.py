@@ -0,0 +1,238 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+# Latency buckets in seconds, from 50µs (fast-path parsing) to 5s (overloaded NER)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+class CounterChild:
+    """One labelled series of a counter"""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock):
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Return the series for the given label values (cached, so hot paths can keep it)"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, CounterChild(self._lock))
+        return child
+
+    def inc(self, amount=1, **labels):
+        self.labels(*(labels.get(name, "") for name in self.labelnames)).inc(amount)
+
+    def value(self, **labels):
+        child = self._children.get(tuple(labels.get(name, "") for name in self.labelnames))
+        return child.value if child else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, child.value) for key, child in self._children.items())
+        for key, value in items:
+            yield f"{self.name}{format_labels(self.labelnames, key)} {value}"
+
+
+class HistogramChild:
+    """One labelled series of a histogram: a count per bucket plus +Inf, and the sum"""
+
+    __slots__ = ("buckets", "counts", "total", "_lock")
+
+    def __init__(self, buckets, lock):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self._lock = lock
+
+    def observe(self, value):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.total += value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Return the series for the given label values (cached, so hot paths can keep it)"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, HistogramChild(self.buckets, self._lock))
+        return child
+
+    def observe(self, value, **labels):
+        self.labels(*(labels.get(name, "") for name in self.labelnames)).observe(value)
+
+    def count(self, **labels):
+        child = self._children.get(tuple(labels.get(name, "") for name in self.labelnames))
+        return sum(child.counts) if child else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(child.counts), child.total) for key, child in self._children.items())
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Gauge:
+    """Gauge whose labelled values are read from a callback at scrape time"""
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        for key, value in sorted(self.callback().items()):
+            key = key if isinstance(key, tuple) else (key,)
+            yield f"{self.name}{format_labels(self.labelnames, key)} {value}"
+
+
+class MetricsRegistry:
+    """Per-process collection of metrics rendered in the Prometheus text format.
+
+    Each gunicorn worker keeps its own values, so a scrape reflects the worker
+    that happened to answer it.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback, labelnames=()):
+        return self.register(Gauge(name, documentation, callback, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "scheduler_stage_seconds", "Time spent in each request stage", ["stage"]
+)
+REQUEST_SECONDS = registry.histogram(
+    "scheduler_request_seconds", "Request latency per endpoint", ["endpoint"]
+)
+PARSE_TIER = registry.counter(
+    "scheduler_parse_tier_total", "Messages parsed per parser tier", ["tier"]
+)
+FALLBACKS = registry.counter(
+    "scheduler_fallback_total", "Regex fallbacks that filled a reservation field", ["field"]
+)
+PARSE_FAILURES = registry.counter(
+    "scheduler_parse_failures_total", "Date/time conversions that could not be parsed", ["stage"]
+)
+BOOKING_OUTCOMES = registry.counter(
+    "scheduler_booking_outcome_total", "Results of complete booking attempts and validations", ["outcome"]
+)
+ERRORS = registry.counter(
+    "scheduler_errors_total", "Exceptions caught in request handlers", ["where"]
+)
+PARSE_DEGRADED = registry.counter(
+    "scheduler_parse_degraded_total", "Messages parsed without NER because of overload or the parse deadline", ["reason"]
+)
+NER_DEADLINE_EXCEEDED = registry.counter(
+    "scheduler_ner_deadline_exceeded_total", "NER calls that finished after the request's parse deadline"
+)
+REQUESTS_SHED = registry.counter(
+    "scheduler_requests_shed_total", "Requests answered with a retry response by admission control", ["reason"]
+)
+
+
+# Per-request stage breakdown; None unless the request asked for timings
+request_timings = ContextVar("request_timings", default=None)
+
+
+def record_stage(name, seconds):
+    """Observe a stage duration and add it to the current request's breakdown, if one is collected"""
+    STAGE_SECONDS.labels(name).observe(seconds)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds * 1000
+
+
+class stage:
+    """Context manager timing a block of code as a named stage"""
+
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.name, time.perf_counter() - self.started)
+        return False
@@ -0,0 +1,96 @@
+import copy
+import datetime
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Collapse whitespace; case is kept because the parser treats capitalized names differently"""
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+
+def copy_reservation(reservation):
+    """Copy a reservation dict so callers can't mutate a cached entry"""
+    return {
+        key: copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+        for key, value in reservation.items()
+    }
+
+
+class ParseCache:
+    """Bounded LRU cache of parse results with a TTL.
+
+    Keys combine the normalized message, the merged reservation state and the
+    reference date, so relative dates such as "tomorrow" stop matching at midnight.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(text, current_reservation, reference_date=None):
+        """Build the cache key for a message and the merged reservation state"""
+        reference_date = reference_date or datetime.date.today()
+        state = json.dumps(current_reservation, sort_keys=True, default=str)
+        return normalize_text(text), state, reference_date.isoformat()
+
+    def get(self, key):
+        """Return a copy of the cached (reservation, tier) for key, or None"""
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _, reservation, tier = entry
+        return copy_reservation(reservation), tier
+
+    def put(self, key, reservation, tier):
+        """Store a copy of a parse result, evicting the least recently used entries"""
+        if self.maxsize <= 0:
+            return
+        entry = (time.monotonic() + self.ttl, copy_reservation(reservation), tier)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
@@ -0,0 +1,268 @@
+import calendar
+import datetime
+import itertools
+
+from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rrule, rrulestr
+
+from reservation import Reservation, format_minutes, from_minutes, to_minutes
+
+# Rules repeating more often than daily would expand to far too many occurrences
+ALLOWED_FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+# Finite series longer than this are treated as open-ended when bounding queries
+MAX_BOUNDED_OCCURRENCES = 1000
+# Upper bound used for scans over open-ended series (9999-12-31)
+FAR_FUTURE = to_minutes("9999-12-31T00:00:00")
+# Two open-ended series are compared this far past the later start; daily and
+# weekly patterns (including every-other-week) repeat well within it
+SERIES_CONFLICT_HORIZON_DAYS = 366
+
+# Length of one rule period: days for DAILY/WEEKLY, months for MONTHLY/YEARLY
+PERIOD_DAYS = {"DAILY": 1, "WEEKLY": 7}
+PERIOD_MONTHS = {"MONTHLY": 1, "YEARLY": 12}
+# Attempts at a month-aligned restart that doesn't land on a clamped day (Jan 31 -> Feb 28)
+MAX_RESTART_ATTEMPTS = 8
+# A series must have an occurrence within this many years of its start (February 29
+# comes back within 8); rules that never match would be expanded up to year 9999
+OCCURRENCE_HORIZON_YEARS = 8
+
+RULE_DESCRIPTIONS = {"DAILY": ("daily", "days"), "WEEKLY": ("weekly", "weeks"),
+                     "MONTHLY": ("monthly", "months"), "YEARLY": ("yearly", "years")}
+
+
+def rule_parts(rule):
+    """Split an RRULE such as "FREQ=WEEKLY;COUNT=6" into {"FREQ": "WEEKLY", "COUNT": "6"}"""
+    parts = {}
+    for part in rule.upper().removeprefix("RRULE:").split(";"):
+        name, _, value = part.partition("=")
+        parts[name.strip()] = value.strip()
+    return parts
+
+
+def first_overlap(first, second):
+    """Check if two streams of (start, end) intervals, each sorted by start, overlap anywhere.
+
+    Streams may be infinite: the sweep stops once the exhausted stream can no
+    longer overlap the rest of the other one.
+    """
+    first, second = iter(first), iter(second)
+    current = [next(first, None), next(second, None)]
+    latest_end = [None, None]
+    streams = (first, second)
+    while current[0] is not None or current[1] is not None:
+        # Take the interval that starts first
+        side = 0 if current[1] is None or (current[0] is not None and current[0][0] <= current[1][0]) else 1
+        start, end = current[side]
+        other_end = latest_end[1 - side]
+        if other_end is not None and start < other_end:
+            return True
+        if current[1 - side] is None and (other_end is None or start >= other_end):
+            # The other stream is exhausted and everything it had ended before this point
+            return False
+        if latest_end[side] is None or end > latest_end[side]:
+            latest_end[side] = end
+        current[side] = next(streams[side], None)
+    return False
+
+
+def calendar_pattern(year):
+    """Weekday of January 1 and leap years from year over the occurrence horizon"""
+    leap_years = tuple(calendar.isleap(year + offset) for offset in range(OCCURRENCE_HORIZON_YEARS + 1))
+    return datetime.date(year, 1, 1).weekday(), leap_years
+
+
+def probe_year(year):
+    """The latest year whose horizon ends by datetime.MAXYEAR and has the same calendar as year's.
+
+    dateutil only stops expanding a rule that produces no dates at MAXYEAR, so
+    looking for a first occurrence there costs a few decades of expansion at
+    most. The calendar repeats every 400 years, which bounds the search.
+    """
+    pattern = calendar_pattern(year)
+    candidate = datetime.MAXYEAR - OCCURRENCE_HORIZON_YEARS
+    while calendar_pattern(candidate) != pattern:
+        candidate -= 1
+    return candidate
+
+
+class RecurringReservation:
+    """A reservation repeated by an RRULE, stored once and expanded lazily.
+
+    start is the first occurrence's start in epoch minutes and duration the
+    length of each occurrence; until is the end of the last occurrence, or
+    None for an open-ended series.
+    """
+
+    __slots__ = ("id", "title", "start", "duration", "rule", "all_day", "description", "resource", "until",
+                 "_parts", "_rrule")
+
+    def __init__(self, title, start, duration, rule, all_day=False, description=None, id=None, resource=None):
+        self.id = id
+        self.title = title
+        self.start = start
+        self.duration = duration
+        self.rule = rule
+        self.all_day = all_day
+        self.description = description
+        self.resource = resource
+        self._parts = rule_parts(rule)
+        if self._parts.get("FREQ") not in ALLOWED_FREQUENCIES:
+            raise ValueError(f"Unsupported recurrence frequency: {rule}")
+        interval = self._parts.get("INTERVAL", "1")
+        if not interval.isdigit() or int(interval) < 1:
+            raise ValueError(f"Recurrence interval must be a positive number: {rule}")
+        self._rrule = rrulestr(rule, dtstart=from_minutes(start))
+        if not isinstance(self._rrule, rrule):
+            raise ValueError(f"Expected a single recurrence rule: {rule}")
+        if self._first_occurrence() is None:
+            raise ValueError(f"Recurrence rule has no occurrence within {OCCURRENCE_HORIZON_YEARS} years: {rule}")
+        self.until = self._bounded_end()
+
+    def _first_occurrence(self):
+        """The first occurrence, or None if the rule has none within OCCURRENCE_HORIZON_YEARS.
+
+        The rule is first tried without COUNT or UNTIL from the same date of a
+        probe_year, where a rule that never matches gives up quickly. Only if it
+        occurs there is the real rule expanded, which then stops at its first
+        occurrence (or at UNTIL/COUNT, right after it).
+        """
+        first = from_minutes(self.start).replace(year=probe_year(from_minutes(self.start).year))
+        probe = self._rrule.replace(dtstart=first, count=None,
+                                    until=first + relativedelta(years=OCCURRENCE_HORIZON_YEARS))
+        if next(iter(probe), None) is None:
+            return None
+        return next(iter(self._rrule), None)
+
+    def _bounded_end(self):
+        """End of the last occurrence of a finite series, or None"""
+        if "COUNT" not in self._parts and "UNTIL" not in self._parts:
+            return None
+        last = None
+        for count, last in enumerate(itertools.islice(self._rrule, MAX_BOUNDED_OCCURRENCES + 1)):
+            if count == MAX_BOUNDED_OCCURRENCES:
+                return None
+        return to_minutes(last) + self.duration if last is not None else self.start
+
+    @classmethod
+    def from_event(cls, event):
+        """Build a series from a dict with the first occurrence's start/end and an 'rrule'"""
+        if isinstance(event, cls):
+            return event
+        start = to_minutes(event["start"])
+        return cls(
+            event.get("title"),
+            start,
+            to_minutes(event["end"]) - start,
+            event["rrule"],
+            bool(event.get("allDay", False)),
+            event.get("description"),
+            event.get("id"),
+            event.get("resource") or None,
+        )
+
+    def to_event(self):
+        """Return the series as its first occurrence plus the 'rrule'"""
+        event = {
+            "title": self.title,
+            "start": format_minutes(self.start),
+            "end": format_minutes(self.start + self.duration),
+            "rrule": self.rule,
+            "allDay": self.all_day,
+            "description": self.description,
+        }
+        if self.resource is not None:
+            event["resource"] = self.resource
+        if self.id is not None:
+            event["id"] = self.id
+        return event
+
+    @property
+    def start_datetime(self):
+        return from_minutes(self.start)
+
+    def _rule_near(self, window_start):
+        """The series' rule restarted a whole number of periods before window_start.
+
+        Expanding an rrule always walks from its dtstart, so a query on an old
+        series would cost time proportional to its age. Shifting dtstart by
+        whole periods (INTERVAL days, weeks, months or years) keeps every later
+        occurrence; the ones it drops lie more than a period before the window.
+        COUNT rules are pinned to their last occurrence first; longer ones than
+        MAX_BOUNDED_OCCURRENCES keep walking from the start.
+        """
+        changes = {}
+        if "COUNT" in self._parts:
+            if self.until is None:
+                return self._rrule
+            changes = {"count": None, "until": from_minutes(self.until - self.duration)}
+        interval = int(self._parts.get("INTERVAL") or 1)
+        freq = self._parts["FREQ"]
+        lead = window_start - self.duration - self.start
+        if freq in PERIOD_DAYS:
+            period = interval * PERIOD_DAYS[freq] * 24 * 60
+            periods = lead // period - 1
+            if periods < 1:
+                return self._rrule
+            return self._rrule.replace(dtstart=from_minutes(self.start + periods * period), **changes)
+
+        first, window = from_minutes(self.start), from_minutes(window_start - self.duration)
+        period = interval * PERIOD_MONTHS[freq]
+        periods = ((window.year - first.year) * 12 + window.month - first.month) // period - 1
+        for _ in range(MAX_RESTART_ATTEMPTS):
+            if periods < 1:
+                break
+            restart = first + relativedelta(months=periods * period)
+            # A clamped day would change the rule's implied BYMONTHDAY; try a period earlier
+            if restart.day == first.day:
+                return self._rrule.replace(dtstart=restart, **changes)
+            periods -= 1
+        return self._rrule
+
+    def iter_intervals(self, window_start=None, window_end=None):
+        """Yield (start, end) minutes of the occurrences overlapping [window_start, window_end), in order"""
+        if window_start is None or window_start - self.duration < self.start:
+            occurrences = iter(self._rrule)
+        else:
+            occurrences = self._rule_near(window_start).xafter(from_minutes(window_start - self.duration), inc=False)
+        for occurrence in occurrences:
+            start = to_minutes(occurrence)
+            if window_end is not None and start >= window_end:
+                return
+            if window_start is None or start + self.duration > window_start:
+                yield start, start + self.duration
+
+    def occurrences(self, window_start, window_end):
+        """Yield the occurrences overlapping [window_start, window_end) as Reservation objects"""
+        for start, end in self.iter_intervals(to_minutes(window_start), to_minutes(window_end)):
+            yield Reservation(self.title, start, end, self.all_day, self.description,
+                              self.occurrence_id(start), self.resource)
+
+    def occurrence_id(self, start):
+        return f"series-{self.id}-{from_minutes(start).strftime('%Y%m%dT%H%M')}"
+
+    def conflicts_with(self, start, end):
+        """Check if any occurrence overlaps [start, end) in minutes"""
+        return next(self.iter_intervals(start, end), None) is not None
+
+    def overlaps_series(self, other):
+        """Check if two series have overlapping occurrences, looking a bounded horizon ahead"""
+        window_start = max(self.start, other.start)
+        window_end = window_start + SERIES_CONFLICT_HORIZON_DAYS * 24 * 60
+        for until in (self.until, other.until):
+            if until is not None:
+                window_end = min(window_end, until)
+        if window_end <= window_start:
+            return False
+        return first_overlap(self.iter_intervals(window_start, window_end),
+                             other.iter_intervals(window_start, window_end))
+
+    def describe(self):
+        """Short human description such as 'weekly', 'every 2 weeks' or 'daily, 6 times'"""
+        adverb, unit = RULE_DESCRIPTIONS[self._parts["FREQ"]]
+        interval = int(self._parts.get("INTERVAL", 1))
+        description = adverb if interval == 1 else f"every {interval} {unit}"
+        if self._parts.get("BYDAY") == "MO,TU,WE,TH,FR":
+            description = "every weekday"
+        if "COUNT" in self._parts:
+            description += f", {self._parts['COUNT']} times"
+        return description
@@ -0,0 +1,120 @@
+import datetime
+
+from dateutil import parser
+
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+MINUTES_PER_DAY = 24 * 60
+
+
+def to_datetime(value):
+    """Convert an ISO string (or datetime) to a datetime, parsing fuzzily only as a last resort"""
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return parser.parse(value)
+
+
+def to_minutes(value):
+    """Convert an ISO string, datetime or minute count to whole minutes since the epoch (naive local time)"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            value = parser.parse(value)
+    else:
+        value = to_datetime(value)
+    return (value.toordinal() - EPOCH_ORDINAL) * MINUTES_PER_DAY + value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    """Convert minutes since the epoch back to a naive datetime"""
+    return EPOCH + datetime.timedelta(minutes=minutes)
+
+
+def format_minutes(minutes):
+    """Format minutes since the epoch in the FullCalendar '%Y-%m-%dT%H:%M:%S' shape"""
+    return from_minutes(minutes).isoformat()
+
+
+class Reservation:
+    """A stored reservation with start and end as integer minutes since the epoch.
+
+    Converted to and from the FullCalendar event dict only at the API and
+    storage boundaries; times have minute resolution.
+    """
+
+    __slots__ = ("id", "title", "start", "end", "all_day", "description", "resource")
+
+    def __init__(self, title, start, end, all_day=False, description=None, id=None, resource=None):
+        self.id = id
+        self.title = title
+        self.start = start
+        self.end = end
+        self.all_day = all_day
+        self.description = description
+        self.resource = resource
+
+    @classmethod
+    def from_event(cls, event):
+        """Build a reservation from a FullCalendar event dict (or return a Reservation as is)"""
+        if isinstance(event, cls):
+            return event
+        return cls(
+            event.get("title"),
+            to_minutes(event["start"]),
+            to_minutes(event["end"]),
+            bool(event.get("allDay", False)),
+            event.get("description"),
+            event.get("id"),
+            event.get("resource") or None,
+        )
+
+    def to_event(self):
+        """Return the FullCalendar event dict, with 'id' once stored and 'resource' if one is set"""
+        event = {
+            "title": self.title,
+            "start": format_minutes(self.start),
+            "end": format_minutes(self.end),
+            "allDay": self.all_day,
+            "description": self.description,
+        }
+        if self.resource is not None:
+            event["resource"] = self.resource
+        if self.id is not None:
+            event["id"] = self.id
+        return event
+
+    @property
+    def start_datetime(self):
+        return from_minutes(self.start)
+
+    @property
+    def end_datetime(self):
+        return from_minutes(self.end)
+
+    @property
+    def duration(self):
+        """Length in minutes"""
+        return self.end - self.start
+
+    def overlaps(self, start, end):
+        """Check if the reservation overlaps the half-open range [start, end) of minutes"""
+        return self.start < end and self.end > start
+
+    def _key(self):
+        return self.id, self.title, self.start, self.end, self.all_day, self.description, self.resource
+
+    def __eq__(self, other):
+        if not isinstance(other, Reservation):
+            return NotImplemented
+        return self._key() == other._key()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Reservation(id={self.id!r}, title={self.title!r}, start={format_minutes(self.start)!r}, end={format_minutes(self.end)!r})"
@@ -0,0 +1,73 @@
+from bisect import bisect_left, bisect_right
+
+from reservation import Reservation, to_minutes
+
+
+class ReservationIndex:
+    """In-memory Reservation objects sorted by start, with start/end minute columns.
+
+    Overlap queries bisect on the start column and only look back as far as the
+    longest reservation seen, so a lookup is O(log n + k) instead of re-parsing
+    every existing reservation.
+    """
+
+    def __init__(self, events=()):
+        self._starts = []
+        self._ends = []
+        self._events = []
+        self._max_duration = 0
+        for event in events:
+            self.add(event)
+
+    def __len__(self):
+        return len(self._events)
+
+    def __iter__(self):
+        return iter(self._events)
+
+    def add(self, event):
+        """Insert a Reservation (or FullCalendar event dict) and return the indexed Reservation"""
+        reservation = Reservation.from_event(event)
+        position = bisect_right(self._starts, reservation.start)
+        self._starts.insert(position, reservation.start)
+        self._ends.insert(position, reservation.end)
+        self._events.insert(position, reservation)
+        if reservation.duration > self._max_duration:
+            self._max_duration = reservation.duration
+        return reservation
+
+    def remove(self, event):
+        """Remove a reservation previously added; returns False if it isn't indexed"""
+        reservation = Reservation.from_event(event)
+        position = bisect_left(self._starts, reservation.start)
+        while position < len(self._starts) and self._starts[position] == reservation.start:
+            candidate = self._events[position]
+            if candidate is reservation or (self._ends[position] == reservation.end and candidate == reservation):
+                del self._starts[position]
+                del self._ends[position]
+                del self._events[position]
+                if not self._events:
+                    self._max_duration = 0
+                return True
+            position += 1
+        return False
+
+    def iter_conflicts(self, start, end):
+        """Yield indexed reservations that overlap the half-open range [start, end)"""
+        start = to_minutes(start)
+        end = to_minutes(end)
+        low = bisect_left(self._starts, start - self._max_duration)
+        high = bisect_left(self._starts, end)
+        for position in range(low, high):
+            if self._ends[position] > start:
+                yield self._events[position]
+
+    def conflicts(self, start, end):
+        """List all indexed reservations that overlap the range [start, end)"""
+        return list(self.iter_conflicts(start, end))
+
+    def overlaps(self, start, end):
+        """Check if any indexed reservation overlaps the range [start, end)"""
+        for _ in self.iter_conflicts(start, end):
+            return True
+        return False
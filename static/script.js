@@ -1,11 +1,11 @@
 class ReservationChatbot {
     constructor() {
         this.calendar = null;
-        this.currentReservation = {};
+        this.conversationId = null;
         this.isProcessing = false;
+        this.revision = 0;
         this.initializeCalendar();
         this.setupEventListeners();
-        this.loadReservations();
     }
 
     initializeCalendar() {
@@ -21,7 +21,9 @@ class ReservationChatbot {
             themeSystem: 'standard',
             editable: false,
             selectable: false,
-            events: [],
+            events: (info, successCallback, failureCallback) => {
+                this.fetchEvents(info, successCallback, failureCallback);
+            },
             eventClick: (info) => {
                 const event = info.event;
                 this.showEventDetails(event);
@@ -142,6 +144,10 @@ class ReservationChatbot {
             details += `<br>⏰ ${timeStr}`;
         }
         
+        if (event.extendedProps.resource) {
+            details += `<br>📍 ${event.extendedProps.resource}`;
+        }
+        
         if (event.extendedProps.description) {
             details += `<br>📝 ${event.extendedProps.description}`;
         }
@@ -198,31 +204,22 @@ class ReservationChatbot {
         this.showTypingIndicator();
 
         try {
-            const response = await fetch('/process_reservation', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    message: message,
-                    current_reservation: this.currentReservation
-                })
+            const data = await this.postReservation({
+                message: message,
+                conversation_id: this.conversationId
             });
-
-            const data = await response.json();
             this.removeTypingIndicator();
 
             data.messages.forEach(msg => {
                 this.showMessage(msg, 'bot');
             });
 
-            if (data.reservation) {
-                this.currentReservation = data.reservation;
+            if ('conversation_id' in data) {
+                this.conversationId = data.conversation_id;
             }
 
             if (data.reservation_complete) {
-                this.currentReservation = {};
-                await this.loadReservations();
+                await this.syncReservations();
             }
 
         } catch (error) {
@@ -285,47 +282,89 @@ class ReservationChatbot {
         }
     }
 
-    async loadReservations(highlightNew = false) {
+    toCalendarEvent(reservation) {
+        const name = reservation.title ? reservation.title.toLowerCase() : '';
+
+        return {
+            id: String(reservation.id),
+            title: reservation.title || 'Unknown Appointment',
+            start: reservation.start,
+            end: reservation.end,
+            allDay: false,
+            color: this.getEventColor(name),
+            extendedProps: {
+                description: reservation.description || 'Reservation made via chatbot',
+                resource: reservation.resource || null
+            }
+        };
+    }
+
+    async fetchEvents(info, successCallback, failureCallback) {
         try {
-            const response = await fetch('/get_reservations');
+            // The server answers unchanged ranges with 304; the browser then reuses its cached copy
+            const params = new URLSearchParams({ start: info.startStr, end: info.endStr });
+            const response = await fetch(`/get_reservations?${params}`);
             const reservations = await response.json();
 
-            console.log('Loaded reservations:', reservations);
+            this.revision = Math.max(this.revision, parseInt(response.headers.get('X-Calendar-Revision'), 10) || 0);
+            successCallback(reservations.map(reservation => this.toCalendarEvent(reservation)));
 
-            const events = reservations.map((reservation, index) => {
-                const name = reservation.title ? reservation.title.toLowerCase() : '';
-                const color = this.getEventColor(name);
-                
-                return {
-                    id: `event-${index}-${Date.now()}`,
-                    title: reservation.title || 'Unknown Appointment',
-                    start: reservation.start,
-                    end: reservation.end,
-                    allDay: false,
-                    color: color,
-                    extendedProps: {
-                        description: reservation.description || 'Reservation made via chatbot'
-                    }
-                };
+        } catch (error) {
+            console.error('Error loading reservations:', error);
+            failureCallback(error);
+        }
+    }
+
+    async postReservation(payload, attempts = 3) {
+        // A busy server sheds load with a retry response; wait as asked (plus jitter) and resend
+        for (let attempt = 1; ; attempt++) {
+            const response = await fetch('/process_reservation', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify(payload)
             });
+            const data = await response.json();
+            if (!data.retry || attempt >= attempts) {
+                return data;
+            }
+            const delay = (data.retry_after || 1) * 1000 * attempt + Math.random() * 500;
+            await new Promise(resolve => setTimeout(resolve, delay));
+        }
+    }
 
-            console.log('Converted events:', events);
+    async syncReservations() {
+        try {
+            const response = await fetch(`/get_reservations?since=${this.revision}`);
+            const changes = await response.json();
+
+            if (!response.ok || changes.reset) {
+                this.calendar.refetchEvents();
+                return;
+            }
 
-            this.calendar.removeAllEvents();
-            if (events.length > 0) {
-                events.forEach(event => {
+            const source = this.calendar.getEventSources()[0];
+            changes.removed.forEach(id => {
+                const event = this.calendar.getEventById(String(id));
+                if (event) {
+                    event.remove();
+                }
+            });
+            changes.added.forEach(reservation => {
+                if (!this.calendar.getEventById(String(reservation.id))) {
                     try {
-                        this.calendar.addEvent(event);
+                        this.calendar.addEvent(this.toCalendarEvent(reservation), source);
                     } catch (error) {
-                        console.error('Error adding event:', error, event);
+                        console.error('Error adding event:', error, reservation);
                     }
-                });
-            }
+                }
+            });
 
-            this.calendar.render();
+            this.revision = changes.revision;
 
         } catch (error) {
-            console.error('Error loading reservations:', error);
+            console.error('Error syncing reservations:', error);
         }
     }
 
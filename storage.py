@@ -0,0 +1,944 @@
+import functools
+import heapq
+import itertools
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from reservation import Reservation, format_minutes, to_datetime, to_minutes
+from recurrence import FAR_FUTURE, RecurringReservation, first_overlap
+from reservation_index import ReservationIndex
+
+
+# Pass as resource to list or search across every resource of a calendar
+ANY_RESOURCE = object()
+
+
+class ReservationStore:
+    """Interface implemented by the reservation storage backends.
+
+    Every change to a calendar bumps its revision; stored events carry an 'id'
+    and remember the revision that added them, so clients can sync deltas.
+    Reservations may name a resource (room, staff member); only reservations of
+    the same resource conflict, and None is the calendar's unassigned resource.
+    Recurring series are stored once; range queries and conflict checks include
+    their occurrences, expanded only within the queried range.
+    """
+
+    def list_reservations(self, calendar_id, resource=ANY_RESOURCE):
+        """Return reservations of a calendar as FullCalendar event dicts, ordered by start"""
+        raise NotImplementedError
+
+    def find_conflicts(self, calendar_id, start, end, resource=ANY_RESOURCE):
+        """Return reservations of a calendar that overlap the range [start, end)"""
+        raise NotImplementedError
+
+    def has_conflict(self, calendar_id, start, end, resource=None):
+        """Check if any reservation of one resource overlaps the range [start, end)"""
+        return bool(self.find_conflicts(calendar_id, start, end, resource))
+
+    def add_reservation(self, calendar_id, reservation):
+        """Store a reservation and return it with its id"""
+        raise NotImplementedError
+
+    def book_reservation(self, calendar_id, reservation):
+        """Atomically store a reservation unless it overlaps another one of the calendar.
+
+        Returns the stored event with its id, or None on a conflict.
+        """
+        raise NotImplementedError
+
+    def book_reservations(self, calendar_id, reservations):
+        """Atomically store every reservation that overlaps neither a stored booking of its resource
+        nor an earlier accepted one of the batch; returns the stored event or None for each, in order"""
+        raise NotImplementedError
+
+    def book_series(self, calendar_id, series):
+        """Atomically store a RecurringReservation unless an occurrence overlaps another booking
+        of its resource; returns the stored series event with its id, or None on a conflict"""
+        raise NotImplementedError
+
+    def iter_reservations(self, calendar_id):
+        """Iterate the reservations of a calendar as event dicts, ordered by start, without building a list"""
+        return iter(self.list_reservations(calendar_id))
+
+    def list_spans(self, calendar_id, start=None, end=None):
+        """Return unordered (id, start, end, resource) tuples for analytics, with '' for no resource.
+
+        Without a range only one-off reservations are listed; with one, series
+        occurrences overlapping [start, end) are included.
+        """
+        if start is None or end is None:
+            events = self.list_reservations(calendar_id)
+        else:
+            events = self.find_conflicts(calendar_id, start, end)
+        return [(event["id"], event["start"], event["end"], event.get("resource", "")) for event in events]
+
+    def list_series(self, calendar_id, resource=ANY_RESOURCE):
+        """Return the recurring series of a calendar as event dicts with an 'rrule'"""
+        raise NotImplementedError
+
+    def delete_reservation(self, calendar_id, reservation):
+        """Delete a reservation; returns False if it wasn't stored"""
+        raise NotImplementedError
+
+    def get_revision(self, calendar_id):
+        """Return a counter that changes whenever a calendar's reservations change"""
+        raise NotImplementedError
+
+    def list_changes(self, calendar_id, since):
+        """Return (revision, added events, removed ids) after revision since, or None if the client
+        must reload (since is unknown, or a recurring series changed)"""
+        raise NotImplementedError
+
+    def load_conversation(self, conversation_id):
+        """Return the stored JSON state of an unexpired conversation, or None"""
+        raise NotImplementedError
+
+    def save_conversation(self, conversation_id, state, expires_at):
+        """Store a conversation's JSON state until expires_at (a time.time() timestamp)"""
+        raise NotImplementedError
+
+    def delete_conversation(self, conversation_id):
+        """Delete a conversation's state"""
+        raise NotImplementedError
+
+
+def event_from_reservation(reservation):
+    """Keep only the fields that make up the stored FullCalendar event shape"""
+    if isinstance(reservation, Reservation):
+        event = reservation.to_event()
+        event.pop("id", None)
+        return event
+    event = {
+        "title": reservation.get("title"),
+        "start": reservation.get("start"),
+        "end": reservation.get("end"),
+        "allDay": bool(reservation.get("allDay", False)),
+        "description": reservation.get("description"),
+    }
+    if reservation.get("resource"):
+        event["resource"] = reservation["resource"]
+    return event
+
+
+def group_by_resource(reservations):
+    """Map each resource to the positions of its reservations in the list"""
+    groups = {}
+    for position, reservation in enumerate(reservations):
+        groups.setdefault(reservation.resource, []).append(position)
+    return groups
+
+
+def sweep_conflicts(candidates, existing):
+    """Mark the candidate Reservations that overlap an existing booking or an earlier accepted candidate.
+
+    One sort-and-sweep pass: candidates are visited by start, and existing
+    (start, end) intervals, sorted by start, are merged in as the sweep
+    reaches them. Returns one bool per candidate (True for a conflict), in order.
+    """
+    conflicts = [False] * len(candidates)
+    latest_end = None
+    position = 0
+    for number in sorted(range(len(candidates)), key=lambda number: candidates[number].start):
+        candidate = candidates[number]
+        while position < len(existing) and existing[position][0] <= candidate.start:
+            if latest_end is None or existing[position][1] > latest_end:
+                latest_end = existing[position][1]
+            position += 1
+        if (latest_end is not None and candidate.start < latest_end) or (
+                position < len(existing) and existing[position][0] < candidate.end):
+            conflicts[number] = True
+        elif latest_end is None or candidate.end > latest_end:
+            latest_end = candidate.end
+    return conflicts
+
+
+def duration_minutes(event):
+    """Length of an event in whole minutes, rounded up"""
+    duration = to_datetime(event["end"]) - to_datetime(event["start"])
+    return math.ceil(duration.total_seconds() / 60)
+
+
+class MemoryCalendar:
+    """State of one calendar in the memory store, guarded by its own lock"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.series = {}
+        self.series_revision = 0
+        self.revision = 0
+        self.added_at = {}
+        self.removals = []
+
+    def index(self, resource):
+        """Return the ReservationIndex of one resource, creating it on first use"""
+        index = self.indexes.get(resource)
+        if index is None:
+            index = self.indexes[resource] = ReservationIndex()
+        return index
+
+    def reservations(self, resource=ANY_RESOURCE):
+        """Iterate reservations of one resource, or of all of them merged by start"""
+        if resource is not ANY_RESOURCE:
+            return iter(self.indexes.get(resource, ()))
+        return heapq.merge(*self.indexes.values(), key=lambda reservation: reservation.start)
+
+    def series_of(self, resource=ANY_RESOURCE):
+        """Return the recurring series of one resource, or of all of them"""
+        if resource is not ANY_RESOURCE:
+            return self.series.get(resource, [])
+        return [series for resource_series in self.series.values() for series in resource_series]
+
+    def conflicts(self, start, end, resource=ANY_RESOURCE):
+        """Iterate reservations and series occurrences overlapping [start, end), ordered by start"""
+        if resource is not ANY_RESOURCE:
+            index = self.indexes.get(resource)
+            found = index.iter_conflicts(start, end) if index is not None else iter(())
+        else:
+            found = heapq.merge(*(index.iter_conflicts(start, end) for index in self.indexes.values()),
+                                key=lambda reservation: reservation.start)
+        series = self.series_of(resource)
+        if not series:
+            return found
+        occurrences = [occurrence for item in series for occurrence in item.occurrences(start, end)]
+        return heapq.merge(found, sorted(occurrences, key=lambda reservation: reservation.start),
+                           key=lambda reservation: reservation.start)
+
+    def overlaps(self, start, end, resource=None):
+        """Check if a reservation or series occurrence of one resource overlaps [start, end)"""
+        index = self.indexes.get(resource)
+        if index is not None and index.overlaps(start, end):
+            return True
+        # Most calendars have no series: skip the timestamp conversion entirely
+        series = self.series.get(resource)
+        if not series:
+            return False
+        start, end = to_minutes(start), to_minutes(end)
+        return any(item.conflicts_with(start, end) for item in series)
+
+    def series_conflicts(self, series):
+        """Check if a new series overlaps a reservation or series of its resource"""
+        index = self.indexes.get(series.resource)
+        if index is not None:
+            bookings = ((reservation.start, reservation.end) for reservation in
+                        index.iter_conflicts(series.start, series.until if series.until is not None else FAR_FUTURE))
+            if first_overlap(bookings, series.iter_intervals(series.start)):
+                return True
+        return any(series.overlaps_series(other) for other in self.series.get(series.resource, ()))
+
+
+class MemoryReservationStore(ReservationStore):
+    """Per-process store keeping one ReservationIndex per calendar resource (used for tests and demos).
+
+    The store lock only guards the calendar table; each calendar has its own
+    lock, so operations on different calendars don't contend. Calendars are
+    never evicted: this is the primary copy of their bookings.
+    """
+
+    def __init__(self):
+        self._calendars = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _calendar(self, calendar_id):
+        with self._lock:
+            calendar = self._calendars.get(calendar_id)
+            if calendar is None:
+                calendar = MemoryCalendar()
+                self._calendars[calendar_id] = calendar
+            return calendar
+
+    def list_reservations(self, calendar_id, resource=ANY_RESOURCE):
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            return [reservation.to_event() for reservation in calendar.reservations(resource)]
+
+    def find_conflicts(self, calendar_id, start, end, resource=ANY_RESOURCE):
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            return [reservation.to_event() for reservation in calendar.conflicts(start, end, resource)]
+
+    def has_conflict(self, calendar_id, start, end, resource=None):
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            return calendar.overlaps(start, end, resource)
+
+    def _insert(self, calendar, event):
+        """Index an event and bump the revision; the caller holds the calendar lock"""
+        stored = Reservation.from_event(event)
+        stored.id = event["id"] = next(self._ids)
+        calendar.index(stored.resource).add(stored)
+        calendar.revision += 1
+        calendar.added_at[stored.id] = calendar.revision
+        return event
+
+    def add_reservation(self, calendar_id, reservation):
+        event = event_from_reservation(reservation)
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            return self._insert(calendar, event)
+
+    def book_reservation(self, calendar_id, reservation):
+        event = event_from_reservation(reservation)
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            if calendar.overlaps(event["start"], event["end"], event.get("resource")):
+                return None
+            return self._insert(calendar, event)
+
+    def book_reservations(self, calendar_id, reservations):
+        reservations = [Reservation.from_event(reservation) for reservation in reservations]
+        results = [None] * len(reservations)
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            for resource, positions in group_by_resource(reservations).items():
+                batch = [reservations[position] for position in positions]
+                start, end = min(item.start for item in batch), max(item.end for item in batch)
+                existing = [(item.start, item.end) for item in calendar.conflicts(start, end, resource)]
+                for position, conflict in zip(positions, sweep_conflicts(batch, existing)):
+                    if not conflict:
+                        results[position] = self._insert(calendar, event_from_reservation(reservations[position]))
+        return results
+
+    def book_series(self, calendar_id, series):
+        series = RecurringReservation.from_event(series)
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            if calendar.series_conflicts(series):
+                return None
+            stored = RecurringReservation(series.title, series.start, series.duration, series.rule,
+                                          series.all_day, series.description, next(self._ids), series.resource)
+            calendar.series.setdefault(stored.resource, []).append(stored)
+            calendar.revision += 1
+            calendar.series_revision = calendar.revision
+            return stored.to_event()
+
+    def iter_reservations(self, calendar_id):
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            reservations = list(calendar.reservations())
+        return (reservation.to_event() for reservation in reservations)
+
+    def list_series(self, calendar_id, resource=ANY_RESOURCE):
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            return [series.to_event() for series in calendar.series_of(resource)]
+
+    def delete_reservation(self, calendar_id, reservation):
+        target = Reservation.from_event(reservation)
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            index = calendar.index(target.resource)
+            for stored in index.conflicts(target.start, target.end):
+                if (stored.start, stored.end, stored.title) == (target.start, target.end, target.title):
+                    index.remove(stored)
+                    calendar.revision += 1
+                    del calendar.added_at[stored.id]
+                    calendar.removals.append((calendar.revision, stored.id))
+                    return True
+        return False
+
+    def get_revision(self, calendar_id):
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            return calendar.revision
+
+    def list_changes(self, calendar_id, since):
+        calendar = self._calendar(calendar_id)
+        with calendar.lock:
+            if since > calendar.revision or since < calendar.series_revision:
+                return None
+            added = [reservation.to_event() for reservation in calendar.reservations()
+                     if calendar.added_at[reservation.id] > since]
+            removed = [event_id for revision, event_id in calendar.removals if revision > since]
+            return calendar.revision, added, removed
+
+
+class SQLiteReservationStore(ReservationStore):
+    """SQLite (WAL mode) store with one connection per worker process/thread.
+
+    Start and end are stored in the fixed '%Y-%m-%dT%H:%M:%S' format, so string
+    comparison orders them chronologically and the (calendar_id, start_at, end_at)
+    index serves both range listing and overlap checks.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS reservations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            calendar_id TEXT NOT NULL,
+            title TEXT,
+            start_at TEXT NOT NULL,
+            end_at TEXT NOT NULL,
+            all_day INTEGER NOT NULL DEFAULT 0,
+            description TEXT
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_reservations_calendar_start_end
+        ON reservations (calendar_id, start_at, end_at)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS calendar_revisions (
+            calendar_id TEXT PRIMARY KEY,
+            revision INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS reservation_removals (
+            calendar_id TEXT NOT NULL,
+            revision INTEGER NOT NULL,
+            reservation_id INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_reservation_removals_calendar_revision
+        ON reservation_removals (calendar_id, revision)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS reservation_series (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            calendar_id TEXT NOT NULL,
+            resource TEXT NOT NULL DEFAULT '',
+            title TEXT,
+            start_at TEXT NOT NULL,
+            end_at TEXT NOT NULL,
+            rrule TEXT NOT NULL,
+            until_at TEXT,
+            all_day INTEGER NOT NULL DEFAULT 0,
+            description TEXT,
+            created_revision INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_reservation_series_calendar_resource
+        ON reservation_series (calendar_id, resource, start_at)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            conversation_id TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_conversations_expires
+        ON conversations (expires_at)
+        """,
+    )
+    # Columns added after the first release, applied to existing databases on connect
+    MIGRATIONS = (
+        ("reservations", "created_revision", "INTEGER NOT NULL DEFAULT 0", None),
+        ("reservations", "resource", "TEXT NOT NULL DEFAULT ''", None),
+        ("calendar_revisions", "max_duration_minutes", "INTEGER NOT NULL DEFAULT 0", (
+            "UPDATE calendar_revisions SET max_duration_minutes = COALESCE(("
+            "SELECT CAST(MAX(julianday(end_at) - julianday(start_at)) * 1440 AS INTEGER) + 1 "
+            "FROM reservations WHERE reservations.calendar_id = calendar_revisions.calendar_id), 0)"
+        )),
+    )
+    SEED_REVISIONS = (
+        "INSERT OR IGNORE INTO calendar_revisions (calendar_id, revision, max_duration_minutes) "
+        "SELECT calendar_id, 1, CAST(MAX(julianday(end_at) - julianday(start_at)) * 1440 AS INTEGER) + 1 "
+        "FROM reservations GROUP BY calendar_id"
+    )
+    POST_MIGRATION_SCHEMA = (
+        """
+        CREATE INDEX IF NOT EXISTS idx_reservations_calendar_created
+        ON reservations (calendar_id, created_revision)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_reservations_calendar_resource_start_end
+        ON reservations (calendar_id, resource, start_at, end_at)
+        """,
+    )
+
+    # Statements are kept as constants so sqlite3's per-connection statement cache reuses them
+    EVENT_COLUMNS = "id, title, start_at, end_at, all_day, description, resource"
+    SELECT_ALL = (
+        f"SELECT {EVENT_COLUMNS} FROM reservations "
+        "WHERE calendar_id = ? ORDER BY start_at, id"
+    )
+    SELECT_RESOURCE_ALL = (
+        f"SELECT {EVENT_COLUMNS} FROM reservations "
+        "WHERE calendar_id = ? AND resource = ? ORDER BY start_at, id"
+    )
+    # Overlap queries bound start_at from below by the calendar's longest reservation,
+    # so the index range scan only covers candidates instead of every earlier booking
+    SELECT_CONFLICTS = (
+        f"SELECT {EVENT_COLUMNS} FROM reservations "
+        "WHERE calendar_id = ? AND start_at >= ? AND start_at < ? AND end_at > ? ORDER BY start_at, id"
+    )
+    # Per-resource queries use the (calendar_id, resource, start_at, end_at) index,
+    # so their cost depends on the size of one resource's schedule
+    SELECT_RESOURCE_CONFLICTS = (
+        f"SELECT {EVENT_COLUMNS} FROM reservations "
+        "WHERE calendar_id = ? AND resource = ? AND start_at >= ? AND start_at < ? AND end_at > ? "
+        "ORDER BY start_at, id"
+    )
+    SELECT_ANY_CONFLICT = (
+        "SELECT 1 FROM reservations "
+        "WHERE calendar_id = ? AND resource = ? AND start_at >= ? AND start_at < ? AND end_at > ? LIMIT 1"
+    )
+    SELECT_MAX_DURATION = "SELECT max_duration_minutes FROM calendar_revisions WHERE calendar_id = ?"
+    UPDATE_MAX_DURATION = (
+        "UPDATE calendar_revisions SET max_duration_minutes = MAX(max_duration_minutes, ?) "
+        "WHERE calendar_id = ?"
+    )
+    SELECT_ADDED_SINCE = (
+        f"SELECT {EVENT_COLUMNS} FROM reservations "
+        "WHERE calendar_id = ? AND created_revision > ? ORDER BY start_at, id"
+    )
+    SELECT_REMOVED_SINCE = (
+        "SELECT reservation_id FROM reservation_removals "
+        "WHERE calendar_id = ? AND revision > ? ORDER BY revision"
+    )
+    SELECT_REVISION = "SELECT revision FROM calendar_revisions WHERE calendar_id = ?"
+    BUMP_REVISION = (
+        "INSERT INTO calendar_revisions (calendar_id, revision) VALUES (?, 1) "
+        "ON CONFLICT (calendar_id) DO UPDATE SET revision = revision + 1"
+    )
+    INSERT = (
+        "INSERT INTO reservations "
+        "(calendar_id, title, start_at, end_at, all_day, description, resource, created_revision) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    SELECT_ONE = (
+        "SELECT id FROM reservations WHERE calendar_id = ? AND resource = ? AND start_at = ? AND end_at = ? "
+        "AND title IS ? LIMIT 1"
+    )
+    DELETE = "DELETE FROM reservations WHERE id = ?"
+    INSERT_REMOVAL = (
+        "INSERT INTO reservation_removals (calendar_id, revision, reservation_id) VALUES (?, ?, ?)"
+    )
+    # Series are few per calendar; rows whose span can't reach the range are skipped
+    # and the rest are expanded in Python only within the range
+    SERIES_COLUMNS = "id, title, start_at, end_at, rrule, all_day, description, resource"
+    SELECT_SERIES = (
+        f"SELECT {SERIES_COLUMNS} FROM reservation_series "
+        "WHERE calendar_id = ? AND start_at < ? AND (until_at IS NULL OR until_at > ?)"
+    )
+    SELECT_RESOURCE_SERIES = (
+        f"SELECT {SERIES_COLUMNS} FROM reservation_series "
+        "WHERE calendar_id = ? AND resource = ? AND start_at < ? AND (until_at IS NULL OR until_at > ?)"
+    )
+    SELECT_ALL_SERIES = (
+        f"SELECT {SERIES_COLUMNS} FROM reservation_series WHERE calendar_id = ? ORDER BY start_at, id"
+    )
+    SELECT_RESOURCE_ALL_SERIES = (
+        f"SELECT {SERIES_COLUMNS} FROM reservation_series WHERE calendar_id = ? AND resource = ? "
+        "ORDER BY start_at, id"
+    )
+    SELECT_RESOURCE_SPANS = (
+        "SELECT start_at, end_at FROM reservations "
+        "WHERE calendar_id = ? AND resource = ? AND start_at >= ? AND start_at < ? AND end_at > ? "
+        "ORDER BY start_at"
+    )
+    SELECT_SPANS = "SELECT id, start_at, end_at, resource FROM reservations WHERE calendar_id = ?"
+    SELECT_SPANS_IN_RANGE = (
+        "SELECT id, start_at, end_at, resource FROM reservations "
+        "WHERE calendar_id = ? AND start_at >= ? AND start_at < ? AND end_at > ?"
+    )
+    SELECT_SERIES_CHANGED_SINCE = (
+        "SELECT 1 FROM reservation_series WHERE calendar_id = ? AND created_revision > ? LIMIT 1"
+    )
+    INSERT_SERIES = (
+        "INSERT INTO reservation_series "
+        "(calendar_id, resource, title, start_at, end_at, rrule, until_at, all_day, description, created_revision) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+    SELECT_CONVERSATION = "SELECT state FROM conversations WHERE conversation_id = ? AND expires_at > ?"
+    UPSERT_CONVERSATION = "INSERT OR REPLACE INTO conversations (conversation_id, state, expires_at) VALUES (?, ?, ?)"
+    DELETE_CONVERSATION = "DELETE FROM conversations WHERE conversation_id = ?"
+    PURGE_CONVERSATIONS = "DELETE FROM conversations WHERE expires_at <= ?"
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        """Return this worker's connection, reconnecting after a fork"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, cached_statements=64)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                # One write transaction for the whole setup: connections opened at the same
+                # time (threads, workers) would otherwise both see a column missing and add it
+                connection.execute("BEGIN IMMEDIATE")
+                has_revisions = connection.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'calendar_revisions'"
+                ).fetchone() is not None
+                for statement in self.SCHEMA:
+                    connection.execute(statement)
+                self._migrate(connection)
+                if not has_revisions:
+                    # Databases from before revisions existed: give their calendars a
+                    # revision row, or overlap checks would use a zero look-back
+                    connection.execute(self.SEED_REVISIONS)
+                for statement in self.POST_MIGRATION_SCHEMA:
+                    connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _migrate(self, connection):
+        """Add columns that databases created by older versions are missing"""
+        for table, column, definition, backfill in self.MIGRATIONS:
+            existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                if backfill:
+                    connection.execute(backfill)
+
+    @staticmethod
+    def _row_to_event(row):
+        reservation_id, title, start, end, all_day, description, resource = row
+        event = {
+            "id": reservation_id,
+            "title": title,
+            "start": start,
+            "end": end,
+            "allDay": bool(all_day),
+            "description": description,
+        }
+        if resource:
+            event["resource"] = resource
+        return event
+
+    def _bump_revision(self, connection, calendar_id):
+        connection.execute(self.BUMP_REVISION, (calendar_id,))
+        return connection.execute(self.SELECT_REVISION, (calendar_id,)).fetchone()[0]
+
+    def list_reservations(self, calendar_id, resource=ANY_RESOURCE):
+        if resource is ANY_RESOURCE:
+            rows = self._connection().execute(self.SELECT_ALL, (calendar_id,))
+        else:
+            rows = self._connection().execute(self.SELECT_RESOURCE_ALL, (calendar_id, resource or ""))
+        return [self._row_to_event(row) for row in rows]
+
+    def _earliest_overlapping_start(self, connection, calendar_id, start):
+        """Lowest start_at a reservation overlapping start can have"""
+        row = connection.execute(self.SELECT_MAX_DURATION, (calendar_id,)).fetchone()
+        return format_minutes(to_minutes(start) - (row[0] if row else 0))
+
+    def _series(self, connection, calendar_id, start, end, resource=ANY_RESOURCE):
+        """Return the series of a calendar (or one resource) whose span can overlap [start, end)"""
+        if resource is ANY_RESOURCE:
+            rows = connection.execute(self.SELECT_SERIES, (calendar_id, end, start))
+        else:
+            rows = connection.execute(self.SELECT_RESOURCE_SERIES, (calendar_id, resource or "", end, start))
+        return series_from_rows(rows)
+
+    def find_conflicts(self, calendar_id, start, end, resource=ANY_RESOURCE):
+        connection = self._connection()
+        lower = self._earliest_overlapping_start(connection, calendar_id, start)
+        if resource is ANY_RESOURCE:
+            rows = connection.execute(self.SELECT_CONFLICTS, (calendar_id, lower, end, start))
+        else:
+            rows = connection.execute(self.SELECT_RESOURCE_CONFLICTS, (calendar_id, resource or "", lower, end, start))
+        events = [self._row_to_event(row) for row in rows]
+        series = self._series(connection, calendar_id, start, end, resource)
+        if series:
+            events.extend(occurrence.to_event() for item in series for occurrence in item.occurrences(start, end))
+            events.sort(key=lambda event: event["start"])
+        return events
+
+    def _overlaps(self, connection, calendar_id, start, end, resource):
+        """Check if a reservation or series occurrence of one resource overlaps [start, end)"""
+        lower = self._earliest_overlapping_start(connection, calendar_id, start)
+        if connection.execute(self.SELECT_ANY_CONFLICT, (calendar_id, resource or "", lower, end, start)).fetchone():
+            return True
+        series = self._series(connection, calendar_id, start, end, resource)
+        if not series:
+            return False
+        start, end = to_minutes(start), to_minutes(end)
+        return any(item.conflicts_with(start, end) for item in series)
+
+    def has_conflict(self, calendar_id, start, end, resource=None):
+        return self._overlaps(self._connection(), calendar_id, start, end, resource)
+
+    def _insert(self, connection, calendar_id, event):
+        """Insert an event and bump the revision inside the caller's transaction"""
+        revision = self._bump_revision(connection, calendar_id)
+        connection.execute(self.UPDATE_MAX_DURATION, (duration_minutes(event), calendar_id))
+        cursor = connection.execute(self.INSERT, (
+            calendar_id, event["title"], event["start"], event["end"],
+            int(event["allDay"]), event["description"], event.get("resource", ""), revision,
+        ))
+        event["id"] = cursor.lastrowid
+        return event
+
+    def add_reservation(self, calendar_id, reservation):
+        event = event_from_reservation(reservation)
+        connection = self._connection()
+        with connection:
+            return self._insert(connection, calendar_id, event)
+
+    def book_reservation(self, calendar_id, reservation):
+        event = event_from_reservation(reservation)
+        connection = self._connection()
+        with connection:
+            # Take the write lock before checking, so no other connection (thread or
+            # worker process) can insert between the overlap check and our insert
+            connection.execute("BEGIN IMMEDIATE")
+            if self._overlaps(connection, calendar_id, event["start"], event["end"], event.get("resource")):
+                return None
+            return self._insert(connection, calendar_id, event)
+
+    def book_reservations(self, calendar_id, reservations):
+        reservations = [Reservation.from_event(reservation) for reservation in reservations]
+        results = [None] * len(reservations)
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            accepted = []
+            for resource, positions in group_by_resource(reservations).items():
+                batch = [reservations[position] for position in positions]
+                start = format_minutes(min(item.start for item in batch))
+                end = format_minutes(max(item.end for item in batch))
+                lower = self._earliest_overlapping_start(connection, calendar_id, start)
+                existing = [(to_minutes(span_start), to_minutes(span_end)) for span_start, span_end in
+                            connection.execute(self.SELECT_RESOURCE_SPANS, (calendar_id, resource or "", lower, end, start))]
+                series = self._series(connection, calendar_id, start, end, resource)
+                if series:
+                    window = to_minutes(start), to_minutes(end)
+                    existing.extend(interval for item in series for interval in item.iter_intervals(*window))
+                    existing.sort()
+                accepted.extend(position for position, conflict in zip(positions, sweep_conflicts(batch, existing))
+                                if not conflict)
+            if not accepted:
+                return results
+            # One revision for the whole batch, so a since-sync picks it up in one delta
+            revision = self._bump_revision(connection, calendar_id)
+            connection.execute(self.UPDATE_MAX_DURATION, (
+                max(reservations[position].duration for position in accepted), calendar_id,
+            ))
+            for position in sorted(accepted):
+                event = event_from_reservation(reservations[position])
+                cursor = connection.execute(self.INSERT, (
+                    calendar_id, event["title"], event["start"], event["end"],
+                    int(event["allDay"]), event["description"], event.get("resource", ""), revision,
+                ))
+                event["id"] = cursor.lastrowid
+                results[position] = event
+        return results
+
+    def book_series(self, calendar_id, series):
+        series = RecurringReservation.from_event(series)
+        first = series.to_event()
+        until = format_minutes(series.until) if series.until is not None else None
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            lower = self._earliest_overlapping_start(connection, calendar_id, first["start"])
+            spans = connection.execute(self.SELECT_RESOURCE_SPANS, (
+                calendar_id, series.resource or "", lower, until or format_minutes(FAR_FUTURE), first["start"],
+            ))
+            bookings = ((to_minutes(start), to_minutes(end)) for start, end in spans)
+            if first_overlap(bookings, series.iter_intervals(series.start)):
+                return None
+            others = self._series(connection, calendar_id, first["start"], until or format_minutes(FAR_FUTURE),
+                                  series.resource)
+            if any(series.overlaps_series(other) for other in others):
+                return None
+            revision = self._bump_revision(connection, calendar_id)
+            cursor = connection.execute(self.INSERT_SERIES, (
+                calendar_id, series.resource or "", series.title, first["start"], first["end"], series.rule,
+                until, int(series.all_day), series.description, revision,
+            ))
+        first["id"] = cursor.lastrowid
+        return first
+
+    def iter_reservations(self, calendar_id):
+        # The cursor is read as the caller consumes it, so rows are never all in memory at once
+        for row in self._connection().execute(self.SELECT_ALL, (calendar_id,)):
+            yield self._row_to_event(row)
+
+    def list_spans(self, calendar_id, start=None, end=None):
+        connection = self._connection()
+        if start is None or end is None:
+            return connection.execute(self.SELECT_SPANS, (calendar_id,)).fetchall()
+        lower = self._earliest_overlapping_start(connection, calendar_id, start)
+        spans = connection.execute(self.SELECT_SPANS_IN_RANGE, (calendar_id, lower, end, start)).fetchall()
+        for series in self._series(connection, calendar_id, start, end):
+            spans.extend(
+                (occurrence.id, format_minutes(occurrence.start), format_minutes(occurrence.end), series.resource or "")
+                for occurrence in series.occurrences(start, end)
+            )
+        return spans
+
+    def list_series(self, calendar_id, resource=ANY_RESOURCE):
+        if resource is ANY_RESOURCE:
+            rows = self._connection().execute(self.SELECT_ALL_SERIES, (calendar_id,))
+        else:
+            rows = self._connection().execute(self.SELECT_RESOURCE_ALL_SERIES, (calendar_id, resource or ""))
+        return [series.to_event() for series in series_from_rows(rows)]
+
+    def delete_reservation(self, calendar_id, reservation):
+        event = event_from_reservation(reservation)
+        connection = self._connection()
+        with connection:
+            row = connection.execute(self.SELECT_ONE, (
+                calendar_id, event.get("resource", ""), event["start"], event["end"], event["title"],
+            )).fetchone()
+            if row is None:
+                return False
+            connection.execute(self.DELETE, (row[0],))
+            revision = self._bump_revision(connection, calendar_id)
+            connection.execute(self.INSERT_REMOVAL, (calendar_id, revision, row[0]))
+        return True
+
+    def get_revision(self, calendar_id):
+        row = self._connection().execute(self.SELECT_REVISION, (calendar_id,)).fetchone()
+        return row[0] if row else 0
+
+    def list_changes(self, calendar_id, since):
+        connection = self._connection()
+        # Read revision and deltas in one snapshot so they agree with each other
+        with connection:
+            connection.execute("BEGIN")
+            row = connection.execute(self.SELECT_REVISION, (calendar_id,)).fetchone()
+            revision = row[0] if row else 0
+            if since > revision:
+                return None
+            if connection.execute(self.SELECT_SERIES_CHANGED_SINCE, (calendar_id, since)).fetchone():
+                return None
+            added = [self._row_to_event(row) for row in connection.execute(self.SELECT_ADDED_SINCE, (calendar_id, since))]
+            removed = [row[0] for row in connection.execute(self.SELECT_REMOVED_SINCE, (calendar_id, since))]
+        return revision, added, removed
+
+    def load_conversation(self, conversation_id):
+        row = self._connection().execute(self.SELECT_CONVERSATION, (conversation_id, time.time())).fetchone()
+        return row[0] if row else None
+
+    def save_conversation(self, conversation_id, state, expires_at):
+        connection = self._connection()
+        with connection:
+            # Abandoned conversations are dropped here rather than by a background job
+            connection.execute(self.PURGE_CONVERSATIONS, (time.time(),))
+            connection.execute(self.UPSERT_CONVERSATION, (conversation_id, state, expires_at))
+
+    def delete_conversation(self, conversation_id):
+        connection = self._connection()
+        with connection:
+            connection.execute(self.DELETE_CONVERSATION, (conversation_id,))
+
+
+@functools.lru_cache(maxsize=1024)
+def series_from_row(row):
+    """Build a RecurringReservation from a reservation_series row, reusing parsed rules"""
+    series_id, title, start, end, rule, all_day, description, resource = row
+    return RecurringReservation.from_event({
+        "id": series_id, "title": title, "start": start, "end": end, "rrule": rule,
+        "allDay": bool(all_day), "description": description, "resource": resource,
+    })
+
+
+def series_from_rows(rows):
+    """Build the series of reservation_series rows, skipping rules stored before they were validated"""
+    series = []
+    for row in rows:
+        try:
+            series.append(series_from_row(row))
+        except ValueError as e:
+            print(f"Skipping invalid recurring series {row[0]}: {e}")
+    return series
+
+
+class ShardedSQLiteReservationStore(ReservationStore):
+    """SQLite store spreading calendars over several database files by a hash of their id.
+
+    SQLite has one write lock per file, so in a single file a booking waits for
+    bookings into every other calendar. Each calendar lives in exactly one shard,
+    with its revisions and series, so its bookings stay atomic while calendars in
+    different shards are written in parallel; conversations are spread by their
+    own id. The first shard is path itself: calendars it already holds when the
+    store opens stay there, so databases from before sharding keep their data.
+    """
+
+    def __init__(self, path, shards=8, timeout=5.0):
+        root, extension = os.path.splitext(path)
+        self.shards = [SQLiteReservationStore(path if number == 0 else f"{root}-{number}{extension}", timeout)
+                       for number in range(shards)]
+        connection = self.shards[0]._connection()
+        self._pinned = frozenset(row[0] for row in connection.execute("SELECT calendar_id FROM calendar_revisions"))
+
+    def _shard(self, key):
+        # crc32 rather than hash(): every worker process must pick the same shard
+        return self.shards[zlib.crc32(key.encode()) % len(self.shards)]
+
+    def _calendar_shard(self, calendar_id):
+        return self.shards[0] if calendar_id in self._pinned else self._shard(calendar_id)
+
+    def list_reservations(self, calendar_id, resource=ANY_RESOURCE):
+        return self._calendar_shard(calendar_id).list_reservations(calendar_id, resource)
+
+    def find_conflicts(self, calendar_id, start, end, resource=ANY_RESOURCE):
+        return self._calendar_shard(calendar_id).find_conflicts(calendar_id, start, end, resource)
+
+    def has_conflict(self, calendar_id, start, end, resource=None):
+        return self._calendar_shard(calendar_id).has_conflict(calendar_id, start, end, resource)
+
+    def add_reservation(self, calendar_id, reservation):
+        return self._calendar_shard(calendar_id).add_reservation(calendar_id, reservation)
+
+    def book_reservation(self, calendar_id, reservation):
+        return self._calendar_shard(calendar_id).book_reservation(calendar_id, reservation)
+
+    def book_reservations(self, calendar_id, reservations):
+        return self._calendar_shard(calendar_id).book_reservations(calendar_id, reservations)
+
+    def book_series(self, calendar_id, series):
+        return self._calendar_shard(calendar_id).book_series(calendar_id, series)
+
+    def iter_reservations(self, calendar_id):
+        return self._calendar_shard(calendar_id).iter_reservations(calendar_id)
+
+    def list_spans(self, calendar_id, start=None, end=None):
+        return self._calendar_shard(calendar_id).list_spans(calendar_id, start, end)
+
+    def list_series(self, calendar_id, resource=ANY_RESOURCE):
+        return self._calendar_shard(calendar_id).list_series(calendar_id, resource)
+
+    def delete_reservation(self, calendar_id, reservation):
+        return self._calendar_shard(calendar_id).delete_reservation(calendar_id, reservation)
+
+    def get_revision(self, calendar_id):
+        return self._calendar_shard(calendar_id).get_revision(calendar_id)
+
+    def list_changes(self, calendar_id, since):
+        return self._calendar_shard(calendar_id).list_changes(calendar_id, since)
+
+    def load_conversation(self, conversation_id):
+        return self._shard(conversation_id).load_conversation(conversation_id)
+
+    def save_conversation(self, conversation_id, state, expires_at):
+        self._shard(conversation_id).save_conversation(conversation_id, state, expires_at)
+
+    def delete_conversation(self, conversation_id):
+        self._shard(conversation_id).delete_conversation(conversation_id)
+
+
+def create_reservation_store(backend=None, path=None):
+    """Create the storage backend selected by RESERVATION_STORE (sqlite by default).
+
+    SQLite databases are split into DATABASE_SHARDS files (default 8); 1 keeps a single file.
+    """
+    backend = (backend or os.getenv("RESERVATION_STORE", "sqlite")).lower()
+    if backend == "memory":
+        return MemoryReservationStore()
+    if backend == "sqlite":
+        path = path or os.getenv("DATABASE_PATH", "reservations.db")
+        shards = int(os.getenv("DATABASE_SHARDS", 8))
+        if shards > 1:
+            return ShardedSQLiteReservationStore(path, shards)
+        return SQLiteReservationStore(path)
+    raise ValueError(f"Unknown reservation store: {backend}")
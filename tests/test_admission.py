@@ -0,0 +1,38 @@
+import time
+from admission import AdmissionController, LatencyEstimate, degradation_reason, overloaded, parse_deadline, queue_wait
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+def test_admission_degrades_then_sheds_as_load_grows():
+    controller = AdmissionController(max_inflight=2, degrade_inflight=1, reject_wait=2.0, degrade_wait=0.2)
+    assert controller.try_enter() == (True, None)
+    assert controller.try_enter() == (True, "overload")
+    assert controller.try_enter() == (False, "inflight")
+    controller.leave()
+    controller.leave()
+    assert controller.try_enter(wait=0.5) == (True, "overload")
+    assert controller.try_enter(wait=5.0) == (False, "queue_wait")
+    assert controller.stats()["inflight"] == 1
+
+def test_queue_wait_reads_common_header_units():
+    now = 1_700_000_010.0
+    assert queue_wait("t=1700000000.0", now) == 10.0
+    assert queue_wait("t=1700000000000", now) == 10.0
+    assert queue_wait("1700000000000000", now) == 10.0
+    assert queue_wait("garbage", now) == 0.0 and queue_wait(None, now) == 0.0
+
+def test_deadline_degrades_when_the_estimate_does_not_fit():
+    estimate = LatencyEstimate()
+    assert degradation_reason(estimate) is None
+    estimate.observe(0.5)
+    token = parse_deadline.set(time.perf_counter() + 0.1)
+    try:
+        assert degradation_reason(estimate) == "deadline"
+        estimate.decay()
+        assert estimate.value < 0.5
+        overloaded_token = overloaded.set(True)
+        assert degradation_reason(estimate) == "overload"
+        overloaded.reset(overloaded_token)
+    finally:
+        parse_deadline.reset(token)
@@ -0,0 +1,52 @@
+import datetime
+import itertools
+import random
+from analytics import Intervals, calendar_report, conflict_pairs, daily_utilization
+from reservation import format_minutes, to_minutes
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+def span(id, start, end, resource=""):
+    return (id, start, end, resource)
+
+def test_conflict_pairs_match_a_pairwise_check():
+    random.seed(7)
+    base = to_minutes("2030-01-01T08:00:00")
+    spans = []
+    for number in range(200):
+        start = base + random.randrange(3 * 24 * 60)
+        spans.append(span(number, format_minutes(start), format_minutes(start + random.randrange(1, 300)),
+                          random.choice(["", "Dr. Smith"])))
+    expected = {
+        frozenset((first[0], second[0])) for first, second in itertools.combinations(spans, 2)
+        if first[3] == second[3] and first[1] < second[2] and second[1] < first[2]
+    }
+    intervals = Intervals.from_spans(spans)
+    total, pairs = conflict_pairs(intervals, limit=len(expected))
+    assert total == len(expected)
+    assert {frozenset((intervals.ids[first], intervals.ids[second])) for first, second in pairs} == expected
+    assert conflict_pairs(intervals, limit=5)[1] == pairs[:5]
+
+def test_utilization_counts_overlaps_once_and_clips_to_working_hours():
+    intervals = Intervals.from_spans([
+        span(1, "2030-01-01T08:00:00", "2030-01-01T10:00:00"),
+        span(2, "2030-01-01T09:30:00", "2030-01-01T10:30:00"),
+        span(3, "2030-01-01T16:00:00", "2030-01-02T10:00:00"),
+    ])
+    days = daily_utilization(intervals, datetime.date(2030, 1, 1), datetime.date(2030, 1, 3))
+    assert days == [{"date": "2030-01-01", "booked_minutes": 150, "utilization": 0.3125},
+                    {"date": "2030-01-02", "booked_minutes": 60, "utilization": 0.125}]
+
+def test_calendar_report_covers_the_data_range_and_filters_resources():
+    spans = [span(1, "2030-01-01T10:00:00", "2030-01-01T11:00:00", "Room 1"),
+             span(2, "2030-01-01T10:30:00", "2030-01-01T11:30:00", "Room 1"),
+             span(3, "2030-01-03T14:00:00", "2030-01-03T15:00:00")]
+    report = calendar_report(spans)
+    assert [day["date"] for day in report["days"]] == ["2030-01-01", "2030-01-02", "2030-01-03"]
+    assert report["peak_hours"][0] == 10
+    assert report["conflicts"]["total"] == 1
+    assert report["conflicts"]["pairs"][0] == {"first": 1, "second": 2, "resource": "Room 1",
+                                               "start": "2030-01-01T10:30:00", "end": "2030-01-01T11:00:00"}
+    assert calendar_report(spans, resource="")["reservations"] == 1
+    assert calendar_report(spans, max_days=1) is None
@@ -1,11 +1,21 @@
 import pytest
+import app as app_module
 from app import app
+from storage import MemoryReservationStore, SQLiteReservationStore
+from conversations import create_conversation_store
+from admission import AdmissionController, LatencyEstimate
+import datetime
+import io
+import threading
 import warnings
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 @pytest.fixture
-def client():
+def client(monkeypatch):
+    store = MemoryReservationStore()
+    monkeypatch.setattr(app_module, "reservation_store", store)
+    monkeypatch.setattr(app_module, "conversations", create_conversation_store(store, "memory"))
     app.testing = True
     app.secret_key = "test_secret_key"
     with app.test_client() as client:
@@ -34,3 +44,231 @@ def test_process_reservation_incomplete(client):
     assert "messages" in data
     assert isinstance(data["messages"], list)
     assert data["success"] == True
+
+def test_process_reservations_batch_keeps_order_and_failures(client):
+    """Batch parsing returns one result per message and survives bad items"""
+    payload = {"messages": ["Book me an appointment", 42, "Appointment tomorrow"], "batch_size": 2}
+    response = client.post('/process_reservations_batch', json=payload)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["success"] == True
+    assert [result["success"] for result in data["results"]] == [True, False, True]
+    assert set(data["results"][0]["reservation"].keys()) == {"title", "start", "end", "allDay", "description"}
+
+def test_availability_and_conflict_suggestions(client):
+    """A conflicting booking is answered with the nearest free slots"""
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    client.post('/process_reservation', json={"message": "Book John tomorrow at 3pm", "current_reservation": {}})
+    data = client.post('/process_reservation', json={"message": "Book Sarah tomorrow at 3pm", "current_reservation": {}}).get_json()
+    assert data["missing_field"] == "end"
+    assert f"{tomorrow.isoformat()}T15:00:00" not in [slot["start"] for slot in data["suggested_slots"]]
+
+    data = client.get(f'/availability?date={tomorrow.isoformat()}').get_json()
+    assert data["success"] == True
+    assert f"{tomorrow.isoformat()}T15:00:00" not in [slot["start"] for slot in data["slots"]]
+    assert len(data["slots"]) == 7
+
+def test_get_reservations_range_etag_and_since(client):
+    """Reservations can be filtered by range, revalidated with ETags and synced incrementally"""
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    client.post('/process_reservation', json={"message": "Book John tomorrow at 3pm", "current_reservation": {}})
+
+    response = client.get(f'/get_reservations?start={tomorrow.isoformat()}&end={(tomorrow + datetime.timedelta(days=1)).isoformat()}')
+    assert [event["title"] for event in response.get_json()] == ["John Appointment"]
+    assert client.get(f'/get_reservations?start=2000-01-01&end=2000-01-02').get_json() == []
+
+    etag = response.headers["ETag"]
+    revision = int(response.headers["X-Calendar-Revision"])
+    cached = client.get(f'/get_reservations?start={tomorrow.isoformat()}&end={(tomorrow + datetime.timedelta(days=1)).isoformat()}',
+                        headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    client.post('/process_reservation', json={"message": "Book Sarah tomorrow at 10am", "current_reservation": {}})
+    changes = client.get(f'/get_reservations?since={revision}').get_json()
+    assert [event["title"] for event in changes["added"]] == ["Sarah Appointment"]
+    assert changes["removed"] == []
+    assert changes["revision"] == revision + 1
+
+def test_get_reservations_rejects_malformed_parameters(client):
+    """A bad since, start or end is a 400 rather than an empty calendar"""
+    client.post('/process_reservation', json={"message": "Book John tomorrow at 3pm", "current_reservation": {}})
+
+    for query in ("since=abc", "since=-1", "since=%C2%B2", "start=abc&end=2030-01-02"):
+        response = client.get(f'/get_reservations?{query}')
+        assert response.status_code == 400
+        assert response.get_json()["success"] == False
+    assert client.get('/get_reservations?since=0').status_code == 200
+
+def test_resources_are_booked_and_listed_separately(client):
+    """Bookings only conflict with the same resource, and /get_reservations can filter by it"""
+    client.post('/process_reservation', json={"message": "Book John with Dr. Smith tomorrow at 3pm", "current_reservation": {}})
+    data = client.post('/process_reservation', json={"message": "Book Sarah with Dr. Jones tomorrow at 3pm", "current_reservation": {}}).get_json()
+    assert data["reservation_complete"] == True
+    data = client.post('/process_reservation', json={"message": "Book Anna with Dr. Smith tomorrow at 3pm", "current_reservation": {}}).get_json()
+    assert data["missing_field"] == "end"
+    assert data["messages"][0].startswith("Dr. Smith is already booked")
+
+    assert len(client.get('/get_reservations').get_json()) == 2
+    events = client.get('/get_reservations?resource=Dr. Jones').get_json()
+    assert [(event["title"], event["resource"]) for event in events] == [("Sarah Appointment", "Dr. Jones")]
+
+def test_recurring_booking_is_expanded_per_window(client):
+    """A recurring booking appears once per occurrence in a range and blocks later one-off bookings"""
+    data = client.post('/process_reservation', json={"message": "every Tuesday at 10am for John", "current_reservation": {}}).get_json()
+    assert data["reservation_complete"] == True
+    first = datetime.date.fromisoformat(data["reservation"]["start"][:10])
+
+    events = client.get(f'/get_reservations?start={first.isoformat()}&end={(first + datetime.timedelta(days=21)).isoformat()}').get_json()
+    assert [event["start"][:10] for event in events] == [(first + datetime.timedelta(weeks=week)).isoformat() for week in range(3)]
+    later = first + datetime.timedelta(weeks=30)
+    data = client.post('/process_reservation', json={"message": f"Book Sarah on {later.strftime('%d.%m.%Y')} at 10am", "current_reservation": {}}).get_json()
+    assert data["missing_field"] == "end"
+
+def test_conversation_state_is_kept_on_the_server(client):
+    """Follow-ups only send the conversation id, and a short answer runs just the missing field's extractor"""
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    data = client.post('/process_reservation', json={"message": "Book John tomorrow at 8pm"}).get_json()
+    assert data["missing_field"] == "end"
+    conversation_id = data["conversation_id"]
+
+    data = client.post('/process_reservation', json={"message": "3pm", "conversation_id": conversation_id}).get_json()
+    assert data["parse_tier"] == "answer"
+    assert data["reservation_complete"] == True
+    assert data["reservation"]["start"] == f"{tomorrow.isoformat()}T15:00:00"
+    assert data["conversation_id"] is None
+
+    # Client-side state is ignored, and a finished conversation doesn't come back
+    data = client.post('/process_reservation', json={
+        "message": "4pm", "conversation_id": conversation_id,
+        "current_reservation": {"title": "Mallory Appointment", "start": tomorrow.strftime("%d.%m.%Y")}
+    }).get_json()
+    assert data["missing_field"] == "title"
+    assert data["conversation_id"] != conversation_id
+
+def test_follow_up_turns_can_land_on_another_worker(client, monkeypatch, tmp_path):
+    """Two workers on one database share dialogs with the default conversation store"""
+    monkeypatch.delenv("CONVERSATION_STORE", raising=False)
+    workers = []
+    for _ in range(2):
+        store = SQLiteReservationStore(str(tmp_path / "reservations.db"))
+        workers.append((store, create_conversation_store(store)))
+
+    def post_to_worker(number, payload):
+        monkeypatch.setattr(app_module, "reservation_store", workers[number][0])
+        monkeypatch.setattr(app_module, "conversations", workers[number][1])
+        return client.post('/process_reservation', json=payload).get_json()
+
+    data = post_to_worker(0, {"message": "Book John tomorrow at 8pm"})
+    assert data["missing_field"] == "end"
+    data = post_to_worker(1, {"message": "3pm", "conversation_id": data["conversation_id"]})
+    assert data["parse_tier"] == "answer" and data["reservation_complete"] == True
+    assert create_conversation_store(MemoryReservationStore()).stats()["maxsize"] == 10000
+
+def test_import_reports_every_row_and_export_streams_the_calendar(client):
+    """Uploaded files are validated per row and checked for conflicts; exports can be imported again"""
+    upload = ("title,start,end\n"
+              "John,2030-10-10T10:00:00,2030-10-10T11:00:00\n"
+              "Sarah,2030-10-10T10:30:00,2030-10-10T11:30:00\n"
+              "Night owl,2030-10-10T21:00:00,2030-10-10T22:00:00\n"
+              "Anna,someday,\n")
+    data = client.post('/import', data={"file": (io.BytesIO(upload.encode()), "old.csv")},
+                       content_type="multipart/form-data").get_json()
+    assert data["success"] == True
+    assert [row["status"] for row in data["rows"]] == ["imported", "conflict", "outside_hours", "invalid"]
+    assert data["counts"]["imported"] == 1
+
+    response = client.get('/export?format=ics')
+    assert response.mimetype == "text/calendar" and response.is_streamed
+    exported = response.get_data()
+    assert b"SUMMARY:John" in exported
+    data = client.post('/import?format=ics', data=exported, content_type="text/calendar").get_json()
+    assert [row["status"] for row in data["rows"]] == ["conflict"]
+
+    lines = client.get('/export?format=csv').get_data(as_text=True).splitlines()
+    assert lines[0].startswith("id,title,start,end") and len(lines) == 2
+
+def test_import_rejects_recurrence_rules_per_row(client):
+    """Rules that can't be expanded are reported as invalid rows and never reach the store"""
+    upload = ("title,start,end,rrule\n"
+              "John,2030-10-07T10:00:00,2030-10-07T11:00:00,FREQ=DAILY;INTERVAL=0\n"
+              "Sarah,2030-10-07T12:00:00,2030-10-07T13:00:00,FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=30\n"
+              "Anna,2030-10-07T14:00:00,2030-10-07T15:00:00,FREQ=WEEKLY\n")
+    data = client.post('/import', data={"file": (io.BytesIO(upload.encode()), "rules.csv")},
+                       content_type="multipart/form-data").get_json()
+    assert [row["status"] for row in data["rows"]] == ["invalid", "invalid", "imported"]
+    events = client.get('/get_reservations?start=2030-10-07&end=2030-10-09').get_json()
+    assert [event["title"] for event in events] == ["Anna"]
+
+def test_stats_report_utilization_and_conflicts(client):
+    """Stats cover per-day utilization, peak hours and overlapping pairs of the stored calendar"""
+    upload = ("title,start,end\n"
+              "John,2030-10-10T10:00:00,2030-10-10T11:00:00\n"
+              "Sarah,2030-10-10T10:30:00,2030-10-10T11:30:00\n")
+    client.post('/import?format=csv', data=upload, content_type="text/csv")
+    data = client.get('/stats?start=2030-10-10&end=2030-10-12').get_json()
+    assert data["success"] == True
+    assert [day["booked_minutes"] for day in data["days"]] == [60, 0]
+    assert data["conflicts"]["total"] == 0 and data["peak_hours"] == [10]
+    assert client.get('/stats?start=2030-10-10').get_json()["success"] == False
+
+def test_overload_sheds_requests_and_degrades_parsing(client, monkeypatch):
+    """Saturated workers answer with a retry, and NER is skipped when it can't meet the parse deadline"""
+    monkeypatch.setattr(app_module, "admission", AdmissionController(max_inflight=0))
+    response = client.post('/process_reservation', json={"message": "Book John tomorrow at 3pm"})
+    assert response.status_code == 503 and response.headers["Retry-After"]
+    assert response.get_json()["retry"] == True
+    monkeypatch.undo()
+
+    calls = []
+    monkeypatch.setattr(app_module, "reservation_store", MemoryReservationStore())
+    monkeypatch.setattr(app_module, "get_nlp", lambda: lambda text: calls.append(text))
+    monkeypatch.setattr(app_module, "ner_latency", LatencyEstimate())
+    app_module.ner_latency.observe(10.0)
+    data = client.post('/process_reservation', json={"message": "Appointment for Maria Lopez on Friday afternoon"}).get_json()
+    assert data["parse_tier"] == "regex" and calls == []
+    assert 'scheduler_parse_degraded_total{reason="deadline"}' in client.get('/metrics').get_data(as_text=True)
+
+def test_concurrent_requests_are_degraded_then_shed(client, monkeypatch):
+    """Requests running at once in one worker (gthread) hit the in-flight limits"""
+    monkeypatch.setattr(app_module, "admission", AdmissionController(max_inflight=2, degrade_inflight=1))
+    entered, release = threading.Semaphore(0), threading.Event()
+    degraded, statuses = [], []
+    parse_turn = app_module.parse_turn
+
+    def slow_parse_turn(message, conversation):
+        degraded.append(app_module.overloaded.get())
+        entered.release()
+        release.wait(5)
+        return parse_turn(message, conversation)
+
+    monkeypatch.setattr(app_module, "parse_turn", slow_parse_turn)
+
+    def post():
+        with app.test_client() as own_client:
+            statuses.append(own_client.post('/process_reservation', json={"message": "Book John tomorrow at 3pm"}).status_code)
+
+    running = [threading.Thread(target=post) for _ in range(2)]
+    for thread in running:
+        thread.start()
+        assert entered.acquire(timeout=5)
+    extra = [threading.Thread(target=post) for _ in range(2)]
+    for thread in extra:
+        thread.start()
+        thread.join(5)
+    assert statuses == [503, 503]
+    release.set()
+    for thread in running:
+        thread.join(5)
+    assert sorted(statuses) == [200, 200, 503, 503] and degraded == [False, True]
+    assert app_module.admission.stats()["inflight"] == 0
+
+def test_metrics_and_debug_timings(client):
+    """Stage timings are exported on /metrics and optionally returned per request"""
+    response = client.post('/process_reservation?debug_timings=1',
+                           json={"message": "Book John tomorrow at 3pm", "current_reservation": {}})
+    timings = response.get_json()["timings_ms"]
+    assert "booking" in timings and "total" in timings
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'scheduler_stage_seconds_count{stage="booking"}' in body
+    assert 'scheduler_booking_outcome_total{outcome="booked"}' in body
@@ -0,0 +1,31 @@
+import datetime
+from availability import day_occupancy, free_slots, nearest_free_slots, OccupancyCache
+from storage import MemoryReservationStore
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+DAY = datetime.date(2025, 10, 10)
+
+def make_event(start, end):
+    return {"title": "John Appointment", "start": start, "end": end}
+
+def test_free_slots_skip_booked_time():
+    events = [make_event("2025-10-10T10:30:00", "2025-10-10T11:30:00")]
+    occupancy = day_occupancy(events, DAY, DAY + datetime.timedelta(days=1))
+    starts = [slot["start"][11:16] for slot in free_slots(occupancy, slot_minutes=60)]
+    assert starts == ["09:00", "12:00", "13:00", "14:00", "15:00", "16:00"]
+
+def test_nearest_free_slots_are_close_to_requested_time():
+    events = [make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00")]
+    occupancy = day_occupancy(events, DAY, DAY + datetime.timedelta(days=2))
+    slots = nearest_free_slots(occupancy, "2025-10-10T10:00:00", count=2)
+    assert [slot["start"] for slot in slots] == ["2025-10-10T09:00:00", "2025-10-10T11:00:00"]
+
+def test_occupancy_cache_refreshes_after_booking():
+    store = MemoryReservationStore()
+    cache = OccupancyCache()
+    next_day = DAY + datetime.timedelta(days=1)
+    assert cache.occupancy(store, "cal-1", DAY, next_day)[DAY] == 0
+    store.add_reservation("cal-1", make_event("2025-10-10T09:00:00", "2025-10-10T10:00:00"))
+    assert cache.occupancy(store, "cal-1", DAY, next_day)[DAY] == (1 << 60) - 1
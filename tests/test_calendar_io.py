@@ -0,0 +1,63 @@
+import io
+from calendar_io import fold_line, read_csv, read_ics, write_csv, write_ics
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+ICS = """BEGIN:VCALENDAR\r
+VERSION:2.0\r
+BEGIN:VEVENT\r
+UID:1@example.com\r
+DTSTART:20301010T100000\r
+DTEND:20301010T110000\r
+SUMMARY:John Appointment\r
+DESCRIPTION:Bring the forms\\, please\r
+BEGIN:VALARM\r
+DESCRIPTION:Reminder\r
+END:VALARM\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+DTSTART;VALUE=DATE:20301011\r
+SUMMARY:Team day with a very long summary that has to be folded over more than one line\r
+  of the file\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+SUMMARY:No start\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+def test_read_ics_yields_one_result_per_event():
+    rows = list(read_ics(io.StringIO(ICS, newline="")))
+    assert [(row, error) for row, event, error in rows] == [(1, None), (2, None), (3, "missing DTSTART")]
+    assert rows[0][1] == {"title": "John Appointment", "start": "2030-10-10T10:00:00", "end": "2030-10-10T11:00:00",
+                          "allDay": False, "description": "Bring the forms, please"}
+    assert rows[1][1]["allDay"] and rows[1][1]["end"] == "2030-10-12T00:00:00"
+    assert rows[1][1]["title"].endswith("more than one line of the file")
+
+def test_export_round_trips_through_both_formats():
+    events = [{"id": 1, "title": "Ana, Appointment", "start": "2030-10-10T10:00:00", "end": "2030-10-10T11:00:00",
+               "allDay": False, "description": "Line one\nline two", "resource": "Dr. Smith"}]
+    series = [{"id": 2, "title": "Standup", "start": "2030-10-07T09:00:00", "end": "2030-10-07T09:30:00",
+               "allDay": False, "description": None, "rrule": "FREQ=WEEKLY;COUNT=3"}]
+    ics = "".join(write_ics(iter(events), series))
+    assert all(len(line.encode()) <= 75 for line in ics.split("\r\n"))
+    parsed = [event for row, event, error in read_ics(io.StringIO(ics, newline=""))]
+    assert parsed == [{key: value for key, value in item.items() if key != "id"} for item in series + events]
+
+    exported = "".join(write_csv(iter(events), series))
+    parsed = [event for row, event, error in read_csv(io.StringIO(exported, newline=""))]
+    assert parsed[1] == {key: value for key, value in events[0].items() if key != "id"}
+    assert parsed[0]["rrule"] == "FREQ=WEEKLY;COUNT=3"
+    # Series and reservations are numbered separately, so series ids are prefixed as in the ICS UID
+    assert [line.split(",")[0] for line in exported.splitlines()[1:3]] == ["series-2", "1"]
+
+def test_read_csv_reports_bad_rows_and_folding_keeps_multibyte_characters():
+    rows = list(read_csv(io.StringIO("title,start\nJohn,2030-10-10T10:00:00\nSarah,\nAnna,not a date\n")))
+    assert [(row, error is None) for row, event, error in rows] == [(1, True), (2, False), (3, False)]
+    assert rows[0][1]["end"] == "2030-10-10T11:00:00"
+    rows = list(read_csv(io.StringIO(f'title,start\nJohn,"{"x" * 200000}"\nSarah,2030-10-10T10:00:00\n', newline="")))
+    assert [(row, error is None) for row, event, error in rows] == [(1, False), (2, True)]
+    assert "field larger than field limit" in rows[0][2]
+    line = "SUMMARY:" + "é" * 80
+    assert fold_line(line).replace("\r\n ", "") == line + "\r\n"
@@ -0,0 +1,42 @@
+import datetime
+from conversations import Conversation, DatabaseConversationStore, MemoryConversationStore
+from storage import SQLiteReservationStore
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+def test_memory_store_evicts_least_recently_used_and_checks_owner():
+    store = MemoryConversationStore(maxsize=2)
+    first, second, third = (Conversation.start("cal-1") for _ in range(3))
+    store.save(first)
+    store.save(second)
+    assert store.get(first.id, "cal-1") is first
+    store.save(third)
+    assert store.get(second.id, "cal-1") is None
+    assert store.get(first.id, "cal-2") is None
+    assert store.resume(first.id, "cal-1") is first
+    assert store.resume("unknown", "cal-1").id != "unknown"
+    assert store.stats()["evictions"] == 1
+
+def test_memory_store_expires_conversations_after_ttl():
+    store = MemoryConversationStore(ttl=-1)
+    conversation = Conversation.start("cal-1")
+    store.save(conversation)
+    assert store.get(conversation.id, "cal-1") is None
+    assert len(store) == 0
+
+def test_database_store_round_trips_resolved_fields(tmp_path):
+    store = DatabaseConversationStore(SQLiteReservationStore(str(tmp_path / "reservations.db")))
+    conversation = Conversation("abc", "cal-1", {"title": "John Appointment", "start": "10.10.2030", "end": None},
+                                datetime.date(2030, 10, 10), None, "end")
+    store.save(conversation)
+    loaded = store.get("abc", "cal-1")
+    assert (loaded.reservation, loaded.date, loaded.time, loaded.missing_field) == (
+        conversation.reservation, datetime.date(2030, 10, 10), None, "end")
+    assert store.get("abc", "cal-2") is None
+    store.discard("abc")
+    assert store.get("abc", "cal-1") is None
+
+    expired = DatabaseConversationStore(store.reservation_store, ttl=-1)
+    expired.save(Conversation("old", "cal-1", time=(15, 0)))
+    assert expired.get("old", "cal-1") is None
@@ -0,0 +1,34 @@
+import datetime
+import lexicon
+from lexicon import day_of, relative_days, scan, time_of
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+MONDAY = datetime.date(2030, 10, 14)
+
+def test_relative_days_table_is_rebuilt_only_when_the_day_changes():
+    table = relative_days(MONDAY)
+    assert relative_days(MONDAY) is table
+    assert table.dates["monday"] == MONDAY
+    assert table.dates["next monday"] == MONDAY + datetime.timedelta(days=7)
+    assert table.formatted["tomorrow"] == "15.10.2030"
+    assert table.formatted["sunday"] == "20.10.2030"
+    tuesday = relative_days(MONDAY + datetime.timedelta(days=1))
+    assert tuesday is not table and tuesday.dates["yesterday"] == MONDAY
+    assert lexicon._relative_days is tuesday
+
+def test_scan_resolves_days_with_the_fast_path_precedence():
+    assert day_of(scan("Friday, or tomorrow, or today"), MONDAY) == MONDAY
+    assert day_of(scan("NEXT Monday please"), MONDAY) == MONDAY + datetime.timedelta(days=7)
+    assert day_of(scan("next week on Friday"), MONDAY) is None
+    assert day_of(scan("on 24.12.2030"), MONDAY) == datetime.date(2030, 12, 24)
+    assert day_of(scan("on 31.02.2030"), MONDAY) is None
+    assert day_of(scan("Mondays are busy"), MONDAY) is None
+
+def test_scan_resolves_times_with_the_fast_path_precedence():
+    assert time_of(scan("at 15:30 or 3 PM")) == (15, 0)
+    assert time_of(scan("at 3:15 In The Afternoon")) == (15, 15)
+    assert time_of(scan("at 09:45")) == (9, 45)
+    assert time_of(scan("at 13 pm")) is None
+    assert time_of(scan("around noon")) is None
@@ -0,0 +1,35 @@
+import datetime
+from parse_cache import ParseCache
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+def test_cache_returns_copies():
+    cache = ParseCache(maxsize=4)
+    key = cache.make_key("Book John  tomorrow at 3pm", {"title": None})
+    cache.put(key, {"title": "John Appointment"}, "fast")
+    reservation, tier = cache.get(key)
+    reservation["title"] = "Changed"
+    assert cache.get(key) == ({"title": "John Appointment"}, "fast")
+    assert cache.get(cache.make_key("Book John tomorrow at 3pm", {"title": None}))[1] == "fast"
+
+def test_cache_key_changes_with_reference_date_and_state():
+    today = datetime.date(2025, 10, 10)
+    key = ParseCache.make_key("tomorrow", {"title": None}, today)
+    assert key != ParseCache.make_key("tomorrow", {"title": None}, today + datetime.timedelta(days=1))
+    assert key != ParseCache.make_key("tomorrow", {"title": "John Appointment"}, today)
+
+def test_cache_counts_hits_misses_and_evictions():
+    cache = ParseCache(maxsize=2)
+    for text in ["a", "b", "c"]:
+        cache.put(cache.make_key(text, {}), {"title": text}, "fast")
+    assert cache.get(cache.make_key("a", {})) is None
+    assert cache.get(cache.make_key("c", {})) is not None
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 1, "size": 2, "maxsize": 2}
+
+def test_cache_expires_entries_after_ttl():
+    cache = ParseCache(maxsize=2, ttl=-1)
+    key = cache.make_key("a", {})
+    cache.put(key, {"title": "a"}, "fast")
+    assert cache.get(key) is None
+    assert cache.stats()["evictions"] == 1
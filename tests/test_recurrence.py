@@ -0,0 +1,51 @@
+import itertools
+import pytest
+from recurrence import RecurringReservation, first_overlap
+from reservation import to_minutes
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+def weekly(start, rule="FREQ=WEEKLY", title="John Appointment"):
+    return RecurringReservation(title, to_minutes(start), 60, rule)
+
+def test_series_expands_only_inside_the_window():
+    series = weekly("2025-10-07T10:00:00")
+    assert series.until is None
+    starts = [occurrence.to_event()["start"] for occurrence in series.occurrences("2030-01-01T00:00:00", "2030-01-15T00:00:00")]
+    assert starts == ["2030-01-01T10:00:00", "2030-01-08T10:00:00"]
+    assert series.conflicts_with(to_minutes("2030-01-08T10:30:00"), to_minutes("2030-01-08T11:30:00"))
+    assert not series.conflicts_with(to_minutes("2030-01-09T10:30:00"), to_minutes("2030-01-09T11:30:00"))
+
+def test_finite_series_and_descriptions():
+    series = weekly("2025-10-07T10:00:00", "FREQ=WEEKLY;INTERVAL=2;COUNT=3")
+    assert series.until == to_minutes("2025-11-04T11:00:00")
+    assert series.describe() == "every 2 weeks, 3 times"
+    assert weekly("2025-10-06T09:00:00", "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR").describe() == "every weekday"
+
+def test_series_against_series_and_open_ended_streams():
+    tuesdays = weekly("2025-10-07T10:00:00")
+    assert not tuesdays.overlaps_series(weekly("2025-10-08T10:00:00"))
+    assert tuesdays.overlaps_series(weekly("2025-10-06T10:30:00", "FREQ=DAILY"))
+    # An infinite stream stops being read once the finite one can no longer overlap it
+    assert not first_overlap([(0, 10)], ((step * 100 + 50, step * 100 + 60) for step in itertools.count()))
+    assert first_overlap([(0, 10), (20, 30)], [(25, 26)])
+
+def test_old_series_are_expanded_from_near_the_window():
+    for rule in ("FREQ=DAILY", "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH", "FREQ=MONTHLY", "FREQ=DAILY;COUNT=900"):
+        series = RecurringReservation("John Appointment", to_minutes("2020-01-31T10:00:00"), 90, rule)
+        window_start, window_end = to_minutes("2022-03-01T00:00:00"), to_minutes("2022-04-15T00:00:00")
+        starts = itertools.takewhile(lambda start: start < window_end, map(to_minutes, series._rrule))
+        expected = [(start, start + 90) for start in starts if start + 90 > window_start]
+        assert list(series.iter_intervals(window_start, window_end)) == expected
+        # The restarted rule begins within a couple of periods of the window, not in 2020
+        assert series._rule_near(window_start)._dtstart.year == 2022
+
+def test_rules_without_a_usable_interval_or_occurrence_are_rejected():
+    for rule in ("FREQ=DAILY;INTERVAL=0", "FREQ=WEEKLY;INTERVAL=-2", "FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=30",
+                 "FREQ=DAILY;BYMONTH=4;BYMONTHDAY=31", "FREQ=MONTHLY;INTERVAL=12;BYMONTH=2", "FREQ=DAILY;UNTIL=20200101"):
+        with pytest.raises(ValueError):
+            weekly("2025-01-31T10:00:00", rule)
+    # Rare but real dates are kept: the next February 29 is three years away
+    leap_day = weekly("2025-01-31T10:00:00", "FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=29")
+    assert next(leap_day.iter_intervals())[0] == to_minutes("2028-02-29T10:00:00")
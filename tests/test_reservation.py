@@ -0,0 +1,23 @@
+import datetime
+from reservation import Reservation, format_minutes, to_minutes
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+def test_reservation_round_trips_the_event_shape():
+    event = {"title": "John Appointment", "start": "2025-10-10T15:00:00", "end": "2025-10-10T16:00:00",
+             "allDay": False, "description": "Reservation made via chatbot"}
+    reservation = Reservation.from_event(event)
+    assert reservation.duration == 60
+    assert reservation.start_datetime == datetime.datetime(2025, 10, 10, 15, 0)
+    assert reservation.to_event() == event
+    reservation.id = 7
+    assert reservation.to_event()["id"] == 7
+
+def test_minutes_conversion_and_overlap():
+    start = to_minutes("2025-10-10T09:30:00")
+    assert to_minutes(datetime.datetime(2025, 10, 10, 9, 30)) == start
+    assert format_minutes(start + 90) == "2025-10-10T11:00:00"
+    reservation = Reservation("A", start, start + 60)
+    assert reservation.overlaps(start + 59, start + 120)
+    assert not reservation.overlaps(start + 60, start + 120)
@@ -0,0 +1,31 @@
+from reservation_index import ReservationIndex
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+def make_event(start, end, title="Test Appointment"):
+    return {"title": title, "start": start, "end": end}
+
+def test_index_detects_overlap():
+    index = ReservationIndex([make_event("2025-10-10T10:30:00", "2025-10-10T11:30:00")])
+    assert index.overlaps("2025-10-10T10:00:00", "2025-10-10T11:00:00")
+    assert not index.overlaps("2025-10-10T11:30:00", "2025-10-10T12:30:00")
+
+def test_index_lists_conflicts_in_range():
+    events = [
+        make_event("2025-10-10T09:00:00", "2025-10-10T10:00:00", "A"),
+        make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00", "B"),
+        make_event("2025-10-10T08:00:00", "2025-10-10T16:00:00", "Long"),
+        make_event("2025-10-11T10:00:00", "2025-10-11T11:00:00", "C"),
+    ]
+    index = ReservationIndex(events)
+    titles = [reservation.title for reservation in index.conflicts("2025-10-10T10:30:00", "2025-10-10T12:00:00")]
+    assert titles == ["Long", "B"]
+
+def test_index_stays_correct_after_remove():
+    event = make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00")
+    index = ReservationIndex([event])
+    assert index.remove(event)
+    assert len(index) == 0
+    assert not index.overlaps("2025-10-10T10:00:00", "2025-10-10T11:00:00")
+    assert not index.remove(event)
@@ -1,5 +1,8 @@
 import datetime
-from app import is_time_expression, check_overlap, get_default_reservation
+from types import SimpleNamespace
+import app as app_module
+from app import is_time_expression, check_overlap, get_default_reservation, parse_reservation, parse_reservation_texts
+from parse_cache import ParseCache
 import warnings
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -37,3 +40,98 @@ def test_get_default_reservation_structure():
     reservation = get_default_reservation()
     assert isinstance(reservation, dict)
     assert set(reservation.keys()) == {"title", "start", "end", "allDay", "description"}
+
+def test_fast_tier_resolves_complete_message():
+    reservation, tier = parse_reservation("Book John tomorrow at 3pm")
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    assert tier == "fast"
+    assert reservation["title"] == "John Appointment"
+    assert reservation["start"] == tomorrow.strftime("%Y-%m-%dT15:00:00")
+    assert reservation["end"] == tomorrow.strftime("%Y-%m-%dT16:00:00")
+
+def test_fast_tier_uses_resolved_fields_from_earlier_turns():
+    current = {"title": "Sarah Appointment", "start": "10.10.2025", "end": None}
+    reservation, tier = parse_reservation("3:30 pm", current)
+    assert tier == "fast"
+    assert reservation["start"] == "2025-10-10T15:30:00"
+
+def test_fast_tier_defers_ambiguous_messages():
+    _, tier = parse_reservation("Book me an appointment")
+    assert tier != "fast"
+
+def test_resource_is_extracted_before_name_and_time():
+    reservation, tier = parse_reservation("Book John with Dr. Smith tomorrow at 3pm")
+    assert tier == "fast"
+    assert reservation["title"] == "John Appointment"
+    assert reservation["resource"] == "Dr. Smith"
+    reservation, _ = parse_reservation("Appointment for Sarah in room 2 tomorrow at 10am")
+    assert reservation["resource"] == "Room 2"
+    assert "resource" not in parse_reservation("Appointment with John tomorrow at 3pm")[0]
+
+def test_recurrence_is_extracted_as_rrule():
+    reservation, tier = parse_reservation("every Tuesday at 10am for John")
+    assert tier == "fast"
+    assert reservation["rrule"] == "FREQ=WEEKLY"
+    assert datetime.datetime.fromisoformat(reservation["start"]).weekday() == 1
+    reservation, _ = parse_reservation("Book Sarah every other week on Monday at 9am for 6 weeks")
+    assert reservation["rrule"] == "FREQ=WEEKLY;INTERVAL=2;COUNT=6"
+
+def test_fast_tier_defers_names_that_run_into_other_capitalized_words():
+    for message, wrong_title in [
+        ("Book John On Monday At 10am", "John On Monday At Appointment"),
+        ("Please Book Tomorrow At 3pm", "At Appointment"),
+        ("Book John. Tomorrow at 3pm", "John. Appointment"),
+        ("Book a table for Two", "Two Appointment"),
+    ]:
+        reservation, tier = parse_reservation(message)
+        assert tier != "fast", message
+        assert reservation["title"] != wrong_title, message
+
+def test_recurrence_adjectives_do_not_create_a_series():
+    for message in ("Book the weekly review for John tomorrow at 10am",
+                    "Book the daily standup for Sarah tomorrow at 9am",
+                    "Monthly report meeting for Anna on Friday at 2pm"):
+        reservation, _ = parse_reservation(message)
+        assert "rrule" not in reservation, message
+    assert parse_reservation("Book John weekly on Monday at 10am")[0]["rrule"] == "FREQ=WEEKLY"
+    assert parse_reservation("Book Sarah tomorrow at 9am daily")[0]["rrule"] == "FREQ=DAILY"
+
+class StubEntity:
+    def __init__(self, text, label_):
+        self.text, self.label_ = text, label_
+
+class StubPipeline:
+    """Stands in for a spaCy model: tags every known phrase found in a message"""
+    entities = {"dana lee": "PERSON", "friday": "DATE", "3pm": "TIME"}
+
+    def __init__(self):
+        self.calls, self.piped = [], []
+
+    def doc(self, text):
+        return SimpleNamespace(ents=[StubEntity(phrase, label) for phrase, label in self.entities.items() if phrase in text])
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return self.doc(text)
+
+    def pipe(self, texts, batch_size=None, n_process=None):
+        for text in texts:
+            self.piped.append(text)
+            yield self.doc(text)
+
+def test_ner_entities_are_applied_for_single_and_batch_parsing(monkeypatch):
+    stub = StubPipeline()
+    monkeypatch.setattr(app_module, "get_nlp", lambda: stub)
+    monkeypatch.setattr(app_module, "parse_cache", ParseCache(maxsize=0))
+    friday = app_module.relative_days().dates["friday"]
+
+    reservation, tier = parse_reservation("see dana lee on friday at 3pm")
+    assert tier == "ner" and stub.calls == ["see dana lee on friday at 3pm"]
+    assert reservation["title"] == "dana lee Appointment"
+    assert reservation["start"] == friday.strftime("%Y-%m-%dT15:00:00")
+
+    messages = ["Book John tomorrow at 3pm", "put dana lee down for friday at 3pm", 42]
+    results = list(parse_reservation_texts(messages, batch_size=2, with_tier=True))
+    assert stub.piped == ["put dana lee down for friday at 3pm"]
+    assert [tier for _, tier in results] == ["fast", "ner", "fast"]
+    assert results[1][0]["title"] == "dana lee Appointment" and results[2][0] is None
@@ -0,0 +1,243 @@
+import sqlite3
+import multiprocessing
+import threading
+from storage import SQLiteReservationStore, MemoryReservationStore, ShardedSQLiteReservationStore
+import pytest
+import warnings
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+@pytest.fixture(params=["sqlite", "sharded", "memory"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteReservationStore(str(tmp_path / "reservations.db"))
+    if request.param == "sharded":
+        return ShardedSQLiteReservationStore(str(tmp_path / "reservations.db"), shards=4)
+    return MemoryReservationStore()
+
+def make_event(start, end, title="John Appointment"):
+    return {"title": title, "start": start, "end": end, "allDay": False,
+            "description": "Reservation made via chatbot"}
+
+def test_store_keeps_json_shape(store):
+    event = make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00")
+    stored = store.add_reservation("cal-1", event)
+    assert store.list_reservations("cal-1") == [dict(event, id=stored["id"])]
+    assert store.list_reservations("cal-2") == []
+
+def test_store_detects_conflicts_per_calendar(store):
+    store.add_reservation("cal-1", make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"))
+    assert store.has_conflict("cal-1", "2025-10-10T10:30:00", "2025-10-10T11:30:00")
+    assert not store.has_conflict("cal-1", "2025-10-10T11:00:00", "2025-10-10T12:00:00")
+    assert not store.has_conflict("cal-2", "2025-10-10T10:30:00", "2025-10-10T11:30:00")
+
+def test_store_delete(store):
+    event = make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00")
+    store.add_reservation("cal-1", event)
+    assert store.delete_reservation("cal-1", event)
+    assert store.list_reservations("cal-1") == []
+    assert not store.delete_reservation("cal-1", event)
+
+def test_sqlite_store_uses_wal(tmp_path):
+    store = SQLiteReservationStore(str(tmp_path / "reservations.db"))
+    mode = store._connection().execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+def test_store_lists_changes_since_revision(store):
+    first = store.add_reservation("cal-1", make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"))
+    revision = store.get_revision("cal-1")
+    second = store.add_reservation("cal-1", make_event("2025-10-10T12:00:00", "2025-10-10T13:00:00"))
+    store.delete_reservation("cal-1", first)
+    current, added, removed = store.list_changes("cal-1", revision)
+    assert current == store.get_revision("cal-1") == revision + 2
+    assert [event["id"] for event in added] == [second["id"]]
+    assert removed == [first["id"]]
+    assert store.list_changes("cal-1", current + 1) is None
+
+def test_store_finds_long_reservation_starting_much_earlier(store):
+    store.add_reservation("cal-1", make_event("2025-10-10T09:00:00", "2025-10-10T10:00:00"))
+    store.add_reservation("cal-1", make_event("2025-10-09T09:00:00", "2025-10-11T09:00:00", "Conference"))
+    conflicts = store.find_conflicts("cal-1", "2025-10-10T15:00:00", "2025-10-10T16:00:00")
+    assert [event["title"] for event in conflicts] == ["Conference"]
+
+def book_concurrently(store, calendar_id, attempts):
+    start = threading.Barrier(attempts)
+    results = []
+
+    def book(number):
+        store.get_revision(calendar_id)  # open this thread's connection before the race
+        start.wait()
+        # Every attempt overlaps 10:00-11:00 with a different offset
+        minute = number % 60
+        results.append(store.book_reservation(calendar_id, make_event(
+            f"2025-10-10T10:{minute:02d}:00", f"2025-10-10T11:{minute:02d}:00", f"Person {number}")))
+
+    threads = [threading.Thread(target=book, args=(number,)) for number in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_conflicting_bookings_have_one_winner(store):
+    store.list_reservations("cal-1")  # create the database before the threads connect
+    results = book_concurrently(store, "cal-1", 200)
+    winners = [result for result in results if result is not None]
+    assert len(results) == 200 and len(winners) == 1
+    assert store.list_reservations("cal-1") == [winners[0]]
+
+def test_bookings_on_different_calendars_do_not_conflict(store):
+    for calendar_id in ("cal-1", "cal-2"):
+        assert store.book_reservation(calendar_id, make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"))
+    assert store.book_reservation("cal-1", make_event("2025-10-10T10:30:00", "2025-10-10T11:30:00")) is None
+
+def test_memory_store_never_drops_calendars():
+    store = MemoryReservationStore()
+    first = store.add_reservation("cal-0", make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"))
+    for number in range(1, 2000):
+        store.list_reservations(f"cal-{number}")
+    assert store.list_reservations("cal-0") == [first]
+    assert store.has_conflict("cal-0", "2025-10-10T10:30:00", "2025-10-10T11:30:00")
+
+def test_sharded_store_writes_other_calendars_while_one_shard_is_locked(tmp_path):
+    path = str(tmp_path / "reservations.db")
+    legacy = SQLiteReservationStore(path)
+    legacy.add_reservation("old-calendar", make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"))
+    store = ShardedSQLiteReservationStore(path, shards=4, timeout=0.2)
+    # Calendars stored before sharding stay in the first file
+    assert store._calendar_shard("old-calendar") is store.shards[0]
+    assert len(store.list_reservations("old-calendar")) == 1
+
+    calendars = {}
+    for number in range(100):
+        calendars.setdefault(store._calendar_shard(f"cal-{number}").path, f"cal-{number}")
+    assert len(calendars) == 4
+    locked_path, locked_calendar = next(iter(calendars.items()))
+    blocker = sqlite3.connect(locked_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        for path, calendar_id in calendars.items():
+            if path != locked_path:
+                assert store.book_reservation(calendar_id, make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"))
+        with pytest.raises(sqlite3.OperationalError):
+            store.book_reservation(locked_calendar, make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"))
+    finally:
+        blocker.rollback()
+    assert store.book_reservation(locked_calendar, make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"))
+
+def book_in_worker(path, number, barrier, outcomes):
+    store = SQLiteReservationStore(path)
+    store.get_revision("cal-1")
+    barrier.wait()
+    outcomes.put(store.book_reservation("cal-1", make_event(
+        "2025-10-10T10:00:00", "2025-10-10T11:00:00", f"Worker {number}")) is not None)
+
+def test_sqlite_bookings_are_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "reservations.db")
+    SQLiteReservationStore(path).list_reservations("cal-1")
+    context = multiprocessing.get_context("spawn")
+    barrier, outcomes = context.Barrier(8), context.Queue()
+    workers = [context.Process(target=book_in_worker, args=(path, number, barrier, outcomes)) for number in range(8)]
+    for worker in workers:
+        worker.start()
+    results = [outcomes.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join()
+    assert results.count(True) == 1
+    assert len(SQLiteReservationStore(path).list_reservations("cal-1")) == 1
+
+def test_reservations_of_different_resources_do_not_conflict(store):
+    assert store.book_reservation("cal-1", dict(make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"), resource="Room 1"))
+    assert store.book_reservation("cal-1", dict(make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"), resource="Room 2"))
+    assert store.book_reservation("cal-1", make_event("2025-10-10T10:00:00", "2025-10-10T11:00:00"))
+    assert store.book_reservation("cal-1", dict(make_event("2025-10-10T10:30:00", "2025-10-10T11:30:00"), resource="Room 2")) is None
+    assert store.has_conflict("cal-1", "2025-10-10T10:30:00", "2025-10-10T11:30:00", "Room 1")
+    assert not store.has_conflict("cal-1", "2025-10-10T10:30:00", "2025-10-10T11:30:00", "Room 3")
+    assert [event.get("resource") for event in store.list_reservations("cal-1", "Room 2")] == ["Room 2"]
+    assert len(store.find_conflicts("cal-1", "2025-10-10T10:30:00", "2025-10-10T11:30:00")) == 3
+    assert [event.get("resource") for event in store.list_reservations("cal-1", None)] == [None]
+
+def test_sqlite_migrates_database_without_revisions(tmp_path):
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE reservations (id INTEGER PRIMARY KEY AUTOINCREMENT, calendar_id TEXT NOT NULL, "
+                       "title TEXT, start_at TEXT NOT NULL, end_at TEXT NOT NULL, all_day INTEGER NOT NULL DEFAULT 0, "
+                       "description TEXT)")
+    connection.execute("INSERT INTO reservations (calendar_id, title, start_at, end_at) "
+                       "VALUES ('cal-1', 'Conference', '2025-10-09T09:00:00', '2025-10-11T09:00:00')")
+    connection.commit()
+    connection.close()
+    store = SQLiteReservationStore(path)
+    assert store.get_revision("cal-1") == 1
+    assert store.has_conflict("cal-1", "2025-10-10T10:00:00", "2025-10-10T11:00:00")
+
+def test_sqlite_first_connections_set_up_the_schema_once(tmp_path):
+    errors = []
+    # The race is timing dependent: run it on a few fresh databases needing a migration
+    for attempt in range(5):
+        path = str(tmp_path / f"old-{attempt}.db")
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE reservations (id INTEGER PRIMARY KEY AUTOINCREMENT, calendar_id TEXT NOT NULL, "
+                           "title TEXT, start_at TEXT NOT NULL, end_at TEXT NOT NULL, all_day INTEGER NOT NULL DEFAULT 0, "
+                           "description TEXT)")
+        connection.commit()
+        connection.close()
+        store = SQLiteReservationStore(path)
+        start = threading.Barrier(16)
+
+        def connect():
+            start.wait()
+            try:
+                store.get_revision("cal-1")
+            except sqlite3.Error as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=connect) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert errors == []
+
+def test_recurring_series_conflicts_without_materializing(store):
+    series = dict(make_event("2025-10-07T10:00:00", "2025-10-07T11:00:00"), rrule="FREQ=WEEKLY")
+    store.add_reservation("cal-1", make_event("2025-10-08T10:00:00", "2025-10-08T11:00:00", "Wednesday"))
+    stored = store.book_series("cal-1", series)
+    assert stored["rrule"] == "FREQ=WEEKLY" and store.list_series("cal-1") == [stored]
+    assert store.book_reservation("cal-1", make_event("2030-01-01T10:30:00", "2030-01-01T11:30:00")) is None
+    assert store.book_series("cal-1", dict(make_event("2025-10-06T10:30:00", "2025-10-06T11:00:00"), rrule="FREQ=DAILY")) is None
+    assert store.book_series("cal-1", dict(make_event("2025-10-06T12:00:00", "2025-10-06T13:00:00", "Lunch"), rrule="FREQ=DAILY"))
+
+    titles = [event["title"] for event in store.find_conflicts("cal-1", "2025-10-07T00:00:00", "2025-10-09T00:00:00")]
+    assert titles == ["John Appointment", "Lunch", "Wednesday", "Lunch"]
+    assert store.list_changes("cal-1", 0) is None
+
+def test_sqlite_skips_series_stored_with_invalid_rules(tmp_path):
+    store = SQLiteReservationStore(str(tmp_path / "reservations.db"))
+    store.book_series("cal-1", dict(make_event("2030-10-07T10:00:00", "2030-10-07T11:00:00"), rrule="FREQ=WEEKLY"))
+    connection = store._connection()
+    with connection:
+        # A rule accepted before rules were validated
+        connection.execute("UPDATE reservation_series SET rrule = 'FREQ=DAILY;INTERVAL=0'")
+    assert store.list_series("cal-1") == []
+    assert store.find_conflicts("cal-1", "2030-10-07T00:00:00", "2030-10-08T00:00:00") == []
+    assert store.book_reservation("cal-1", make_event("2030-10-07T10:00:00", "2030-10-07T11:00:00"))
+
+def test_bulk_booking_sweeps_stored_and_batch_conflicts(store):
+    store.add_reservation("cal-1", make_event("2030-10-10T10:00:00", "2030-10-10T11:00:00", "Stored"))
+    store.book_series("cal-1", dict(make_event("2030-10-07T14:00:00", "2030-10-07T15:00:00", "Weekly"), rrule="FREQ=WEEKLY"))
+    batch = [
+        make_event("2030-10-10T12:00:00", "2030-10-10T13:00:00", "Free"),
+        make_event("2030-10-10T10:30:00", "2030-10-10T11:30:00", "Overlaps stored"),
+        make_event("2030-10-10T12:30:00", "2030-10-10T13:30:00", "Overlaps the first row"),
+        make_event("2030-10-10T09:00:00", "2030-10-10T10:00:00", "Ends as stored starts"),
+        make_event("2030-10-14T14:30:00", "2030-10-14T15:30:00", "Overlaps the series"),
+        dict(make_event("2030-10-10T12:00:00", "2030-10-10T13:00:00", "Other resource"), resource="Room 1"),
+    ]
+    revision = store.get_revision("cal-1")
+    results = store.book_reservations("cal-1", batch)
+    assert [result is not None for result in results] == [True, False, False, True, False, True]
+    changes = store.list_changes("cal-1", revision)
+    assert sorted(event["title"] for event in changes[1]) == ["Ends as stored starts", "Free", "Other resource"]
+    assert [event["title"] for event in store.iter_reservations("cal-1")] == [
+        "Ends as stored starts", "Stored", "Free", "Other resource"]